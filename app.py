@@ -1,9 +1,30 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, current_app, request, jsonify, g
+import hmac
 import os
+import json
+import time
 from config import Config
-from extensions import init_extensions, db
+from extensions import init_extensions, db, limiter
 from datetime import timedelta
-from werkzeug.utils import secure_filename
+from utils.sanitizer import default_sanitizer
+from utils.attachments import is_text_attachment, read_attachment
+from utils.llm import chat_completion, stream_chat_completion
+from utils.provider_router import provider_name
+from utils.model_catalog import get_model_catalog
+from utils.jobs import JobQueue, JobStore, QueueFullError
+from utils.rate_limiter import ProviderThrottledError
+from utils.metrics import registry, HTTP_REQUEST_DURATION
+
+def metrics_authorized():
+    """Запрос с токеном METRICS_TOKEN в заголовке Authorization"""
+    token = current_app.config.get('METRICS_TOKEN')
+    header = request.headers.get('Authorization', '')
+    return bool(token) and hmac.compare_digest(header.encode(), f"Bearer {token}".encode())
+
+@limiter.request_filter
+def metrics_scrape():
+    """Сбор метрик с верным токеном не ограничивается по частоте, остальные запросы к /metrics - по умолчанию"""
+    return request.endpoint == 'metrics' and metrics_authorized()
 
 def create_app(config_name='default'):
     """
@@ -71,160 +92,334 @@ def create_app(config_name='default'):
     # Регистрация модулей мониторинга и анализа
     register_monitoring_modules(app)
     
+    # Регистрация CLI-команд
+    from commands import register_commands
+    register_commands(app)
+    
     # Создание директорий для загрузки файлов
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'documents'), exist_ok=True)
-    os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'temp'), exist_ok=True)
+    
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.monotonic()
+    
+    @app.after_request
+    def record_request_metrics(response):
+        """Длительность запроса до отправки заголовков ответа по шаблону маршрута"""
+        started = g.pop('request_started', None)
+        if started is not None and request.endpoint != 'metrics':
+            HTTP_REQUEST_DURATION.observe(
+                time.monotonic() - started,
+                endpoint=request.url_rule.rule if request.url_rule else 'unmatched',
+                status=response.status_code
+            )
+        return response
+    
+    @app.route('/metrics')
+    def metrics():
+        """
+        Метрики приложения в текстовом формате Prometheus
+        
+        Метрики раскрывают провайдеров, долю ошибок и статистику кэша, поэтому
+        доступны только с токеном METRICS_TOKEN; без настроенного токена
+        эндпоинт отключен. Ограничение частоты запросов не действует только
+        на запросы с верным токеном.
+        """
+        if not app.config.get('METRICS_TOKEN'):
+            return jsonify({'error': 'Метрики отключены'}), 404
+        if not metrics_authorized():
+            response = jsonify({'error': 'Требуется токен доступа к метрикам'})
+            response.headers['WWW-Authenticate'] = 'Bearer'
+            return response, 401
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+    
+    def parse_chat_request():
+        """
+        Разбор запроса к чату: JSON или форма с файлами
+        
+        Возвращает параметры запроса либо кортеж с ответом об ошибке. Текстовые
+        вложения читаются из потока загрузки и на диск не сохраняются; их
+        содержимое возвращается в attachments, а пропущенные файлы с причиной -
+        в skipped, и добавляется к сообщению через build_chat_message.
+        Нетекстовые файлы модели не передаются и пропускаются.
+        """
+        # Проверяем, пришли ли данные как JSON или как форма
+        if request.is_json:
+            # Обработка JSON запроса
+            data = request.get_json()
+            if not data or not data.get('message'):
+                return None, (jsonify({'error': 'Сообщение не предоставлено'}), 400)
+            
+            message = data.get('message')
+            confidential = data.get('confidential', False) is True
+            return {
+                'message': default_sanitizer.sanitize(message) if confidential else message,
+                'model': data.get('model', 'gemini-1.5-flash'),
+                'category': data.get('category', 'text'),
+                'use_cache': data.get('cache', True) is not False,
+                'attachments': [],
+                'skipped': []
+            }, None
+        
+        # Обработка формы с файлами
+        message = request.form.get('message', '')
+        confidential = request.form.get('confidential', 'false').lower() == 'true'
+        if confidential:
+            message = default_sanitizer.sanitize(message)
+        
+        # Обрабатываем загруженные файлы
+        attachments = []
+        skipped = []
+        budget = app.config.get('CHAT_ATTACHMENT_CHAR_BUDGET', 100000)
+        
+        for key in request.files:
+            file = request.files[key]
+            if not file.filename:
+                continue
+            
+            # Содержимое нетекстовых файлов модели не передается, поэтому они не сохраняются
+            if not is_text_attachment(file.filename, file.content_type):
+                skipped.append((file.filename, 'поддерживаются только текстовые файлы'))
+                continue
+            if budget <= 0:
+                skipped.append((file.filename, 'превышен объем вложений'))
+                continue
+            
+            # Текстовые файлы читаются из потока загрузки по фрагментам в пределах общего бюджета символов;
+            # в конфиденциальном режиме файл маскируется по фрагментам при чтении
+            content, truncated = read_attachment(file, budget, default_sanitizer if confidential else None)
+            budget -= len(content)
+            if truncated:
+                content += "\n\n[Файл обрезан: превышен объем вложений]"
+            attachments.append((file.filename, content))
+        
+        return {
+            'message': message,
+            'model': request.form.get('model', 'gemini-1.5-flash'),
+            'category': request.form.get('category', 'text'),
+            'use_cache': request.form.get('cache', 'true').lower() != 'false',
+            'attachments': attachments,
+            'skipped': skipped
+        }, None
+    
+    def needs_summary(chat_request):
+        """Есть ли во вложениях запроса файлы, требующие краткого изложения"""
+        return app.summarizer is not None and any(
+            app.summarizer.needs_summary(content) for _, content in chat_request['attachments'])
+    
+    def build_chat_message(chat_request):
+        """
+        Сообщение для модели с содержимым текстовых вложений
+        
+        Длинные файлы заменяются кратким изложением, что требует нескольких
+        запросов к модели, поэтому вызывается из фоновой задачи или генератора
+        потокового ответа, а не при разборе запроса.
+        """
+        file_contents = []
+        for filename, content in chat_request['attachments']:
+            if app.summarizer is not None and app.summarizer.needs_summary(content):
+                # Длинный файл передается модели кратким изложением
+                summary = app.summarizer.summarize(content, use_cache=chat_request['use_cache'])
+                file_contents.append(f"Краткое содержание файла {filename} "
+                                     f"(исходный объем {len(content)} символов):\n\n{summary}")
+            else:
+                file_contents.append(f"Содержимое файла {filename}:\n\n{content}")
+        for filename, reason in chat_request['skipped']:
+            file_contents.append(f"Файл {filename} пропущен: {reason}.")
+        
+        if not file_contents:
+            return chat_request['message']
+        return f"{chat_request['message']}\n\n" + "\n\n".join(file_contents)
     
     # Регистрация API для чата с ИИ
     @app.route('/api/chat', methods=['POST'])
     def api_chat():
         """API для обработки запросов к ИИ с поддержкой файлов"""
         try:
-            # Проверяем, пришли ли данные как JSON или как форма
-            if request.is_json:
-                # Обработка JSON запроса
-                data = request.get_json()
-                if not data or not data.get('message'):
-                    return jsonify({'error': 'Сообщение не предоставлено'}), 400
-                
-                message = data.get('message')
-                model = data.get('model', 'gemini-1.5-flash')
-                category = data.get('category', 'text')
-                full_message = message
-                files = []
-            else:
-                # Обработка формы с файлами
-                message = request.form.get('message', '')
-                model = request.form.get('model', 'gemini-1.5-flash')
-                category = request.form.get('category', 'text')
-                
-                # Обрабатываем загруженные файлы
-                files = []
-                file_contents = []
-                
-                for key in request.files:
-                    file = request.files[key]
-                    if file.filename:
-                        # Создаем временную директорию для файлов, если она не существует
-                        upload_dir = os.path.join(app.config.get('UPLOAD_FOLDER', 'uploads'), 'temp')
-                        os.makedirs(upload_dir, exist_ok=True)
-                        
-                        # Сохраняем файл
-                        filename = os.path.join(upload_dir, secure_filename(file.filename))
-                        file.save(filename)
-                        files.append(filename)
-                        
-                        # Если это текстовый файл, читаем его содержимое
-                        if file.content_type.startswith('text/') or file.filename.endswith(('.txt', '.md', '.py', '.js', '.html', '.css', '.json')):
-                            try:
-                                with open(filename, 'r', encoding='utf-8') as f:
-                                    content = f.read()
-                                    file_contents.append(f"Содержимое файла {file.filename}:\n\n{content}")
-                            except UnicodeDecodeError:
-                                file_contents.append(f"Файл {file.filename} не может быть прочитан как текст.")
-                
-                # Добавляем содержимое файлов к сообщению
-                if file_contents:
-                    full_message = f"{message}\n\n" + "\n\n".join(file_contents)
-                else:
-                    full_message = message
-            
-            # Импортируем g4f
-            import g4f
+            chat_request, error = parse_chat_request()
+            if error:
+                return error
             
             # Определяем провайдера и модель на основе выбранной категории и модели
-            provider = None
-            model_name = model
+            provider, model_name = get_model_catalog().resolve(chat_request['category'], chat_request['model'])
+            app.logger.info(f"Using provider: {provider_name(provider)}, model: {model_name}")
             
-            # Маппинг категорий и моделей на провайдеров g4f
-            providers_map = {
-                'text': {
-                    'gemini-1.5-flash': (g4f.Provider.TeachAnything, 'gemini-1.5-flash'),
-                    'gemini-1.5-pro': (g4f.Provider.TeachAnything, 'gemini-1.5-pro'),
-                    'command-r': (g4f.Provider.CohereForAI_C4AI_Command, 'command-r'),
-                    'command-r-plus': (g4f.Provider.CohereForAI_C4AI_Command, 'command-r-plus'),
-                    'qwen-3-30b': (g4f.Provider.Qwen_Qwen_3, 'qwen-3-30b-a3b'),
-                    'claude-3-opus': (g4f.Provider.Anthropic, 'claude-3-opus'),
-                    'claude-3-sonnet': (g4f.Provider.Anthropic, 'claude-3-sonnet'),
-                    'claude-3-haiku': (g4f.Provider.Anthropic, 'claude-3-haiku'),
-                    'llama-3-70b': (g4f.Provider.Groq, 'llama-3-70b-8192'),
-                    'llama-3-8b': (g4f.Provider.Groq, 'llama-3-8b-8192')
-                },
-                'code': {
-                    'gpt-4': (g4f.Provider.Yqcloud, 'gpt-4'),
-                    'gpt-4-turbo': (g4f.Provider.Yqcloud, 'gpt-4-turbo'),
-                    'gpt-3.5-turbo': (g4f.Provider.Yqcloud, 'gpt-3.5-turbo'),
-                    'blackbox-python': (g4f.Provider.Blackbox, 'Python Agent'),
-                    'blackbox-js': (g4f.Provider.Blackbox, 'JavaScript Agent'),
-                    'blackbox-react': (g4f.Provider.Blackbox, 'React Agent'),
-                    'blackbox-sql': (g4f.Provider.Blackbox, 'SQL Agent'),
-                    'blackbox-java': (g4f.Provider.Blackbox, 'Java Agent'),
-                    'claude-3-opus-code': (g4f.Provider.Anthropic, 'claude-3-opus'),
-                    'codellama-70b': (g4f.Provider.Groq, 'codellama-70b')
-                },
-                'research': {
-                    'perplexity-r1-1776': (g4f.Provider.PerplexityLabs, 'r1-1776'),
-                    'perplexity-sonar-small': (g4f.Provider.PerplexityLabs, 'sonar-small-online'),
-                    'perplexity-sonar-medium': (g4f.Provider.PerplexityLabs, 'sonar-medium-online'),
-                    'deepseek-r1': (g4f.Provider.LambdaChat, 'deepseek-r1'),
-                    'sonar-reasoning-pro': (g4f.Provider.PerplexityLabs, 'sonar-reasoning-pro'),
-                    'hermes-3-llama-405b': (g4f.Provider.LambdaChat, 'hermes-3-llama-3.1-405b-fp8'),
-                    'mixtral-8x7b': (g4f.Provider.Groq, 'mixtral-8x7b-32768'),
-                    'claude-3-opus-research': (g4f.Provider.Anthropic, 'claude-3-opus'),
-                    'gemini-1.5-pro-research': (g4f.Provider.TeachAnything, 'gemini-1.5-pro'),
-                    'gpt-4-research': (g4f.Provider.Yqcloud, 'gpt-4')
-                },
-                'multimodal': {
-                    'gemini-1.5-pro': (g4f.Provider.TeachAnything, 'gemini-1.5-pro'),
-                    'gemini-1.5-flash': (g4f.Provider.TeachAnything, 'gemini-1.5-flash'),
-                    'claude-3-opus-vision': (g4f.Provider.Anthropic, 'claude-3-opus'),
-                    'claude-3-sonnet-vision': (g4f.Provider.Anthropic, 'claude-3-sonnet'),
-                    'gpt-4-vision': (g4f.Provider.Yqcloud, 'gpt-4-vision'),
-                    'llava-1.6': (g4f.Provider.LambdaChat, 'llava-1.6-34b'),
-                    'cogvlm-17b': (g4f.Provider.LambdaChat, 'cogvlm-17b'),
-                    'qwen-vl': (g4f.Provider.Qwen_Qwen_3, 'qwen-vl'),
-                    'fuyu-8b': (g4f.Provider.LambdaChat, 'fuyu-8b'),
-                    'bakllava-1': (g4f.Provider.LambdaChat, 'bakllava-1')
-                }
-            }
-            
-            # Получаем провайдера и модель из маппинга
-            if category in providers_map and model in providers_map[category]:
-                provider, model_name = providers_map[category][model]
-            else:
-                # Провайдер и модель по умолчанию
-                provider = g4f.Provider.TeachAnything
-                model_name = 'gemini-1.5-flash'
-            
-            app.logger.info(f"Using provider: {provider.__name__}, model: {model_name}")
-            
-            # Получаем ответ от модели
-            response = g4f.ChatCompletion.create(
+            # Получаем ответ от модели (повторяющиеся вопросы обслуживаются из кэша)
+            response = chat_completion(
                 model=model_name,
                 provider=provider,
-                messages=[{"role": "user", "content": full_message}]
+                messages=[{"role": "user", "content": build_chat_message(chat_request)}],
+                use_cache=chat_request['use_cache']
             )
             
-            # Удаляем временные файлы
-            for file_path in files:
-                try:
-                    os.remove(file_path)
-                except Exception as e:
-                    app.logger.error(f"Error removing temporary file {file_path}: {str(e)}")
-            
             return jsonify({
                 'response': response,
                 'model': model_name,
-                'provider': provider.__name__ if provider else None
+                'provider': provider_name(provider)
             })
             
+        except ProviderThrottledError as e:
+            # Провайдер перегружен: клиенту предлагается повторить запрос позже
+            app.logger.warning(f"Chat API throttled: {str(e)}")
+            response = jsonify({'error': str(e)})
+            response.headers['Retry-After'] = str(app.config.get('LLM_LIMIT_RETRY_AFTER', 10))
+            return response, 429
         except Exception as e:
             app.logger.error(f"Error in chat API: {str(e)}")
             return jsonify({
                 'error': 'Произошла ошибка при обработке запроса',
                 'details': str(e)
             }), 500
+    
+    @app.route('/api/chat/stream', methods=['POST'])
+    def api_chat_stream():
+        """
+        Потоковый ответ ИИ через Server-Sent Events
+        
+        Фрагменты ответа отправляются событиями message с JSON {"token": ...}
+        по мере генерации, завершение - событием done, ошибка - событием error.
+        Перед кратким изложением длинных вложений отправляется событие status.
+        """
+        try:
+            chat_request, error = parse_chat_request()
+        except Exception as e:
+            app.logger.error(f"Error in chat stream API: {str(e)}")
+            return jsonify({
+                'error': 'Произошла ошибка при обработке запроса',
+                'details': str(e)
+            }), 500
+        if error:
+            return error
+        
+        try:
+            provider, model_name = get_model_catalog().resolve(chat_request['category'], chat_request['model'])
+        except Exception as e:
+            app.logger.error(f"Error in chat stream API: {str(e)}")
+            return jsonify({
+                'error': 'Произошла ошибка при обработке запроса',
+                'details': str(e)
+            }), 500
+        app.logger.info(f"Streaming with provider: {provider_name(provider)}, model: {model_name}")
+        
+        def sse(data, event=None):
+            payload = json.dumps(data, ensure_ascii=False)
+            return f"event: {event}\ndata: {payload}\n\n" if event else f"data: {payload}\n\n"
+        
+        def generate():
+            try:
+                if needs_summary(chat_request):
+                    # Клиент получает ответ сразу, не дожидаясь изложения вложений
+                    yield sse({'status': 'summarizing'}, event='status')
+                message = build_chat_message(chat_request)
+                for token in stream_chat_completion(
+                        model=model_name,
+                        provider=provider,
+                        messages=[{"role": "user", "content": message}],
+                        use_cache=chat_request['use_cache']):
+                    yield sse({'token': token})
+                yield sse({'model': model_name, 'provider': provider_name(provider)}, event='done')
+            except GeneratorExit:
+                app.logger.info("Chat stream closed by client")
+                raise
+            except Exception as e:
+                app.logger.error(f"Error in chat stream API: {str(e)}")
+                yield sse({'error': 'Произошла ошибка при обработке запроса', 'details': str(e)}, event='error')
+        
+        response = Response(generate(), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+    
+    def submit_job(kind, fn, *args):
+        """Постановка задачи в очередь: 202 с идентификатором или 429 при заполненной очереди"""
+        try:
+            job = app.job_queue.submit(kind, fn, *args)
+        except QueueFullError:
+            response = jsonify({'error': 'Очередь задач заполнена, повторите запрос позже'})
+            response.headers['Retry-After'] = str(app.config.get('JOBS_RETRY_AFTER', 10))
+            return response, 429
+        
+        response = jsonify({'job_id': job.id, 'status': job.status})
+        response.headers['Location'] = f"/api/jobs/{job.id}"
+        return response, 202
+    
+    @app.route('/api/jobs/chat', methods=['POST'])
+    def api_chat_job():
+        """
+        Запрос к ИИ в режиме фоновой задачи
+        
+        Принимает те же данные, что и /api/chat, и сразу возвращает
+        идентификатор задачи; результат запрашивается через /api/jobs/<job_id>.
+        """
+        try:
+            chat_request, error = parse_chat_request()
+            if error:
+                return error
+            provider, model_name = get_model_catalog().resolve(chat_request['category'], chat_request['model'])
+        except Exception as e:
+            app.logger.error(f"Error in chat job API: {str(e)}")
+            return jsonify({
+                'error': 'Произошла ошибка при обработке запроса',
+                'details': str(e)
+            }), 500
+        
+        def run_chat(chat_request):
+            response = chat_completion(
+                model=model_name,
+                provider=provider,
+                messages=[{"role": "user", "content": build_chat_message(chat_request)}],
+                use_cache=chat_request['use_cache']
+            )
+            return {'response': response, 'model': model_name, 'provider': provider_name(provider)}
+        
+        return submit_job('chat', run_chat, chat_request)
+    
+    @app.route('/api/jobs/analysis', methods=['POST'])
+    def api_analysis_job():
+        """
+        Анализ тендера в режиме фоновой задачи
+        
+        Принимает JSON {"tender_id": <id тендера в базе>}.
+        """
+        from models import Tender
+        from utils.bulk_analysis import tender_to_data
+        
+        data = request.get_json(silent=True) or {}
+        if not data.get('tender_id'):
+            return jsonify({'error': 'Не указан тендер'}), 400
+        
+        tender = Tender.query.get(data['tender_id'])
+        if tender is None:
+            return jsonify({'error': 'Тендер не найден'}), 404
+        
+        # В фоновый поток передается словарь, а не объект сессии
+        return submit_job('analysis', app.tender_analyzer.analyze_tender, tender_to_data(tender))
+    
+    @app.route('/api/jobs/<job_id>', methods=['GET'])
+    def api_job_status(job_id):
+        """
+        Статус и результат фоновой задачи
+        
+        Параметр wait (секунды) позволяет дождаться завершения задачи
+        в одном запросе вместо частого опроса. Задачу можно запросить у
+        любого рабочего процесса; задача процесса, перезапущенного до ее
+        завершения, возвращается со статусом failed.
+        """
+        try:
+            # NaN и отрицательные значения приводятся к 0 - без ожидания
+            wait = max(0.0, min(float(request.args.get('wait', 0)), app.config.get('JOBS_MAX_WAIT', 30)))
+        except ValueError:
+            return jsonify({'error': 'Некорректное значение wait'}), 400
+        
+        job = app.job_queue.get(job_id, wait=wait)
+        if job is None:
+            return jsonify({
+                'error': 'Задача не найдена',
+                'details': f"Задачи с идентификатором {job_id} нет, или ее результат удален "
+                           f"через {app.config.get('JOBS_RESULT_TTL', 3600)} с после завершения"
+            }), 404
+        return jsonify(job.to_dict())
 
     return app
 
@@ -237,9 +432,57 @@ def register_monitoring_modules(app):
     """
     from utils.analyzer import TenderAnalyzer
     from utils.parser import TenderParser
+    from utils.llm import (init_llm_backend, init_llm_cache, init_provider_router, init_provider_limiter,
+                           get_single_flight, get_provider_limiter)
+    from utils.model_catalog import init_model_catalog
+    from utils.summarizer import MapReduceSummarizer
+    
+    # Бэкенд, кэш ответов моделей и маршрутизатор провайдеров, общие для анализатора и чата
+    init_llm_backend(app)
+    init_llm_cache(app)
+    init_provider_router(app)
+    init_provider_limiter(app)
+    init_model_catalog(app)
+    
+    # Краткое изложение длинных вложений и документации перед запросом к модели
+    app.summarizer = MapReduceSummarizer(
+        model=app.config.get('SUMMARIZER_MODEL', 'gpt-3.5-turbo'),
+        threshold=app.config.get('SUMMARIZER_THRESHOLD', 12000),
+        chunk_size=app.config.get('SUMMARIZER_CHUNK_SIZE', 6000),
+        overlap=app.config.get('SUMMARIZER_CHUNK_OVERLAP', 300),
+        max_workers=app.config.get('SUMMARIZER_MAX_WORKERS', 4)
+    ) if app.config.get('SUMMARIZER_ENABLED', True) else None
+    
+    app.tender_analyzer = TenderAnalyzer(
+        concurrent=app.config.get('ANALYZER_CONCURRENT', True),
+        section_timeout=app.config.get('ANALYZER_SECTION_TIMEOUT'),
+        structured=app.config.get('ANALYZER_STRUCTURED', False),
+        summarizer=app.summarizer
+    )
+    app.tender_parser = TenderParser(
+        timeout=app.config.get('PARSER_TIMEOUT'),
+        connect_timeout=app.config.get('PARSER_CONNECT_TIMEOUT'),
+        pool_size=app.config.get('PARSER_POOL_SIZE'),
+        max_retries=app.config.get('PARSER_MAX_RETRIES'),
+        backoff_factor=app.config.get('PARSER_BACKOFF_FACTOR')
+    )
+    
+    # Фоновые задачи для долгих запросов к моделям; статус доступен из всех рабочих процессов
+    jobs_store_path = app.config.get('JOBS_STORE_PATH')
+    app.job_queue = JobQueue(
+        max_workers=app.config.get('JOBS_MAX_WORKERS', 8),
+        max_pending=app.config.get('JOBS_MAX_PENDING', 32),
+        result_ttl=app.config.get('JOBS_RESULT_TTL', 3600),
+        store=JobStore(jobs_store_path) if jobs_store_path else None
+    )
     
-    app.tender_analyzer = TenderAnalyzer()
-    app.tender_parser = TenderParser()
+    # Метрики, вычисляемые при чтении /metrics
+    registry.callback('jobs_active', 'Background jobs running or queued',
+                      lambda: app.job_queue.stats()['active'])
+    registry.callback('llm_coalesced_requests_total', 'LLM calls saved by request coalescing',
+                      lambda: get_single_flight().stats()['saved'], type_name='counter')
+    registry.callback('llm_provider_in_flight', 'g4f calls in flight across providers',
+                      lambda: sum(limit['in_flight'] for limit in get_provider_limiter().snapshot()))
     
     # Инициализация планировщика задач для автоматического мониторинга
     if not app.debug:
@@ -249,5 +492,7 @@ def register_monitoring_modules(app):
 if __name__ == '__main__':
     app = create_app()
     with app.app_context():
+        from utils.schema import upgrade_schema
         db.create_all()
+        upgrade_schema()
     app.run(debug=True)
\ No newline at end of file
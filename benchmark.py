@@ -0,0 +1,306 @@
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import List, Dict, Any
+
+# Замеры пропускной способности анализатора, задач планировщика и /api/chat
+# без сети: ответы моделей формирует FakeBackend с заданной задержкой и долей ошибок.
+# Замер extract сравнивает способы извлечения записей из страницы поиска ЕИС.
+#
+#   python benchmark.py analyzer --concurrency 1,4,16 --tenders 100
+#   python benchmark.py chat --concurrency 1,8,32 --requests 500 --latency 0.2
+#   python benchmark.py extract --fixture saved_search_page.html --pages 500
+#   python benchmark.py all --output benchmark.json
+
+# Замеры, для которых нужно приложение с бэкендом моделей
+APP_SUITES = ('analyzer', 'scheduler', 'chat')
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Нагрузочные замеры с локальным бэкендом моделей')
+    parser.add_argument('suite', choices=list(APP_SUITES) + ['extract', 'all'],
+                        help='Что замерять')
+    parser.add_argument('--concurrency', default='1,4,16',
+                        help='Уровни параллелизма через запятую (default: 1,4,16)')
+    parser.add_argument('--tenders', type=int, default=50,
+                        help='Число тендеров для анализатора и планировщика (default: 50)')
+    parser.add_argument('--requests', type=int, default=200,
+                        help='Число запросов к /api/chat на каждый уровень (default: 200)')
+    parser.add_argument('--latency', type=float, default=0.2,
+                        help='Задержка ответа модели, секунды (default: 0.2)')
+    parser.add_argument('--jitter', type=float, default=0.05,
+                        help='Разброс задержки, секунды (default: 0.05)')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Доля ошибок модели от 0 до 1 (default: 0)')
+    parser.add_argument('--seed', type=int, default=0, help='Зерно генератора задержек и ошибок')
+    parser.add_argument('--structured', action='store_true',
+                        help='Анализ одним структурированным запросом вместо запроса на раздел')
+    parser.add_argument('--cache', action='store_true',
+                        help='Включить кэш ответов моделей (по умолчанию выключен)')
+    parser.add_argument('--provider-limits', action='store_true',
+                        help='Учитывать LLM_PROVIDER_LIMITS (по умолчанию ограничения сняты)')
+    parser.add_argument('--fixture',
+                        help='Сохраненная страница поиска ЕИС для замера extract (по умолчанию синтетическая)')
+    parser.add_argument('--pages', type=int, default=200,
+                        help='Число разборов страницы на каждый способ извлечения (default: 200)')
+    parser.add_argument('--output', help='Файл для результатов в формате JSON')
+    return parser.parse_args()
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+def create_benchmark_app(args):
+    """
+    Приложение с локальным бэкендом моделей и временной базой SQLite
+
+    Настройки из config.py читаются при импорте, поэтому переменные
+    окружения задаются до импорта приложения.
+    """
+    os.environ['LLM_BACKEND'] = 'fake'
+    os.environ['LLM_FAKE_LATENCY'] = str(args.latency)
+    os.environ['LLM_FAKE_JITTER'] = str(args.jitter)
+    os.environ['LLM_FAKE_ERROR_RATE'] = str(args.error_rate)
+    os.environ['LLM_CACHE_ENABLED'] = 'true' if args.cache else 'false'
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(args.workdir, 'benchmark.db')}"
+    os.environ['UPLOAD_FOLDER'] = os.path.join(args.workdir, 'uploads')
+    # Планировщик не запускается в режиме отладки: его задачи замеряются напрямую
+    os.environ['FLASK_DEBUG'] = '1'
+
+    from app import create_app
+    from extensions import db, limiter
+    from utils.llm import init_llm_backend, init_provider_limiter
+
+    app = create_app()
+    app.config['LLM_FAKE_SEED'] = args.seed
+    init_llm_backend(app)
+    if not args.provider_limits:
+        app.config['LLM_PROVIDER_LIMITS'] = {}
+        init_provider_limiter(app)
+    # Ограничение частоты запросов клиентов (200 в день) исказило бы замер /api/chat
+    limiter.enabled = False
+
+    with app.app_context():
+        db.create_all()
+    return app
+
+def make_tender(index: int) -> Dict[str, Any]:
+    """Данные тендера; номер в тексте исключает совпадение запросов к модели"""
+    return {
+        'tender_id': f'BENCH-{index:06d}',
+        'title': f'Поставка оборудования, лот {index}',
+        'description': f'Поставка и монтаж оборудования для учреждения № {index}',
+        'customer': f'ГБУ "Учреждение {index % 50}"',
+        'supplier': f'ООО "Поставщик {index % 20}"',
+        'price': 900000.0 + index,
+        'initial_price': 1000000.0 + index,
+        'execution_deadline': datetime.utcnow() + timedelta(days=3 + index % 30)
+    }
+
+def summarize(name: str, concurrency: int, count: int, elapsed: float, latencies: List[float],
+              errors: int, unit: str) -> Dict[str, Any]:
+    rate = count / elapsed if elapsed else 0.0
+    result = {
+        'benchmark': name,
+        'concurrency': concurrency,
+        'count': count,
+        'errors': errors,
+        'elapsed': round(elapsed, 3),
+        'per_second': round(rate, 2),
+        'per_minute': round(rate * 60, 1),
+        'p50': round(percentile(latencies, 0.5), 3),
+        'p95': round(percentile(latencies, 0.95), 3)
+    }
+    rate_text = f"{result['per_minute']} {unit}/мин" if unit == 'тендеров' else f"{result['per_second']} {unit}/с"
+    print(f"{name:<36} параллелизм {concurrency:>3}: {rate_text}, "
+          f"p50 {result['p50']:.3f} с, p95 {result['p95']:.3f} с, ошибок {errors}")
+    return result
+
+def bench_analyzer(app, args, levels: List[int]) -> List[Dict[str, Any]]:
+    """Тендеров в минуту через TenderAnalyzer.analyze_tender при разном параллелизме"""
+    from utils.analyzer import TenderAnalyzer
+
+    analyzer = TenderAnalyzer(
+        concurrent=app.config.get('ANALYZER_CONCURRENT', True),
+        section_timeout=app.config.get('ANALYZER_SECTION_TIMEOUT'),
+        structured=args.structured,
+        use_cache=args.cache
+    )
+    results = []
+    for level in levels:
+        # Свой набор тендеров для каждого уровня, чтобы кэш не обслуживал повторы
+        tenders = [make_tender(level * 100000 + index) for index in range(args.tenders)]
+        latencies = []
+        errors = 0
+
+        def analyze(tender_data):
+            started = time.monotonic()
+            result = analyzer.analyze_tender(tender_data)
+            return time.monotonic() - started, result
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=level) as executor:
+            for latency, result in executor.map(analyze, tenders):
+                latencies.append(latency)
+                # Тендер с неудавшимися разделами считается ошибкой
+                if result.get('failed_sections'):
+                    errors += 1
+        results.append(summarize('analyzer', level, len(tenders), time.monotonic() - started,
+                                 latencies, errors, 'тендеров'))
+    return results
+
+def bench_scheduler(app, args) -> List[Dict[str, Any]]:
+    """Длительность задач планировщика на наборе тендеров в базе"""
+    from extensions import db
+    from models import Tender, ContractStatus
+    from utils.scheduler import TenderScheduler
+
+    with app.app_context():
+        db.session.add_all(
+            Tender(status=ContractStatus.IN_PROGRESS, publication_date=datetime.utcnow() - timedelta(days=10),
+                   **make_tender(index))
+            for index in range(args.tenders)
+        )
+        db.session.commit()
+
+        scheduler = TenderScheduler()
+        results = []
+        for job in ('analyze_contract_anomalies', 'detect_rule_anomalies', 'check_contract_deadlines'):
+            started = time.monotonic()
+            getattr(scheduler, job)()
+            elapsed = time.monotonic() - started
+            results.append(summarize(f'scheduler.{job}', 1, args.tenders, elapsed, [elapsed], 0, 'тендеров'))
+    return results
+
+def bench_chat(app, args, levels: List[int]) -> List[Dict[str, Any]]:
+    """Запросов в секунду к /api/chat при разном числе одновременных клиентов"""
+    results = []
+    for level in levels:
+        def send(index):
+            client = app.test_client()
+            started = time.monotonic()
+            response = client.post('/api/chat', data={
+                'message': f'Какие документы нужны для участия в закупке № {level}-{index}?',
+                'cache': 'true' if args.cache else 'false'
+            })
+            return time.monotonic() - started, response.status_code
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=level) as executor:
+            outcomes = list(executor.map(send, range(args.requests)))
+        results.append(summarize('api.chat', level, args.requests, time.monotonic() - started,
+                                 [latency for latency, _ in outcomes],
+                                 sum(1 for _, status in outcomes if status != 200), 'запросов'))
+    return results
+
+def make_search_page(entries: int = 50) -> str:
+    """
+    Синтетическая страница поиска ЕИС: записи реестра среди меню,
+    фильтров и скриптов, как на настоящей странице
+    """
+    navigation = ''.join(f'<li><div class="menu-item"><a href="/epz/{index}">Раздел {index}</a></div></li>'
+                         for index in range(300))
+    filters = ''.join(f'<div class="filter"><label>Фильтр {index}</label><input name="f{index}"></div>'
+                      for index in range(200))
+    records = ''.join(
+        '<div class="search-registry-entry-block box-shadow-search-input"><div class="row no-gutters">'
+        f'<div class="registry-entry__header"><div class="registry-entry__header-mid__number">'
+        f'<a href="/epz/order/notice/view/common-info.html?regNumber=0373{index:08d}">№ 0373{index:08d}</a></div>'
+        '<div class="registry-entry__header-mid__title">Подача заявок</div></div>'
+        f'<div class="registry-entry__body"><div class="registry-entry__body-title">Объект закупки</div>'
+        f'<div class="registry-entry__body-value">Поставка оборудования для учреждения № {index}</div>'
+        f'<div class="registry-entry__body-href"><a>ГБУ "Учреждение {index}"</a></div></div>'
+        f'<div class="price-block"><div class="price-block__value">{1000 + index}\xa0500,00 ₽</div></div>'
+        '<div class="data-block"><div class="data-block__title">Размещено</div>'
+        '<div class="data-block__value">01.02.2025</div></div></div></div>'
+        for index in range(entries)
+    )
+    script = '<script>' + 'var state = {"items": []};' * 2000 + '</script>'
+    return (f'<html><head>{script}</head><body><nav><ul>{navigation}</ul></nav>'
+            f'<form>{filters}</form><main>{records}</main></body></html>')
+
+def _run_extractor(name: str, html: str, pages: int) -> Dict[str, Any]:
+    """Замер одного способа извлечения в отдельном процессе, чтобы пиковая память не смешивалась"""
+    from utils.html_extract import get_extractor
+    extractor = get_extractor(name)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    entries = extractor.extract(html)
+    started = time.monotonic()
+    for _ in range(pages):
+        extractor.extract(html)
+    elapsed = time.monotonic() - started
+    return {
+        'entries': entries,
+        'elapsed': elapsed,
+        # ru_maxrss в Linux - в килобайтах
+        'peak_memory_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    }
+
+def bench_extract(args) -> List[Dict[str, Any]]:
+    """Страниц в секунду и пиковая память при разборе страницы поиска каждым способом"""
+    from utils.html_extract import EXTRACTORS
+
+    if args.fixture:
+        with open(args.fixture, 'r', encoding='utf-8') as f:
+            html = f.read()
+    else:
+        html = make_search_page()
+    print(f"Страница {len(html) // 1024} КБ, разборов на способ: {args.pages}")
+
+    context = multiprocessing.get_context('spawn')
+    results = []
+    reference = None
+    for name in EXTRACTORS:
+        with context.Pool(1) as pool:
+            run = pool.apply(_run_extractor, (name, html, args.pages))
+        # soup - прежний способ, с его результатом сравниваются остальные
+        if reference is None:
+            reference = run['entries']
+        result = {
+            'benchmark': f'extract.{name}',
+            'entries': len(run['entries']),
+            'matches_soup': run['entries'] == reference,
+            'per_second': round(args.pages / run['elapsed'], 1) if run['elapsed'] else 0.0,
+            'peak_memory_kb': run['peak_memory_kb']
+        }
+        print(f"{result['benchmark']:<36} {result['per_second']} страниц/с, записей {result['entries']}, "
+              f"пиковая память +{result['peak_memory_kb']} КБ"
+              f"{'' if result['matches_soup'] else ', РЕЗУЛЬТАТ ОТЛИЧАЕТСЯ ОТ soup'}")
+        results.append(result)
+    return results
+
+def main():
+    args = parse_args()
+    levels = [int(level) for level in args.concurrency.split(',') if level.strip()]
+
+    results = []
+    if args.suite in ('extract', 'all'):
+        results += bench_extract(args)
+
+    with tempfile.TemporaryDirectory(prefix='opentender-bench-') as workdir:
+        args.workdir = workdir
+        if args.suite in APP_SUITES or args.suite == 'all':
+            app = create_benchmark_app(args)
+            print(f"Бэкенд fake: задержка {args.latency} ± {args.jitter} с, доля ошибок {args.error_rate}, "
+                  f"кэш {'включен' if args.cache else 'выключен'}")
+
+        if args.suite in ('analyzer', 'all'):
+            results += bench_analyzer(app, args, levels)
+        if args.suite in ('scheduler', 'all'):
+            results += bench_scheduler(app, args)
+        if args.suite in ('chat', 'all'):
+            results += bench_chat(app, args, levels)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'args': {key: value for key, value in vars(args).items() if key != 'workdir'},
+                       'results': results}, f, ensure_ascii=False, indent=2)
+        print(f"\nРезультаты сохранены в {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -1,100 +1,210 @@
 import g4f
 import asyncio
-from typing import List, Dict
+import argparse
+from typing import List, Dict, Tuple, Set
 import json
+import os
+import re
+import time
 from datetime import datetime
 import inspect
+from utils.metrics import registry, LLM_REQUEST_DURATION, LLM_ERRORS
 
-async def test_provider_with_model(provider_name: str, model: str) -> Dict:
-    """Тестирует конкретную модель провайдера"""
-    try:
-        provider_class = getattr(g4f.Provider, provider_name)
-        if not inspect.isclass(provider_class):
-            return None
-            
-        provider = provider_class()
-        response = await g4f.ChatCompletion.create_async(
-            model=model,
-            provider=provider,
-            messages=[{"role": "user", "content": "Привет, как дела?"}]
-        )
-        
-        return {
-            "provider": provider_name,
-            "model": model,
-            "response": response
-        }
-    except Exception as e:
-        return None
+# Строка списка рабочих провайдеров из providers.txt: "✅ Провайдер (модель)",
+# возможно с задержкой ответа: "✅ Провайдер (модель) - 1.5 с"
+PROVIDER_LINE = re.compile(r'^✅\s+(\S+)\s+\((.+?)\)(?:\s+-\s+[\d.]+\s*с)?\s*$')
 
-async def test_all_providers() -> List[Dict]:
-    """Тестирует все провайдеры и их модели"""
-    successful_results = []
+def discover_pairs() -> Tuple[List[Tuple[str, str]], Set[str]]:
+    """Список всех пар (провайдер, модель) из установленной версии g4f"""
+    pairs = []
     all_providers = set()
-    sub_providers = set()
-    
+
     providers = [name for name in dir(g4f.Provider) if not name.startswith('_')]
-    
+
     for provider_name in providers:
         try:
             provider_class = getattr(g4f.Provider, provider_name)
             if not inspect.isclass(provider_class):
                 continue
-                
+
             provider = provider_class()
             all_providers.add(provider_name)
-            
+
             # Получаем список моделей для провайдера
             if hasattr(provider, 'models'):
                 models = provider.models
             else:
                 # Если нет явного списка моделей, пробуем стандартные
                 models = ['gpt-3.5-turbo', 'gpt-4', 'gpt-4-turbo']
-            
-            print(f"\nТестируем провайдер: {provider_name}")
-            print(f"Доступные модели: {models}")
-            
-            for model in models:
-                print(f"Тестируем модель: {model}")
-                result = await test_provider_with_model(provider_name, model)
-                
-                if result:
-                    successful_results.append(result)
-                    sub_providers.add(f"{provider_name} ({model})")
-                    print(f"✅ {provider_name} ({model}): Успешно")
-                    print(f"Ответ: {result['response']}")
-                else:
-                    print(f"❌ {provider_name} ({model}): Не удалось подключиться")
-                    
+
+            pairs.extend((provider_name, model) for model in models)
+
         except Exception as e:
             print(f"❌ {provider_name}: Ошибка при инициализации")
             print(f"Ошибка: {str(e)}")
-    
-    return successful_results, all_providers, sub_providers
+
+    return pairs, all_providers
+
+def load_pairs(path: str) -> List[Tuple[str, str]]:
+    """Список пар (провайдер, модель) из providers.txt или successful_providers_*.json"""
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.json'):
+            return [(result['provider'], result['model']) for result in json.load(f)]
+        return [match.groups() for match in map(PROVIDER_LINE.match, f) if match]
+
+def load_checked(path: str) -> Dict[Tuple[str, str], Dict]:
+    """Уже проверенные пары из JSONL-файла результатов для продолжения проверки"""
+    checked = {}
+    if not os.path.exists(path):
+        return checked
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                # Последняя строка могла остаться недописанной при прерывании
+                continue
+            checked[(result['provider'], result['model'])] = result
+    return checked
+
+async def test_provider_with_model(provider_name: str, model: str, timeout: float) -> Dict:
+    """Тестирует конкретную модель провайдера с ограничением времени ответа"""
+    started = time.monotonic()
+    result = {
+        "provider": provider_name,
+        "model": model,
+        "checked_at": datetime.now().isoformat()
+    }
+    try:
+        provider_class = getattr(g4f.Provider, provider_name)
+        if not inspect.isclass(provider_class):
+            raise TypeError(f"{provider_name} не является провайдером")
+
+        provider = provider_class()
+        response = await asyncio.wait_for(
+            g4f.ChatCompletion.create_async(
+                model=model,
+                provider=provider,
+                messages=[{"role": "user", "content": "Привет, как дела?"}]
+            ),
+            timeout=timeout
+        )
+        result.update(ok=True, response=response)
+    except asyncio.TimeoutError as e:
+        result.update(ok=False, error=f"Превышено время ожидания ({timeout} с)")
+        LLM_ERRORS.inc(provider=provider_name, model=model, error=type(e).__name__)
+    except Exception as e:
+        result.update(ok=False, error=str(e))
+        LLM_ERRORS.inc(provider=provider_name, model=model, error=type(e).__name__)
+
+    elapsed = time.monotonic() - started
+    LLM_REQUEST_DURATION.observe(elapsed, provider=provider_name, model=model,
+                                 outcome='ok' if result["ok"] else 'error')
+    result["latency"] = round(elapsed, 3)
+    return result
+
+async def test_all_providers(pairs: List[Tuple[str, str]], output: str, concurrency: int = 32,
+                             per_provider: int = 2, timeout: float = 60) -> List[Dict]:
+    """
+    Параллельно тестирует пары (провайдер, модель)
+
+    Общее число одновременных запросов ограничено concurrency, запросы к одному
+    провайдеру - per_provider. Каждый результат сразу дописывается в output
+    (JSONL), поэтому прерванную проверку можно продолжить.
+    """
+    global_semaphore = asyncio.Semaphore(concurrency)
+    provider_semaphores = {}
+    results = []
+
+    async def probe(provider_name: str, model: str) -> Dict:
+        provider_semaphore = provider_semaphores.setdefault(provider_name, asyncio.Semaphore(per_provider))
+        async with provider_semaphore:
+            async with global_semaphore:
+                return await test_provider_with_model(provider_name, model, timeout)
+
+    with open(output, 'a', encoding='utf-8') as f:
+        tasks = [asyncio.ensure_future(probe(provider_name, model)) for provider_name, model in pairs]
+        for done, task in enumerate(asyncio.as_completed(tasks), start=1):
+            result = await task
+            results.append(result)
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+            f.flush()
+
+            status = "✅" if result["ok"] else "❌"
+            print(f"[{done}/{len(pairs)}] {status} {result['provider']} ({result['model']}): {result['latency']:.1f} с")
+
+    return results
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Проверка доступности провайдеров g4f")
+    parser.add_argument('--from', dest='source', default=None,
+                        help="providers.txt или successful_providers_*.json; по умолчанию все провайдеры g4f")
+    parser.add_argument('--output', default='provider_probe.jsonl', help="JSONL-файл результатов")
+    parser.add_argument('--resume', action='store_true', help="Пропустить пары, уже записанные в --output")
+    parser.add_argument('--concurrency', type=int, default=32, help="Одновременных запросов всего")
+    parser.add_argument('--per-provider', type=int, default=2, help="Одновременных запросов к одному провайдеру")
+    parser.add_argument('--timeout', type=float, default=60, help="Время ожидания ответа, с")
+    parser.add_argument('--metrics-file', default=None,
+                        help="Файл метрик в формате Prometheus (для textfile collector node_exporter)")
+    return parser.parse_args()
 
 async def main():
-    results, all_providers, sub_providers = await test_all_providers()
-    
+    args = parse_args()
+
+    if args.source:
+        pairs = load_pairs(args.source)
+        all_providers = {provider_name for provider_name, _ in pairs}
+    else:
+        pairs, all_providers = discover_pairs()
+    pairs = list(dict.fromkeys(pairs))
+
+    checked = load_checked(args.output) if args.resume else {}
+    if not args.resume and os.path.exists(args.output):
+        os.remove(args.output)
+    pending = [pair for pair in pairs if pair not in checked]
+    print(f"Пар для проверки: {len(pending)} (уже проверено: {len(pairs) - len(pending)})")
+
+    await test_all_providers(pending, args.output, concurrency=args.concurrency,
+                             per_provider=args.per_provider, timeout=args.timeout)
+
+    # Итог собирается из файла, чтобы учесть результаты предыдущих запусков
+    checked = load_checked(args.output)
+    results = [checked[pair] for pair in pairs if pair in checked and checked[pair]["ok"]]
+    results.sort(key=lambda result: result["latency"])
+
     # Сохраняем только успешные результаты в JSON файл
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     filename = f"successful_providers_{timestamp}.json"
-    
+
     with open(filename, 'w', encoding='utf-8') as f:
         json.dump(results, f, ensure_ascii=False, indent=2)
-    
+
     # Выводим подробную статистику
     print("\n" + "="*50)
     print("СТАТИСТИКА ТЕСТИРОВАНИЯ")
     print("="*50)
     print(f"\nВсего провайдеров: {len(all_providers)}")
-    print(f"Всего под-провайдеров (провайдер + модель): {len(sub_providers)}")
+    print(f"Всего под-провайдеров (провайдер + модель): {len(pairs)}")
     print(f"Успешно работающих под-провайдеров: {len(results)}")
-    
-    print("\nСписок успешно работающих под-провайдеров:")
+
+    if results:
+        latencies = [result["latency"] for result in results]
+        print(f"Задержка успешных ответов: p50 {percentile(latencies, 0.5):.1f} с, "
+              f"p95 {percentile(latencies, 0.95):.1f} с")
+
+    print("\nСписок успешно работающих под-провайдеров (по возрастанию задержки):")
     for result in results:
-        print(f"✅ {result['provider']} ({result['model']})")
-    
-    print(f"\nРезультаты сохранены в файл: {filename}")
+        print(f"✅ {result['provider']} ({result['model']}) - {result['latency']:.1f} с")
+
+    if args.metrics_file:
+        with open(args.metrics_file, 'w', encoding='utf-8') as f:
+            f.write(registry.render())
+
+    print(f"\nРезультаты сохранены в файлы: {args.output}, {filename}")
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    asyncio.run(main())
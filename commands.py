@@ -0,0 +1,182 @@
+import json
+import os
+from datetime import datetime
+import click
+
+def register_commands(app):
+    """
+    Регистрирует CLI-команды приложения
+    
+    Команды запускаются через flask CLI, например:
+    flask --app "app:create_app()" analyze-tenders --concurrency 8
+    
+    После обновления приложения схему существующей базы обновляет
+    flask --app "app:create_app()" upgrade-db
+    """
+
+    @app.cli.command('analyze-tenders')
+    @click.option('--status', default=None, help='Статус контракта (значение ContractStatus)')
+    @click.option('--customer', default=None, help='Подстрока наименования заказчика')
+    @click.option('--since', 'published_since', default=None, help='Дата публикации не ранее (ДД.ММ.ГГГГ)')
+    @click.option('--concurrency', default=4, show_default=True, help='Число одновременно анализируемых тендеров')
+    @click.option('--batch-size', default=50, show_default=True, help='Размер пачки при сохранении в базу')
+    @click.option('--checkpoint', default='analyze_tenders.checkpoint.json', show_default=True,
+                  help='Файл контрольной точки')
+    @click.option('--resume', is_flag=True, help='Продолжить прерванный запуск из контрольной точки')
+    def analyze_tenders(status, customer, published_since, concurrency, batch_size, checkpoint, resume):
+        """Пакетный ИИ-анализ тендеров с сохранением результатов"""
+        from models import ContractStatus
+        from utils.bulk_analysis import pending_tenders_query, iter_tender_data, persist_analyses
+        
+        if resume:
+            if not os.path.exists(checkpoint):
+                raise click.ClickException(f'Контрольная точка {checkpoint} не найдена')
+            with open(checkpoint, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            click.echo(f"Продолжение запуска от {state['started_at']}, уже сохранено {state['saved']}")
+        else:
+            state = {
+                'started_at': datetime.utcnow().isoformat(),
+                'filters': {'status': status, 'customer': customer, 'since': published_since},
+                'saved': 0,
+                'failed': 0,
+                'anomalies': 0
+            }
+        
+        filters = state['filters']
+        try:
+            status_value = ContractStatus(filters['status']) if filters['status'] else None
+            since_value = datetime.strptime(filters['since'], '%d.%m.%Y') if filters['since'] else None
+        except ValueError as e:
+            raise click.ClickException(f'Неверный фильтр: {str(e)}')
+        
+        query = pending_tenders_query(
+            datetime.fromisoformat(state['started_at']),
+            status=status_value,
+            customer=filters['customer'],
+            published_since=since_value
+        )
+        base = {key: state[key] for key in ('saved', 'failed', 'anomalies')}
+        
+        def save_checkpoint(stats):
+            for key in base:
+                state[key] = base[key] + stats[key]
+            with open(checkpoint, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False, indent=2)
+        
+        save_checkpoint({'saved': 0, 'failed': 0, 'anomalies': 0})
+        
+        results = app.tender_analyzer.analyze_many(iter_tender_data(query), concurrency=concurrency)
+        stats = persist_analyses(results, batch_size=batch_size, on_commit=save_checkpoint)
+        save_checkpoint(stats)
+        
+        click.echo(f"Проанализировано: {state['saved']}, ошибок: {state['failed']}, аномалий: {state['anomalies']}")
+
+    @app.cli.command('reanalyze-changed')
+    @click.option('--batch-size', default=50, show_default=True, help='Размер пачки при сохранении в базу')
+    def reanalyze_changed(batch_size):
+        """Повторный анализ только измененных разделов измененных тендеров"""
+        from utils.bulk_analysis import reanalyze_changed_tenders
+        
+        stats = reanalyze_changed_tenders(app.tender_analyzer, batch_size=batch_size)
+        click.echo(f"Обновлено анализов: {stats['updated']}, ошибок: {stats['failed']}, "
+                   f"запросов разделов: {stats['sections']}, новых аномалий: {stats['anomalies']}")
+
+    @app.cli.command('rescore-analyses')
+    @click.option('--weights', default=None, help='JSON-файл весов ключевых слов')
+    @click.option('--chunk-size', default=1000, show_default=True, help='Число анализов в одной странице')
+    def rescore_analyses_command(weights, chunk_size):
+        """Пересчет оценок риска сохраненных анализов без обращения к модели"""
+        from utils.bulk_analysis import rescore_analyses
+        from utils.risk_scorer import KeywordRiskScorer
+        
+        scorer = KeywordRiskScorer.from_file(weights) if weights else app.tender_analyzer.risk_scorer
+        stats = rescore_analyses(scorer, chunk_size=chunk_size)
+        click.echo(f"Пересчитано: {stats['scored']}, изменено: {stats['changed']}")
+
+    @app.cli.command('detect-anomalies')
+    @click.option('--chunk-size', default=50000, show_default=True, help='Число тендеров в одной странице')
+    @click.option('--keep-stale', is_flag=True, help='Не закрывать аномалии, условие которых больше не выполняется')
+    def detect_anomalies(chunk_size, keep_stale):
+        """Выявление аномалий цены и сроков по правилам для всех тендеров"""
+        from utils.anomaly_engine import scan_tenders
+        
+        stats = scan_tenders(chunk_size=chunk_size, resolve_stale=not keep_stale)
+        click.echo(f"Проверено тендеров: {stats['scanned']}, новых аномалий: {stats['created']}, "
+                   f"закрыто: {stats['resolved']}")
+
+    @app.cli.command('seed-model-catalog')
+    @click.argument('results', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--category', default='text', show_default=True, help='Категория для новых моделей')
+    @click.option('--prune', is_flag=True, help='Удалить из каталога модели, не прошедшие проверку')
+    def seed_model_catalog(results, category, prune):
+        """Дополнение каталога моделей результатами check_providers.py"""
+        from utils.model_catalog import seed_catalog
+        
+        path = app.config['MODEL_CATALOG_PATH']
+        with open(path, 'r', encoding='utf-8') as f:
+            catalog = json.load(f)
+        with open(results, 'r', encoding='utf-8') as f:
+            probe_results = json.load(f)
+        
+        catalog, added, removed = seed_catalog(catalog, probe_results, category=category, prune=prune)
+        
+        # Запись через временный файл, чтобы работающее приложение не прочитало каталог частично
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(catalog, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        click.echo(f"Добавлено моделей: {added}, удалено: {removed}")
+
+    @app.cli.command('upgrade-db')
+    def upgrade_db():
+        """
+        Создание недостающих таблиц и добавление новых столбцов моделей
+        
+        db.create_all() не изменяет существующие таблицы, поэтому после
+        обновления приложения команду нужно выполнить для уже развернутой
+        базы до запуска веб-сервера. Повторный запуск ничего не меняет.
+        """
+        from models import db
+        from utils.schema import upgrade_schema
+        
+        db.create_all()
+        added = upgrade_schema()
+        click.echo(f"Добавлены столбцы: {', '.join(added)}" if added else "Схема базы актуальна")
+
+    @app.cli.command('replay-archive')
+    @click.option('--archive', 'archive_dir', default=None, help='Каталог архива (по умолчанию PARSER_ARCHIVE_DIR)')
+    @click.option('--since', default=None, help='Страницы, загруженные не ранее (ДД.ММ.ГГГГ)')
+    @click.option('--until', default=None, help='Страницы, загруженные ранее (ДД.ММ.ГГГГ)')
+    @click.option('--workers', default=None, type=int, help='Число процессов разбора (по умолчанию по числу ядер)')
+    @click.option('--extractor', default=None, help='Способ извлечения: lxml, strainer или soup')
+    @click.option('--output', default='replay_archive.jsonl', show_default=True, help='Файл результатов (JSONL)')
+    def replay_archive(archive_dir, since, until, workers, extractor, output):
+        """Повторное извлечение тендеров из архива страниц без обращения к ЕИС"""
+        from utils.page_archive import PageArchive, replay
+        
+        archive_dir = archive_dir or app.config['PARSER_ARCHIVE_DIR']
+        if not os.path.isdir(archive_dir):
+            raise click.ClickException(f'Архив {archive_dir} не найден')
+        try:
+            since_value = datetime.strptime(since, '%d.%m.%Y').timestamp() if since else None
+            until_value = datetime.strptime(until, '%d.%m.%Y').timestamp() if until else None
+        except ValueError as e:
+            raise click.ClickException(f'Неверная дата: {str(e)}')
+        
+        archive = PageArchive(archive_dir)
+        pages = tenders = errors = 0
+        with open(output, 'w', encoding='utf-8') as f:
+            for record, results in replay(archive, since=since_value, until=until_value,
+                                          workers=workers, extractor=extractor):
+                pages += 1
+                if results is None:
+                    errors += 1
+                    continue
+                for tender in results:
+                    tenders += 1
+                    f.write(json.dumps(
+                        dict(tender, source_url=record['url'], fetched_at=record['fetched_at']),
+                        ensure_ascii=False, default=str
+                    ) + '\n')
+        click.echo(f"Страниц: {pages}, тендеров: {tenders}, ошибок: {errors}. Результаты: {output}")
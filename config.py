@@ -25,9 +25,28 @@ class Config:
     RATELIMIT_DEFAULT = "200 per day"
     RATELIMIT_STORAGE_URL = "memory://"
     
+    # Доступ к /metrics: заголовок Authorization: Bearer <METRICS_TOKEN>
+    # (bearer_token в настройках сбора Prometheus); без токена эндпоинт отключен
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    
     # Настройки парсера
     PARSER_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    PARSER_TIMEOUT = 30  # seconds
+    PARSER_TIMEOUT = 30  # seconds, ожидание ответа
+    PARSER_CONNECT_TIMEOUT = 5  # seconds
+    PARSER_POOL_SIZE = 10  # постоянных соединений с сервером ЕИС
+    PARSER_MAX_RETRIES = 3  # повторов при 429 и 5xx
+    PARSER_BACKOFF_FACTOR = 0.5  # задержка повтора: 0.5, 1, 2... с
+    PARSER_CONCURRENCY = 10  # одновременных загрузок в parse_tenders
+    PARSER_PARSE_WORKERS = 4  # потоков разбора страниц в parse_tenders
+    PARSER_EXTRACTOR = os.environ.get('PARSER_EXTRACTOR', 'lxml')  # lxml, strainer или soup
+    # Признаки изменения страниц (ETag, Last-Modified, хэш) для условного обновления тендеров
+    PARSER_PAGE_CACHE_ENABLED = True
+    PARSER_PAGE_CACHE_PATH = os.environ.get('PARSER_PAGE_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'page_cache.db'))
+    PARSER_PAGE_CACHE_TTL = 604800  # 7 days, после - полный разбор страницы
+    # Архив загруженных страниц для повторного извлечения без обращения к ЕИС (flask replay-archive)
+    PARSER_ARCHIVE_ENABLED = os.environ.get('PARSER_ARCHIVE_ENABLED', 'false').lower() == 'true'
+    PARSER_ARCHIVE_DIR = os.environ.get('PARSER_ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archive'))
+    PARSER_ARCHIVE_SEGMENT_SIZE = 64 * 1024 * 1024  # bytes
     
     # Настройки планировщика
     SCHEDULER_UPDATE_INTERVAL = 3600  # 1 hour in seconds
@@ -42,6 +61,78 @@ class Config:
     G4F_MODEL = "gpt-3.5-turbo"
     G4F_TIMEOUT = 60  # seconds
     
+    # Настройки анализатора тендеров
+    ANALYZER_CONCURRENT = True  # параллельное выполнение разделов анализа
+    ANALYZER_SECTION_TIMEOUT = 120  # seconds
+    ANALYZER_STRUCTURED = False  # все разделы анализа одним запросом к модели
+    
+    # Бэкенд моделей: g4f - провайдеры g4f, fake - локальные ответы без сети
+    # с заданной задержкой и долей ошибок (нагрузочные тесты, benchmark.py)
+    LLM_BACKEND = os.environ.get('LLM_BACKEND', 'g4f')
+    LLM_FAKE_LATENCY = float(os.environ.get('LLM_FAKE_LATENCY', '0.5'))  # seconds
+    LLM_FAKE_JITTER = float(os.environ.get('LLM_FAKE_JITTER', '0.1'))  # seconds
+    LLM_FAKE_ERROR_RATE = float(os.environ.get('LLM_FAKE_ERROR_RATE', '0'))
+    LLM_FAKE_SEED = 0
+    
+    # Настройки кэша ответов моделей
+    LLM_CACHE_ENABLED = os.environ.get('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+    LLM_CACHE_PATH = os.environ.get('LLM_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'llm_cache.db'))
+    LLM_CACHE_TTL = 86400  # 24 hours in seconds
+    LLM_CACHE_MAX_ENTRIES = 10000
+    
+    # Ограничения нагрузки на провайдеров: ключи "провайдер:модель", "провайдер"
+    # и "*" (каждый провайдер отдельно); max_in_flight - одновременных запросов,
+    # per_minute - запросов в минуту, burst - допустимый всплеск
+    LLM_PROVIDER_LIMITS = {
+        '*': {'max_in_flight': 8, 'per_minute': 120, 'burst': 20}
+    }
+    LLM_LIMIT_MAX_WAIT = 30  # seconds, ожидание свободного слота
+    LLM_LIMIT_MAX_WAITING = 16  # запросов в очереди к одному провайдеру, сверх - отказ
+    LLM_LIMIT_RETRY_AFTER = 10  # seconds, заголовок Retry-After при отказе
+    
+    # Одинаковые одновременные запросы к моделям выполняются одним вызовом
+    LLM_SINGLE_FLIGHT_ENABLED = True
+    
+    # Настройки маршрутизатора провайдеров
+    LLM_ROUTER_ENABLED = True
+    LLM_ROUTER_FAILURE_THRESHOLD = 3  # ошибок подряд до отключения провайдера
+    LLM_ROUTER_RESET_TIMEOUT = 120  # seconds
+    LLM_ROUTER_HEDGE_AFTER = 30  # seconds, None - без дублирующих запросов
+    LLM_ROUTER_TIMEOUT = 180  # seconds
+    LLM_ROUTER_MAX_WORKERS = 32
+    LLM_ROUTER_MAX_ABANDONED = 16  # вызовов, не завершившихся за LLM_ROUTER_TIMEOUT, сверх - отказ
+    # Запасные провайдеры той же модели: модель -> [(имя провайдера g4f или None, модель)];
+    # None - провайдер выбирает g4f. Другие модели сюда не добавляются: ответ и цена изменились бы незаметно
+    LLM_ROUTES = {
+        'gpt-3.5-turbo': [('Yqcloud', 'gpt-3.5-turbo')],
+        'gemini-1.5-flash': [(None, 'gemini-1.5-flash')]
+    }
+    
+    # Каталог моделей чата: категория и модель -> провайдер g4f
+    MODEL_CATALOG_PATH = os.environ.get('MODEL_CATALOG_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model_catalog.json'))
+    MODEL_CATALOG_RELOAD_INTERVAL = 30  # seconds, None - без перечитывания файла
+    
+    # Суммарный объем текстовых вложений чата в символах (примерно 4 символа на токен)
+    CHAT_ATTACHMENT_CHAR_BUDGET = 100000
+    
+    # Краткое изложение длинных текстов по схеме map-reduce
+    SUMMARIZER_ENABLED = True
+    SUMMARIZER_MODEL = "gpt-3.5-turbo"
+    SUMMARIZER_THRESHOLD = 12000  # символов, более длинные тексты излагаются кратко
+    SUMMARIZER_CHUNK_SIZE = 6000  # символов
+    SUMMARIZER_CHUNK_OVERLAP = 300  # символов
+    SUMMARIZER_MAX_WORKERS = 4  # одновременных запросов к модели
+    
+    # Настройки фоновых задач
+    JOBS_MAX_WORKERS = 8
+    JOBS_MAX_PENDING = 32  # задач в работе и в ожидании, сверх - ответ 429
+    JOBS_RESULT_TTL = 3600  # seconds
+    JOBS_MAX_WAIT = 30  # seconds, предел ожидания результата в одном запросе
+    JOBS_RETRY_AFTER = 10  # seconds
+    # Состояние задач, общее для рабочих процессов gunicorn на одном сервере; пустое значение -
+    # только память процесса (допустим лишь один рабочий процесс)
+    JOBS_STORE_PATH = os.environ.get('JOBS_STORE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'jobs.db'))
+    
     # Настройки безопасности
     SESSION_COOKIE_SECURE = True
     REMEMBER_COOKIE_SECURE = True
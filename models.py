@@ -108,6 +108,28 @@ class ContractStatus(enum.Enum):
     TERMINATED = "terminated"      # Расторгнут
     SUSPENDED = "suspended"        # Приостановлен
 
+    @classmethod
+    def from_eis(cls, text):
+        """Статус контракта по тексту статуса закупки в реестре ЕИС; None - неизвестный статус"""
+        if not text:
+            return None
+        return EIS_STATUSES.get(' '.join(str(text).split()).lower())
+
+# Статусы закупок в реестре ЕИС и соответствующие им статусы контрактов
+EIS_STATUSES = {
+    'подача заявок': ContractStatus.BIDDING,
+    'работа комиссии': ContractStatus.EVALUATION,
+    'определение поставщика завершено': ContractStatus.AWARDED,
+    'закупка завершена': ContractStatus.AWARDED,
+    'определение поставщика приостановлено': ContractStatus.SUSPENDED,
+    'закупка приостановлена': ContractStatus.SUSPENDED,
+    'определение поставщика отменено': ContractStatus.TERMINATED,
+    'закупка отменена': ContractStatus.TERMINATED,
+    'исполнение': ContractStatus.IN_PROGRESS,
+    'исполнение завершено': ContractStatus.COMPLETED,
+    'исполнение прекращено': ContractStatus.TERMINATED
+}
+
 class Tender(db.Model):
     """
     Модель государственного тендера/контракта
@@ -181,6 +203,8 @@ class Analysis(db.Model):
     compliance_analysis = db.Column(db.Text, comment="Анализ соответствия требованиям")
     recommendations = db.Column(db.Text, comment="Рекомендации")
     risk_score = db.Column(db.Float, comment="Оценка риска (0-100)")
+    risk_indicators = db.Column(db.Text, comment="Индикаторы риска структурированного анализа (JSON)")
+    section_fingerprints = db.Column(db.Text, comment="Отпечатки входных данных разделов анализа (JSON)")
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_confidential = db.Column(db.Boolean, default=False, comment="Флаг конфиденциального анализа")
@@ -238,6 +262,7 @@ class Anomaly(db.Model):
     anomaly_type = db.Column(db.String(50), nullable=False, comment="Тип аномалии")
     description = db.Column(db.Text, nullable=False)
     severity = db.Column(db.String(20), default="medium", comment="Серьезность: low, medium, high, critical")
+    source = db.Column(db.String(20), comment="Источник: rules - правила, analysis - ИИ-анализ")
     detected_at = db.Column(db.DateTime, default=datetime.utcnow)
     resolved_at = db.Column(db.DateTime)
     status = db.Column(db.String(20), default="open", comment="Статус: open, investigating, resolved, false_positive")
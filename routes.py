@@ -4,6 +4,7 @@ from datetime import datetime, timedelta
 import jwt
 from functools import wraps
 from extensions import db, limiter
+from app import metrics_scrape
 from models import User, Tender, TenderHistory, Analysis, Document, Milestone, Anomaly, Alert, ContractStatus, UserRole
 from config import Config
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
@@ -16,6 +17,8 @@ import json
 import os
 
 limiter = Limiter(key_func=get_remote_address)
+# Сбор метрик с токеном не ограничивается и этим ограничителем
+limiter.request_filter(metrics_scrape)
 
 def token_required(f):
     """Декоратор для проверки JWT токена"""
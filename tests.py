@@ -3,6 +3,7 @@ from app import app, db
 from models import User, Tender
 from flask_login import current_user, login_user
 import json
+import os
 from unittest.mock import patch, MagicMock
 
 class TestApp(unittest.TestCase):
@@ -36,6 +37,15 @@ class TestApp(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn(b'OpenTender', response.data)
 
+    def test_metrics_requires_token(self):
+        """Тест доступа к метрикам только с токеном"""
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+        with patch.dict(app.config, {'METRICS_TOKEN': 'metrics-token'}):
+            self.assertEqual(self.client.get('/metrics').status_code, 401)
+            response = self.client.get('/metrics', headers={'Authorization': 'Bearer metrics-token'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'llm_provider_in_flight', response.data)
+
     def test_register_page(self):
         """Тест страницы регистрации"""
         response = self.client.get('/register')
@@ -317,5 +327,964 @@ class TestOAuth(unittest.TestCase):
         data = json.loads(response.data)
         self.assertEqual(data['error'], 'Код авторизации отсутствует')
 
+class TestTenderAnalyzer(unittest.TestCase):
+    def test_parse_structured_response(self):
+        """Тест разбора структурированного ответа модели"""
+        from utils.analyzer import TenderAnalyzer
+        response = '```json\n' + json.dumps({
+            'technical_analysis': 'Технический анализ',
+            'budget_analysis': '',
+            'risk_indicators': [
+                {'type': 'dumping', 'severity': 'HIGH', 'description': 'Демпинг'},
+                {'type': 'unknown', 'severity': 'extreme', 'description': 'Неверный уровень'}
+            ]
+        }, ensure_ascii=False) + '\n```'
+
+        parsed = TenderAnalyzer._parse_structured_response(response)
+        self.assertEqual(parsed['technical_analysis'], 'Технический анализ')
+        self.assertNotIn('budget_analysis', parsed)
+        self.assertEqual(parsed['risk_indicators'], [
+            {'type': 'dumping', 'severity': 'high', 'description': 'Демпинг'}
+        ])
+
+    @patch('g4f.ChatCompletion.create')
+    def test_structured_mode_falls_back_for_missing_sections(self, mock_create):
+        """Тест дозапроса недостающих разделов в режиме одного запроса"""
+        from utils.analyzer import TenderAnalyzer
+        mock_create.side_effect = [
+            json.dumps({
+                'technical_analysis': 'Т',
+                'budget_analysis': 'Б',
+                'compliance_analysis': 'С',
+                'recommendations': 'Р',
+                'risk_indicators': []
+            }),
+            'Анализ рисков'
+        ]
+
+        analyzer = TenderAnalyzer(structured=True, use_cache=False)
+        result = analyzer.analyze_tender({'title': 'Тендер', 'description': '', 'price': 100})
+        self.assertEqual(mock_create.call_count, 2)
+        self.assertEqual(result['risk_analysis'], 'Анализ рисков')
+        self.assertEqual(result['failed_sections'], [])
+
+    @patch('g4f.ChatCompletion.create')
+    def test_incremental_analysis_reruns_changed_sections(self, mock_create):
+        """Тест повторного анализа только разделов с измененными данными"""
+        from utils.analyzer import TenderAnalyzer
+        analyzer = TenderAnalyzer(use_cache=False)
+        tender = {'title': 'Тендер', 'description': 'Описание', 'customer': 'Заказчик',
+                  'supplier': 'Поставщик', 'price': 100, 'initial_price': 100}
+        previous = {section: 'Старый анализ' for section in TenderAnalyzer.SECTIONS}
+        previous['section_fingerprints'] = analyzer.section_fingerprints(tender)
+        mock_create.return_value = 'Новый анализ'
+
+        result = analyzer.analyze_incremental(dict(tender, description='Новое описание'), previous)
+        self.assertEqual(result['reanalyzed_sections'], ['technical_analysis'])
+        self.assertEqual(result['technical_analysis'], 'Новый анализ')
+        self.assertEqual(result['budget_analysis'], 'Старый анализ')
+        self.assertEqual(mock_create.call_count, 1)
+
+class TestBulkAnalysis(unittest.TestCase):
+    def setUp(self):
+        from flask import Flask
+        from extensions import db
+        from models import Tender
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db.init_app(self.app)
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+        self.tender = Tender(tender_id='0373000001', title='Тендер', customer='Заказчик',
+                             price=50.0, initial_price=100.0)
+        db.session.add(self.tender)
+        db.session.commit()
+        self.tender_data = {'id': self.tender.id, 'tender_id': self.tender.tender_id}
+
+    def tearDown(self):
+        from extensions import db
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def test_persist_skips_open_anomalies(self):
+        """Тест сохранения аномалии без повтора при повторном запуске"""
+        from models import Analysis, Anomaly
+        from utils.bulk_analysis import persist_analyses
+        result = {'technical_analysis': 'Анализ', 'risk_score': 80.0,
+                  'anomalies': [{'anomaly_type': 'dumping', 'description': 'Демпинг', 'severity': 'high'}]}
+
+        first = persist_analyses([(self.tender_data, result)])
+        second = persist_analyses([(self.tender_data, result)])
+
+        self.assertEqual((first['anomalies'], second['anomalies']), (1, 0))
+        self.assertEqual(Analysis.query.count(), 2)
+        self.assertEqual(Anomaly.query.count(), 1)
+
+    @patch('utils.llm.get_provider_router', return_value=None)
+    @patch('g4f.ChatCompletion.create')
+    def test_reanalyze_keeps_failed_sections(self, mock_create, mock_router):
+        """Тест сохранения прежних разделов при ошибках повторного анализа"""
+        from datetime import datetime
+        from extensions import db
+        from models import Analysis, TenderHistory
+        from utils.analyzer import TenderAnalyzer
+        from utils.bulk_analysis import reanalyze_changed_tenders, tender_to_data
+        analyzer = TenderAnalyzer(use_cache=False)
+        fingerprints = analyzer.section_fingerprints(tender_to_data(self.tender))
+        analysis = Analysis(tender_id=self.tender.id, section_fingerprints=json.dumps(fingerprints),
+                            risk_indicators=json.dumps([{'type': 'test', 'severity': 'low', 'description': 'Т'}]),
+                            updated_at=datetime(2024, 1, 1),
+                            **{section: 'Старый анализ' for section in TenderAnalyzer.SECTIONS})
+        self.tender.title = 'Новое название'
+        db.session.add_all([analysis, TenderHistory(tender_id=self.tender.id, field='title')])
+        db.session.commit()
+
+        mock_create.side_effect = RuntimeError('Провайдер недоступен')
+        stats = reanalyze_changed_tenders(analyzer)
+        self.assertEqual((stats['updated'], stats['failed']), (0, 1))
+        self.assertEqual(Analysis.query.one().technical_analysis, 'Старый анализ')
+
+        def create(model, provider, messages):
+            if 'Проанализируй бюджет' in messages[0]['content']:
+                raise RuntimeError('Провайдер недоступен')
+            return 'Новый анализ'
+
+        mock_create.side_effect = create
+        stats = reanalyze_changed_tenders(analyzer)
+        analysis = Analysis.query.one()
+        saved = json.loads(analysis.section_fingerprints)
+        self.assertEqual((stats['updated'], stats['failed']), (1, 0))
+        self.assertEqual(analysis.technical_analysis, 'Новый анализ')
+        self.assertEqual(analysis.budget_analysis, 'Старый анализ')
+        self.assertEqual(saved['budget_analysis'], fingerprints['budget_analysis'])
+        self.assertNotEqual(saved['technical_analysis'], fingerprints['technical_analysis'])
+        self.assertEqual(json.loads(analysis.risk_indicators)[0]['type'], 'test')
+
+    def test_rule_scan_resolves_only_rule_anomalies(self):
+        """Тест закрытия правилами только аномалий, созданных правилами"""
+        from extensions import db
+        from models import Anomaly
+        from utils.anomaly_engine import scan_tenders
+        db.session.add_all([
+            Anomaly(tender_id=self.tender.id, anomaly_type=anomaly_type, description='Д', source=source)
+            for anomaly_type, source in (('dumping', 'analysis'), ('short_deadline', 'analysis'),
+                                         ('price_reduction', 'rules'))
+        ])
+        db.session.commit()
+
+        stats = scan_tenders()
+
+        self.assertEqual((stats['created'], stats['resolved']), (0, 1))
+        statuses = {anomaly.anomaly_type: anomaly.status for anomaly in Anomaly.query}
+        self.assertEqual(statuses, {'dumping': 'open', 'short_deadline': 'open', 'price_reduction': 'resolved'})
+
+    def test_update_tenders_maps_eis_status(self):
+        """Тест приведения статуса закупки из реестра ЕИС к статусу контракта"""
+        from datetime import datetime, timedelta
+        from extensions import db
+        from models import ContractStatus, Tender, TenderHistory
+        from utils.scheduler import TenderScheduler
+        self.tender.execution_deadline = datetime.utcnow() + timedelta(days=30)
+        db.session.commit()
+        parsed = {'title': 'Тендер', 'description': None, 'price': 50.0, 'customer': 'Заказчик'}
+        scheduler = TenderScheduler()
+
+        for status in ('Подача  заявок', 'Подача заявок', 'Неизвестный статус'):
+            with patch.object(scheduler.parser, 'parse_tenders',
+                              return_value=[(self.tender.tender_id, dict(parsed, status=status))]):
+                scheduler.update_tenders()
+
+        self.assertEqual(Tender.query.one().status, ContractStatus.BIDDING)
+        history = [(row.field, row.old_value, row.new_value) for row in TenderHistory.query]
+        self.assertEqual(history, [('status', 'published', 'bidding')])
+
+    def test_upgrade_schema_adds_missing_columns(self):
+        """Тест добавления новых столбцов в существующую таблицу"""
+        import sqlalchemy as sa
+        from extensions import db
+        from models import Analysis
+        from utils.schema import missing_columns, upgrade_schema
+        from models import Anomaly
+        with db.engine.begin() as conn:
+            conn.execute(sa.text('ALTER TABLE analysis DROP COLUMN risk_indicators'))
+            conn.execute(sa.text('ALTER TABLE anomaly DROP COLUMN source'))
+        self.assertEqual(missing_columns(), ['analysis.risk_indicators', 'anomaly.source'])
+
+        self.assertEqual(upgrade_schema(), ['analysis.risk_indicators', 'anomaly.source'])
+        self.assertEqual(upgrade_schema(), [])
+        self.assertEqual((Analysis.query.count(), Anomaly.query.count()), (0, 0))
+
+class TestKeywordRiskScorer(unittest.TestCase):
+    def test_score_with_section_bonuses(self):
+        """Тест оценки риска с надбавками разделов"""
+        from utils.risk_scorer import KeywordRiskScorer
+        scorer = KeywordRiskScorer()
+        score = scorer.score({
+            'risk_analysis': 'Высокий риск срыва. Срыв сроков вероятен, требует внимания.',
+            'budget_analysis': 'Выявлено завышение цены.',
+            'compliance_analysis': 'Нарушений не выявлено.'
+        })
+        # 2 x 10 + 5 + 10 за ключевые слова, 15 за надбавку раздела бюджета
+        self.assertEqual(score, 50)
+
+    def test_custom_weights(self):
+        """Тест пересчета с измененными весами"""
+        from utils.risk_scorer import KeywordRiskScorer
+        scorer = KeywordRiskScorer(keyword_weights={'высокий риск': 30}, section_bonuses={})
+        self.assertEqual(scorer.score_many([{'risk_analysis': 'высокий риск'}, {'risk_analysis': ''}]), [30, 0])
+
+class TestConfidentialSanitizer(unittest.TestCase):
+    def test_sanitize(self):
+        """Тест маскирования ИНН, email и телефона"""
+        from utils.sanitizer import default_sanitizer
+        text = 'ИНН 7707083893, почта info@example.ru, тел. 8 916 123 45 67'
+        self.assertEqual(default_sanitizer.sanitize(text), 'ИНН [ИНН], почта [EMAIL], тел. [ТЕЛЕФОН]')
+
+    def test_stream_matches_whole_text(self):
+        """Тест совпадения потоковой и обычной обработки на границах фрагментов"""
+        from utils.sanitizer import ConfidentialSanitizer
+        sanitizer = ConfidentialSanitizer(overlap=32)
+        text = 'Контакт: info@example.ru, ИНН 7707083893. ' * 50
+        for size in (1, 7, 33, 100):
+            chunks = [text[i:i + size] for i in range(0, len(text), size)]
+            self.assertEqual(''.join(sanitizer.sanitize_stream(chunks)), sanitizer.sanitize(text))
+
+class TestAnomalyRules(unittest.TestCase):
+    def test_evaluate_rules(self):
+        """Тест векторной проверки правил аномалий"""
+        import numpy as np
+        from utils.anomaly_engine import evaluate_rules
+        masks = evaluate_rules(
+            np.array([99.9, 50.0, 100.0, np.nan]),
+            np.array([100.0, 100.0, 100.0, 100.0]),
+            np.array(['2024-01-01', '2024-01-01', '2024-01-01', None], dtype='datetime64[s]'),
+            np.array(['2024-03-01', '2024-01-05', None, '2024-01-02'], dtype='datetime64[s]')
+        )
+        self.assertEqual(masks['price_reduction'].tolist(), [True, False, False, False])
+        self.assertEqual(masks['dumping'].tolist(), [False, True, False, False])
+        self.assertEqual(masks['short_deadline'].tolist(), [False, True, False, False])
+
+class TestProviderRouter(unittest.TestCase):
+    def test_fallback_and_circuit_breaker(self):
+        """Тест переключения на эквивалентную модель и отключения провайдера"""
+        from utils.provider_router import ProviderRouter
+
+        def call(provider, model):
+            if provider == 'Broken':
+                raise RuntimeError('Провайдер недоступен')
+            return f'{provider}:{model}'
+
+        router = ProviderRouter(routes={'model-a': [('Working', 'model-b')]}, failure_threshold=2)
+        self.assertEqual(router.call('Broken', 'model-a', call), 'Working:model-b')
+        self.assertEqual(router.call('Broken', 'model-a', call), 'Working:model-b')
+        self.assertEqual(router.candidates('Broken', 'model-a'), [('Working', 'model-b')])
+
+    def test_hedged_request(self):
+        """Тест дублирующего запроса к второму провайдеру при задержке первого"""
+        import time
+        from utils.provider_router import ProviderRouter
+
+        def call(provider, model):
+            if provider == 'Slow':
+                time.sleep(1)
+            return provider
+
+        router = ProviderRouter(routes={'model-a': [('Fast', 'model-a')]}, hedge_after=0.1)
+        self.assertEqual(router.call('Slow', 'model-a', call), 'Fast')
+
+    def test_abandoned_calls_are_bounded(self):
+        """Тест отказа при заполнении пула вызовами, не завершившимися за timeout"""
+        import threading
+        import time
+        from utils.provider_router import ProviderRouter, ProviderUnavailableError
+        release = threading.Event()
+        router = ProviderRouter(timeout=0.1, max_workers=4, max_abandoned=2, failure_threshold=5)
+
+        def call(provider, model):
+            release.wait(5)
+            return provider
+
+        for _ in range(2):
+            with self.assertRaises(TimeoutError):
+                router.call('Hung', 'model-a', call)
+        with self.assertRaises(ProviderUnavailableError):
+            router.call('Hung', 'model-a', call)
+        self.assertEqual(router.snapshot()[0]['abandoned'], 2)
+
+        release.set()
+        deadline = time.monotonic() + 2
+        while router.snapshot()[0]['abandoned'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(router.call('Hung', 'model-a', call), 'Hung')
+
+    def test_late_success_after_timeout_is_not_recorded(self):
+        """Тест однократного учета вызова, завершившегося успешно после timeout"""
+        import threading
+        import time
+        from utils.provider_router import ProviderRouter
+        release = threading.Event()
+        finished = threading.Event()
+        router = ProviderRouter(timeout=0.1, failure_threshold=1)
+
+        def call(provider, model):
+            release.wait(5)
+            finished.set()
+            return provider
+
+        with self.assertRaises(TimeoutError):
+            router.call('Slow', 'model-a', call)
+        release.set()
+        finished.wait(2)
+        deadline = time.monotonic() + 2
+        while router.snapshot()[0]['abandoned'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        stats = router.snapshot()[0]
+        self.assertEqual((stats['samples'], stats['success_rate'], stats['p50']), (1, 0.0, None))
+        # Выключатель, открытый из-за медленного ответа, поздний успех не закрывает
+        self.assertEqual(stats['circuit'], 'open')
+
+    @patch('utils.llm.get_llm_cache', return_value=None)
+    @patch('g4f.ChatCompletion.create')
+    def test_stream_falls_back_before_first_chunk(self, mock_create, mock_cache):
+        """Тест переключения потокового запроса на другой провайдер до начала передачи"""
+        from utils.provider_router import ProviderRouter
+        from utils.llm import stream_chat_completion
+
+        def create(model, provider, messages, stream=False):
+            if provider == 'Broken':
+                raise RuntimeError('Провайдер недоступен')
+            return iter(['При', 'вет'])
+
+        mock_create.side_effect = create
+        router = ProviderRouter(routes={'model-a': [('Working', 'model-a')]})
+        with patch('utils.llm.get_provider_router', return_value=router):
+            chunks = list(stream_chat_completion('model-a', [{'role': 'user', 'content': 'Привет'}], provider='Broken'))
+
+        self.assertEqual(chunks, ['При', 'вет'])
+
+    @patch('utils.llm.get_llm_cache', return_value=None)
+    @patch('g4f.ChatCompletion.create')
+    def test_closed_stream_releases_trial_call(self, mock_create, mock_cache):
+        """Тест освобождения пробного запроса при отключении клиента во время передачи"""
+        from utils.provider_router import ProviderRouter
+        from utils.llm import stream_chat_completion
+        mock_create.side_effect = lambda model, provider, messages, stream=False: iter(['При', 'вет'])
+        router = ProviderRouter(failure_threshold=1, reset_timeout=0)
+        router.record_failure('Flaky', 'model-a')
+
+        with patch('utils.llm.get_provider_router', return_value=router):
+            stream = stream_chat_completion('model-a', [{'role': 'user', 'content': 'Привет'}], provider='Flaky')
+            self.assertEqual(next(stream), 'При')
+            stream.close()
+
+        self.assertEqual(router.candidates('Flaky', 'model-a'), [('Flaky', 'model-a')])
+
+class TestLLMCache(unittest.TestCase):
+    def test_hit_and_miss_counters(self):
+        """Тест счетчиков попаданий и промахов кэша"""
+        from utils.llm_cache import LLMCache
+        cache = LLMCache(':memory:')
+        key = LLMCache.make_key('gpt-3.5-turbo', None, [{'role': 'user', 'content': 'Привет'}])
+
+        self.assertIsNone(cache.get(key))
+        cache.set(key, 'Ответ')
+        self.assertEqual(cache.get(key), 'Ответ')
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_lru_eviction(self):
+        """Тест вытеснения давно не использовавшихся записей"""
+        from utils.llm_cache import LLMCache
+        cache = LLMCache(':memory:', max_entries=2)
+        cache.set('a', '1')
+        cache.set('b', '2')
+        cache.get('a')
+        cache.set('c', '3')
+
+        self.assertEqual(cache.get('a'), '1')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.stats()['entries'], 2)
+
+    @patch('utils.llm.get_provider_router', return_value=None)
+    @patch('g4f.ChatCompletion.create', return_value='Ответ модели')
+    def test_cache_read_error_is_miss(self, mock_create, mock_router):
+        """Тест запроса к модели при ошибке чтения кэша"""
+        import sqlite3
+        from utils.llm import chat_completion
+        from utils.llm_cache import LLMCache
+        cache = LLMCache(':memory:')
+        messages = [{'role': 'user', 'content': 'Кэш занят'}]
+
+        with patch('utils.llm.get_llm_cache', return_value=cache), \
+                patch.object(cache, 'get', side_effect=sqlite3.OperationalError('database is locked')):
+            self.assertEqual(chat_completion('gpt-3.5-turbo', messages), 'Ответ модели')
+        self.assertEqual(mock_create.call_count, 1)
+
+class TestModelCatalog(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        fd, self.path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        self.write_catalog({'text': {'model-a': {'provider': 'ProviderA', 'model': 'a-1'}}})
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def write_catalog(self, categories):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({'default': {'provider': 'Default', 'model': 'default-1'}, 'categories': categories}, f)
+
+    def test_resolve_and_hot_reload(self):
+        """Тест поиска модели и перечитывания измененного каталога"""
+        import time
+        from utils.model_catalog import ModelCatalog
+        catalog = ModelCatalog(self.path, reload_interval=0.01, provider_resolver=lambda name: name)
+
+        self.assertEqual(catalog.resolve('text', 'model-a'), ('ProviderA', 'a-1'))
+        self.assertEqual(catalog.resolve('code', 'model-a'), ('Default', 'default-1'))
+
+        self.write_catalog({'text': {'model-a': {'provider': 'ProviderB', 'model': 'b-1'}}})
+        os.utime(self.path, (time.time() + 5, time.time() + 5))
+        time.sleep(0.02)
+        self.assertEqual(catalog.resolve('text', 'model-a'), ('ProviderB', 'b-1'))
+
+    def test_seed_from_probe_results(self):
+        """Тест дополнения каталога результатами проверки провайдеров"""
+        from utils.model_catalog import seed_catalog
+        with open(self.path, encoding='utf-8') as f:
+            data = json.load(f)
+
+        seeded, added, removed = seed_catalog(data, [{'provider': 'ProviderC', 'model': 'c-1'}], prune=True)
+
+        self.assertEqual((added, removed), (1, 1))
+        self.assertEqual(seeded['categories']['text'], {'c-1': {'provider': 'ProviderC', 'model': 'c-1'}})
+
+class TestJobQueue(unittest.TestCase):
+    def test_result_and_admission_control(self):
+        """Тест выполнения задачи и отказа при заполненной очереди"""
+        import threading
+        from utils.jobs import JobQueue, QueueFullError
+        queue = JobQueue(max_workers=1, max_pending=1)
+        release = threading.Event()
+
+        job = queue.submit('chat', lambda: release.wait(5) and 'Ответ')
+        with self.assertRaises(QueueFullError):
+            queue.submit('chat', lambda: 'Ответ')
+
+        release.set()
+        self.assertEqual(queue.get(job.id, wait=5).to_dict()['result'], 'Ответ')
+        # После завершения задачи место в очереди освобождается
+        self.assertIsNotNone(queue.submit('chat', lambda: 'Ответ'))
+
+    def test_failed_job(self):
+        """Тест сохранения ошибки задачи"""
+        from utils.jobs import JobQueue
+        queue = JobQueue()
+
+        def fail():
+            raise RuntimeError('Провайдер недоступен')
+
+        job = queue.get(queue.submit('analysis', fail).id, wait=5)
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.error, 'Провайдер недоступен')
+
+    def test_shared_store_between_processes(self):
+        """Тест получения задачи через другой процесс и задачи перезапущенного процесса"""
+        import socket
+        import subprocess
+        import tempfile
+        from utils.jobs import Job, JobQueue, JobStore, LOST_JOB_ERROR
+        path = os.path.join(tempfile.mkdtemp(), 'jobs.db')
+        # Очереди двух рабочих процессов веб-сервера с общим файлом состояния
+        first, second = JobQueue(store=JobStore(path)), JobQueue(store=JobStore(path))
+
+        job = first.submit('chat', lambda: {'response': 'Ответ'})
+        self.assertEqual(second.get(job.id, wait=5).to_dict()['result'], {'response': 'Ответ'})
+
+        finished = subprocess.Popen(['true'])
+        finished.wait()
+        lost = Job('chat', owner=f"{socket.gethostname()}:{finished.pid}")
+        lost.status = 'running'
+        JobStore(path).save(lost)
+        lost = second.get(lost.id)
+        self.assertEqual((lost.status, lost.error), ('failed', LOST_JOB_ERROR))
+        self.assertIsNone(second.get('unknown'))
+
+class TestAttachments(unittest.TestCase):
+    def test_encoding_detection(self):
+        """Тест чтения вложений в UTF-8 и windows-1251 по фрагментам"""
+        import io
+        from utils.attachments import iter_text
+        text = 'Закупка оборудования ' * 10
+
+        # Размер фрагмента нечетный, чтобы разрезать двухбайтовые символы UTF-8
+        self.assertEqual(''.join(iter_text(io.BytesIO(text.encode('utf-8')), 1000, chunk_size=7)), text)
+        self.assertEqual(''.join(iter_text(io.BytesIO(text.encode('cp1251')), 1000, chunk_size=64)), text)
+
+    def test_char_budget(self):
+        """Тест обрезки вложения по бюджету символов"""
+        import io
+        from werkzeug.datastructures import FileStorage
+        from utils.attachments import read_attachment
+        file = FileStorage(stream=io.BytesIO(('а' * 100 + 'б' * 100).encode('utf-8')), filename='a.txt')
+
+        self.assertEqual(read_attachment(file, 150), ('а' * 100 + 'б' * 50, True))
+
+class TestMapReduceSummarizer(unittest.TestCase):
+    def test_split_text_overlap(self):
+        """Тест разбиения текста на перекрывающиеся фрагменты"""
+        from utils.summarizer import split_text
+        text = ''.join(f'Предложение номер {i}. ' for i in range(200))
+        chunks = split_text(text, 500, 50)
+
+        self.assertTrue(all(len(chunk) <= 500 for chunk in chunks))
+        self.assertTrue(text.startswith(chunks[0]) and text.endswith(chunks[-1]))
+        for previous, current in zip(chunks, chunks[1:]):
+            self.assertIn(current[:50], previous)
+
+    @patch('utils.llm.get_provider_router', return_value=None)
+    @patch('g4f.ChatCompletion.create')
+    def test_repeated_document_uses_cache(self, mock_create, mock_router):
+        """Тест кэширования сводок фрагментов повторного документа"""
+        from utils.llm_cache import LLMCache
+        from utils.summarizer import MapReduceSummarizer
+        mock_create.side_effect = lambda model, provider, messages: f"Сводка {len(messages[0]['content'])}"
+        summarizer = MapReduceSummarizer(threshold=1000, chunk_size=600, overlap=50)
+        text = 'Требования к поставке. ' * 200
+
+        with patch('utils.llm.get_llm_cache', return_value=LLMCache(':memory:')):
+            summary = summarizer.summarize(text)
+            calls = mock_create.call_count
+            self.assertEqual(summarizer.summarize(text), summary)
+            cached_calls = mock_create.call_count
+            # Запрос без кэша излагает документ заново
+            summarizer.summarize(text, use_cache=False)
+
+        self.assertGreater(calls, 1)
+        self.assertEqual(cached_calls, calls)
+        self.assertGreater(mock_create.call_count, calls)
+        self.assertLessEqual(len(summary), 1000)
+
+    @patch('utils.analyzer.chat_completion', return_value='Анализ')
+    @patch('utils.summarizer.chat_completion', return_value='Сводка')
+    def test_analyzer_summary_waits_for_provider_slot(self, mock_summary, mock_analysis):
+        """Тест ожидания слота провайдера запросами изложения при анализе"""
+        from utils.analyzer import TenderAnalyzer
+        from utils.summarizer import MapReduceSummarizer
+        analyzer = TenderAnalyzer(section_timeout=45, use_cache=False,
+                                  summarizer=MapReduceSummarizer(threshold=1000, chunk_size=600, overlap=50))
+        analyzer.analyze_tender({'title': 'Тендер', 'description': 'Требования к поставке. ' * 200, 'price': 100})
+
+        self.assertGreater(mock_summary.call_count, 1)
+        self.assertEqual({call.kwargs['limit_wait'] for call in mock_summary.call_args_list}, {45})
+
+class TestSingleFlight(unittest.TestCase):
+    @patch('utils.llm.get_provider_router', return_value=None)
+    @patch('g4f.ChatCompletion.create')
+    def test_concurrent_identical_requests_share_call(self, mock_create, mock_router):
+        """Тест объединения одинаковых одновременных запросов к модели"""
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+        from utils.llm import chat_completion, get_single_flight
+
+        def create(model, provider, messages):
+            time.sleep(0.3)
+            return 'Ответ'
+
+        mock_create.side_effect = create
+        saved = get_single_flight().stats()['saved']
+        messages = [{'role': 'user', 'content': 'Анализ тендера 42'}]
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            results = list(executor.map(lambda _: chat_completion('gpt-3.5-turbo', messages, use_cache=False), range(5)))
+
+        self.assertEqual(results, ['Ответ'] * 5)
+        self.assertEqual(mock_create.call_count, 1)
+        self.assertEqual(get_single_flight().stats()['saved'] - saved, 4)
+
+    def test_error_is_shared(self):
+        """Тест передачи ошибки всем ожидающим вызовам"""
+        import threading
+        import time
+        from utils.single_flight import SingleFlight
+        flight = SingleFlight()
+        started = threading.Event()
+        errors = []
+
+        def fail():
+            started.set()
+            time.sleep(0.2)
+            raise RuntimeError('Провайдер недоступен')
+
+        def follower():
+            started.wait()
+            try:
+                flight.do('key', lambda: 'Не должен вызываться')
+            except RuntimeError as e:
+                errors.append(str(e))
+
+        thread = threading.Thread(target=follower)
+        thread.start()
+        with self.assertRaises(RuntimeError):
+            flight.do('key', fail)
+        thread.join()
+
+        self.assertEqual(errors, ['Провайдер недоступен'])
+        self.assertEqual(flight.stats()['saved'], 1)
+
+class TestProviderLimiter(unittest.TestCase):
+    def test_max_in_flight_and_backpressure(self):
+        """Тест ограничения одновременных запросов и отказа по истечении ожидания"""
+        from utils.rate_limiter import ProviderLimiter, ProviderThrottledError
+        limiter = ProviderLimiter({'Slow': {'max_in_flight': 1}}, max_wait=0.1)
+
+        with limiter.slot('Slow', 'model-a'):
+            with self.assertRaises(ProviderThrottledError):
+                with limiter.slot('Slow', 'model-b'):
+                    pass
+            # Ограничения нет для других провайдеров
+            with limiter.slot('Fast', 'model-a'):
+                pass
+
+        with limiter.slot('Slow', 'model-a'):
+            pass
+        self.assertEqual(limiter.snapshot()[0]['rejected'], 1)
+
+    def test_requests_per_minute(self):
+        """Тест ограничения скорости запросов корзиной токенов"""
+        import time
+        from utils.rate_limiter import ProviderLimiter
+        limiter = ProviderLimiter({'*': {'per_minute': 600, 'burst': 2}})
+
+        started = time.monotonic()
+        for _ in range(4):
+            with limiter.slot('Provider', 'model-a'):
+                pass
+
+        # Два запроса в пределах всплеска, еще два - по 0.1 с на каждый
+        self.assertGreaterEqual(time.monotonic() - started, 0.15)
+
+    @patch('utils.llm.get_provider_router', return_value=None)
+    def test_bulk_analysis_waits_under_default_limits(self, mock_router):
+        """Тест пакетного анализа с параллельными разделами при ограничениях по умолчанию"""
+        from config import Config
+        from utils.llm import set_llm_backend
+        from utils.llm_backend import FakeBackend
+        from utils.analyzer import TenderAnalyzer
+        from utils.rate_limiter import ProviderLimiter
+        limiter = ProviderLimiter(Config.LLM_PROVIDER_LIMITS, max_wait=0.1,
+                                  max_waiting=Config.LLM_LIMIT_MAX_WAITING)
+        set_llm_backend(FakeBackend(latency=0.3))
+        self.addCleanup(set_llm_backend, None)
+
+        analyzer = TenderAnalyzer(concurrent=True, section_timeout=10, use_cache=False)
+        tenders = [{'title': f'Тендер {i}', 'description': 'Описание', 'price': 100} for i in range(4)]
+        with patch('utils.llm.get_provider_limiter', return_value=limiter):
+            results = [result for _, result in analyzer.analyze_many(tenders, concurrency=4)]
+
+        # Запросы сверх max_in_flight ждут слота дольше max_wait, но не отклоняются
+        self.assertEqual([result['failed_sections'] for result in results], [[]] * 4)
+        self.assertEqual([(limit['key'], limit['rejected']) for limit in limiter.snapshot()],
+                         [('*:gpt-3.5-turbo', 0)])
+
+    def test_throttled_provider_does_not_open_circuit(self):
+        """Тест переключения маршрутизатора на другой провайдер при перегрузке"""
+        from utils.provider_router import ProviderRouter
+        from utils.rate_limiter import ProviderThrottledError
+
+        def call(provider, model):
+            if provider == 'Busy':
+                raise ProviderThrottledError('Провайдер перегружен')
+            return provider
+
+        router = ProviderRouter(routes={'model-a': [('Free', 'model-a')]}, failure_threshold=1)
+        self.assertEqual(router.call('Busy', 'model-a', call), 'Free')
+        self.assertEqual(router.candidates('Busy', 'model-a')[0], ('Busy', 'model-a'))
+
+class TestMetrics(unittest.TestCase):
+    def test_prometheus_text_format(self):
+        """Тест вывода счетчиков и гистограмм в формате Prometheus"""
+        from utils.metrics import MetricsRegistry
+        registry = MetricsRegistry()
+        errors = registry.counter('test_errors_total', 'Errors', ('error',))
+        latency = registry.histogram('test_duration_seconds', 'Duration', ('provider',), buckets=(1, 5))
+        errors.inc(error='TimeoutError')
+        latency.observe(0.5, provider='Blackbox')
+        latency.observe(3, provider='Blackbox')
+
+        text = registry.render()
+        self.assertIn('test_errors_total{error="TimeoutError"} 1', text)
+        self.assertIn('test_duration_seconds_bucket{provider="Blackbox",le="1"} 1', text)
+        self.assertIn('test_duration_seconds_bucket{provider="Blackbox",le="+Inf"} 2', text)
+        self.assertIn('test_duration_seconds_sum{provider="Blackbox"} 3.5', text)
+
+    @patch('utils.llm.get_provider_router', return_value=None)
+    @patch('g4f.ChatCompletion.create')
+    def test_llm_call_is_recorded(self, mock_create, mock_router):
+        """Тест учета задержки и ошибок вызовов модели"""
+        from utils.llm import chat_completion
+        from utils.metrics import LLM_REQUEST_DURATION, LLM_ERRORS
+        mock_create.side_effect = TimeoutError('Нет ответа')
+        labels = {'provider': 'auto', 'model': 'metrics-test'}
+
+        with self.assertRaises(TimeoutError):
+            chat_completion('metrics-test', [{'role': 'user', 'content': 'Привет'}], use_cache=False)
+
+        self.assertEqual(LLM_REQUEST_DURATION.count(outcome='error', **labels), 1)
+        self.assertEqual(LLM_ERRORS.value(error='TimeoutError', **labels), 1)
+
+class TestFakeBackend(unittest.TestCase):
+    def tearDown(self):
+        from utils.llm import set_llm_backend
+        set_llm_backend(None)
+
+    def test_errors_are_reproducible(self):
+        """Тест воспроизводимости имитируемых ошибок при одинаковом зерне"""
+        from utils.llm_backend import FakeBackend, FakeBackendError
+
+        def outcomes(seed):
+            backend = FakeBackend(error_rate=0.3, seed=seed)
+            result = []
+            for _ in range(20):
+                try:
+                    backend.create('model', None, [{'role': 'user', 'content': 'Привет'}])
+                    result.append(True)
+                except FakeBackendError:
+                    result.append(False)
+            return result
+
+        self.assertEqual(outcomes(7), outcomes(7))
+        self.assertIn(False, outcomes(7))
+
+    @patch('utils.llm.get_provider_router', return_value=None)
+    def test_analyzer_runs_on_fake_backend(self, mock_router):
+        """Тест полного структурированного анализа без обращения к g4f"""
+        from utils.llm import set_llm_backend
+        from utils.llm_backend import FakeBackend
+        from utils.analyzer import TenderAnalyzer
+        backend = FakeBackend(responses={'Не используется': 'нет'})
+        set_llm_backend(backend)
+
+        analyzer = TenderAnalyzer(structured=True, use_cache=False)
+        result = analyzer.analyze_tender({'title': 'Тест', 'description': 'Описание', 'price': 100})
+
+        self.assertEqual(backend.calls, 1)
+        self.assertEqual(result['failed_sections'], [])
+        self.assertEqual(result['risk_indicators'][0]['severity'], 'medium')
+
+class TestTenderParser(unittest.TestCase):
+    PAGE = '<div class="registry-entry__header-mid-title">Закупка {0}</div>'
+
+    def setUp(self):
+        """
+        Локальный сервер ЕИС со страницами тендеров в gzip
+
+        Первый запрос получает 503, если задан fail_first; тендер "missing" не найден.
+        Если задан etag, на запрос с тем же If-None-Match отвечает 304.
+        """
+        import gzip
+        import threading
+        import time
+        from urllib.parse import urlparse, parse_qs
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        self.requests = []
+        self.fail_first = False
+        self.delay = 0
+        self.etag = None
+        self.page = self.PAGE
+        test = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                test.requests.append((self.client_address[1], self.headers.get('Accept-Encoding')))
+                query = parse_qs(urlparse(self.path).query)
+                tender_id = query.get('searchString', [''])[0]
+                time.sleep(test.delay)
+                if 'pageNumber' in query:
+                    body = test.search_page(int(query['pageNumber'][0]), int(query['recordsPerPage'][0].lstrip('_')))
+                    body = gzip.compress(body.encode('utf-8'))
+                elif (test.fail_first and len(test.requests) == 1) or tender_id == 'missing':
+                    self.send_response(503 if tender_id != 'missing' else 404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                elif test.etag and self.headers.get('If-None-Match') == test.etag:
+                    self.send_response(304)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                else:
+                    body = gzip.compress(test.page.format(tender_id).encode('utf-8'))
+                self.send_response(200)
+                if test.etag:
+                    self.send_header('ETag', test.etag)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            # Очередь подключений по умолчанию (5) мала для одновременных загрузок
+            request_queue_size = 64
+
+        self.server = Server(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def search_page(self, page, records_per_page, total=23):
+        """Страница результатов поиска: total записей по records_per_page на странице"""
+        numbers = range((page - 1) * records_per_page, min(page * records_per_page, total))
+        return ''.join(
+            '<div class="search-registry-entry-block box-shadow-search-input">'
+            f'<div class="registry-entry__header-mid__number"><a>№ 0373{number:04d}</a></div>'
+            f'<div class="registry-entry__body-value">Поставка {number}</div>'
+            f'<div class="price-block__value">1\xa0234,{number:02d} ₽</div>'
+            '</div>'
+            for number in numbers
+        )
+
+    def make_parser(self, **kwargs):
+        from utils.parser import TenderParser
+        return TenderParser(base_url=f'http://127.0.0.1:{self.server.server_port}', backoff_factor=0, **kwargs)
+
+    def test_session_retries_and_reuses_connection(self):
+        """Тест повтора после 503 и использования одного соединения для всех запросов"""
+        self.fail_first = True
+        with self.make_parser() as parser:
+            results = [parser.parse_tender(str(number)) for number in range(3)]
+
+        self.assertEqual([result['title'] for result in results], ['Закупка 0', 'Закупка 1', 'Закупка 2'])
+        self.assertEqual(len(self.requests), 4)
+        self.assertIn('gzip', self.requests[0][1])
+        # После ответа 503 соединение остается открытым
+        self.assertEqual(len({port for port, _ in self.requests}), 1)
+
+    def test_parse_tenders_concurrently(self):
+        """Тест параллельной загрузки с отчетом о ходе и ошибках"""
+        import time
+        self.delay = 0.2
+        progress = []
+        ids = [str(number) for number in range(8)] + ['missing']
+
+        started = time.monotonic()
+        with self.make_parser(max_retries=0) as parser:
+            results = dict(parser.parse_tenders(ids, concurrency=9, progress=lambda *args: progress.append(args)))
+        elapsed = time.monotonic() - started
+
+        self.assertLess(elapsed, 1.0)
+        self.assertIsNone(results.pop('missing'))
+        self.assertEqual({tender_id: data['title'] for tender_id, data in results.items()},
+                         {str(number): f'Закупка {number}' for number in range(8)})
+        self.assertEqual(progress[-1], (9, 9, 1))
+
+    def test_search_tenders_follows_pages(self):
+        """Тест разбора всех записей страницы поиска и перехода по страницам"""
+        with self.make_parser() as parser:
+            tenders = list(parser.search_tenders('поставка', records_per_page=10))
+
+        self.assertEqual(len(self.requests), 3)
+        self.assertEqual([tender['tender_id'] for tender in tenders], [f'0373{number:04d}' for number in range(23)])
+        self.assertEqual(tenders[5]['description'], 'Поставка 5')
+        self.assertEqual(tenders[5]['price'], 1234.05)
+
+    def test_extractors_agree(self):
+        """Тест одинакового результата всех способов извлечения записей"""
+        from utils.html_extract import EXTRACTORS, get_extractor
+        page = ('<html><body><nav><div class="registry-entry__body-value">Меню</div></nav>'
+                + self.search_page(1, 10, total=3) + '<script>var x = "<div>";</script></body></html>')
+
+        results = {name: get_extractor(name).extract(page) for name in EXTRACTORS}
+
+        self.assertEqual(results['soup'][2], {'number': '№ 03730002', 'description': 'Поставка 2',
+                                              'price': '1\xa0234,02 ₽'})
+        self.assertEqual(results['strainer'], results['soup'])
+        self.assertEqual(results['lxml'], results['soup'])
+
+    def test_conditional_parse_skips_unchanged_pages(self):
+        """Тест условного парсинга: 304 и совпадающее содержимое дают UNCHANGED"""
+        from utils.page_cache import PageCache
+        from utils.parser import UNCHANGED
+        page_cache = PageCache(':memory:')
+        self.etag = '"v1"'
+
+        with self.make_parser(page_cache=page_cache) as parser:
+            first = parser.parse_tender('1', conditional=True)
+            not_modified = parser.parse_tender('1', conditional=True)
+            # Новый ETag при том же содержимом
+            self.etag = '"v2"'
+            same_body = parser.parse_tender('1', conditional=True)
+            self.page = self.PAGE + '<div class="price-block__value">100</div>'
+            self.etag = '"v3"'
+            changed = parser.parse_tender('1', conditional=True)
+            bulk = dict(parser.parse_tenders(['1', '2'], conditional=True))
+
+        self.assertEqual(first['title'], 'Закупка 1')
+        self.assertIs(not_modified, UNCHANGED)
+        self.assertIs(same_body, UNCHANGED)
+        self.assertEqual(changed['price'], 100.0)
+        self.assertIs(bulk['1'], UNCHANGED)
+        self.assertEqual(bulk['2']['title'], 'Закупка 2')
+        self.assertEqual(page_cache.stats()['not_modified'], 2)
+        self.assertEqual(page_cache.stats()['same_body'], 1)
+
+    def test_archive_replay(self):
+        """Тест архива загруженных страниц и повторного извлечения без сети"""
+        import tempfile
+        from utils.page_archive import PageArchive, replay
+        directory = tempfile.mkdtemp()
+        # Маленький сегмент, чтобы записи попали в несколько файлов
+        archive = PageArchive(directory, segment_size=600)
+
+        with self.make_parser(archive=archive) as parser:
+            parser.parse_tender('1')
+            dict(parser.parse_tenders(['2', '3']))
+            list(parser.search_tenders('поставка', records_per_page=10))
+        self.server.shutdown()
+
+        self.assertEqual(archive.stats()['pages'], 6)
+        self.assertGreater(archive.stats()['segments'], 1)
+        meta, body = archive.read(archive.records(tender_id='1')[0])
+        self.assertEqual(body.decode('utf-8'), self.PAGE.format('1'))
+        self.assertEqual(meta['headers']['Content-Type'], 'text/html; charset=utf-8')
+
+        results = list(replay(PageArchive(directory), workers=2, batch_size=2))
+        titles = sorted(tenders[0]['title'] for record, tenders in results if record['tender_id'])
+        numbers = [tender['tender_id'] for record, tenders in results if not record['tender_id']
+                   for tender in tenders]
+        self.assertEqual(titles, ['Закупка 1', 'Закупка 2', 'Закупка 3'])
+        self.assertEqual(sorted(numbers), [f'0373{number:04d}' for number in range(23)])
+        self.assertEqual(list(replay(archive, since=meta['fetched_at'] + 3600)), [])
+
+
+    def test_archive_concurrent_writers(self):
+        """Тест записи в архив несколькими писателями без смешивания записей"""
+        import tempfile
+        from concurrent.futures import ThreadPoolExecutor
+        from utils.page_archive import PageArchive
+        directory = tempfile.mkdtemp()
+        # Отдельные экземпляры, как в разных процессах веб-сервера
+        writers = [PageArchive(directory, segment_size=4096) for _ in range(3)]
+
+        def write(number):
+            writers[number % 3].append(f'url-{number}', f'Страница {number}'.encode() * 20, tender_id=str(number))
+
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            list(executor.map(write, range(60)))
+
+        archive = PageArchive(directory)
+        pages = {meta['tender_id']: body for meta, body in map(archive.read, archive.records())}
+        self.assertEqual(pages, {str(number): f'Страница {number}'.encode() * 20 for number in range(60)})
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
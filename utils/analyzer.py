@@ -1,13 +1,51 @@
-import g4f
 import logging
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Tuple, Optional, Iterable, Iterator
 import re
 from datetime import datetime
 import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from .llm import chat_completion
+from .risk_scorer import KeywordRiskScorer
+from .sanitizer import default_sanitizer
+from .metrics import ANALYZER_RUNS, ANALYZER_SECTION_FAILURES
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+ANALYSIS_ERROR = "Ошибка анализа"
+
+# Допустимые уровни серьезности индикаторов риска
+RISK_SEVERITIES = ('low', 'medium', 'high', 'critical')
+
+# JSON-схема ответа для режима анализа одним запросом
+STRUCTURED_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "technical_analysis": {"type": "string"},
+        "budget_analysis": {"type": "string"},
+        "risk_analysis": {"type": "string"},
+        "compliance_analysis": {"type": "string"},
+        "recommendations": {"type": "string"},
+        "risk_indicators": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "type": {"type": "string"},
+                    "severity": {"type": "string", "enum": list(RISK_SEVERITIES)},
+                    "description": {"type": "string"}
+                },
+                "required": ["type", "severity", "description"]
+            }
+        }
+    },
+    "required": [
+        "technical_analysis", "budget_analysis", "risk_analysis",
+        "compliance_analysis", "recommendations", "risk_indicators"
+    ]
+}
+
 class TenderAnalyzer:
     """
     Анализатор тендеров с использованием ИИ
@@ -16,9 +54,37 @@ class TenderAnalyzer:
     соответствия исполнения контрактов требованиям законодательства и повышения
     качества государственного управления.
     """
-    def __init__(self, model="gpt-3.5-turbo"):
+    # Разделы анализа и методы, которые их формируют
+    SECTIONS = {
+        'technical_analysis': '_analyze_technical',
+        'budget_analysis': '_analyze_budget',
+        'risk_analysis': '_analyze_risks',
+        'compliance_analysis': '_analyze_compliance',
+        'recommendations': '_generate_recommendations'
+    }
+
+    # Поля тендера, которые подставляются в запрос каждого раздела
+    SECTION_FIELDS = {
+        'technical_analysis': ('title', 'description', 'customer'),
+        'budget_analysis': ('title', 'initial_price', 'price'),
+        'risk_analysis': ('title', 'customer', 'supplier', 'deadline', 'price'),
+        'compliance_analysis': ('title', 'customer', 'price'),
+        'recommendations': ('title', 'customer', 'price')
+    }
+
+    # Ожидание слота провайдера, если section_timeout не задан (секунды)
+    LIMIT_WAIT = 120
+
+    def __init__(self, model="gpt-3.5-turbo", concurrent: bool = False, section_timeout: Optional[float] = None,
+                 structured: bool = False, use_cache: bool = True, risk_scorer=None, summarizer=None):
         self.model = model
         self.confidential_mode = False
+        self.concurrent = concurrent
+        self.section_timeout = section_timeout
+        self.structured = structured
+        self.use_cache = use_cache
+        self.risk_scorer = risk_scorer or KeywordRiskScorer()
+        self.summarizer = summarizer
 
     def set_confidential_mode(self, enabled: bool = True):
         """
@@ -41,43 +107,363 @@ class TenderAnalyzer:
         - Риски исполнения
         - Соответствие требованиям законодательства
         - Рекомендации
+        
+        Ошибка или таймаут отдельного раздела не отменяет остальные:
+        такой раздел получает текст "Ошибка анализа" и попадает в
+        список failed_sections.
+        
+        В режиме structured все разделы запрашиваются одним вызовом,
+        а отдельные запросы выполняются только для недостающих разделов.
         """
         try:
             # Базовый анализ
-            analysis_results = {
-                'technical_analysis': self._analyze_technical(tender_data),
-                'budget_analysis': self._analyze_budget(tender_data),
-                'risk_analysis': self._analyze_risks(tender_data),
-                'compliance_analysis': self._analyze_compliance(tender_data),
-                'recommendations': self._generate_recommendations(tender_data)
-            }
-            
-            # Расчет оценки риска
-            risk_score = self._calculate_risk_score(analysis_results)
-            analysis_results['risk_score'] = risk_score
+            prompt_data = self._prompt_data(tender_data)
+            if self.structured:
+                analysis_results, failed_sections = self._analyze_structured(prompt_data)
+            else:
+                analysis_results, failed_sections = self._run_sections(prompt_data, list(self.SECTIONS))
+                analysis_results['risk_indicators'] = []
+            analysis_results['failed_sections'] = failed_sections
+            analysis_results['section_fingerprints'] = self._fingerprints_for(tender_data, failed_sections)
             
-            # Выявление аномалий
-            anomalies = self._detect_anomalies(tender_data, analysis_results)
-            analysis_results['anomalies'] = anomalies
+            result = self._finalize(tender_data, analysis_results)
+            self._record_run('structured' if self.structured else 'sections', failed_sections, len(self.SECTIONS))
+            return result
             
-            # Очистка данных в конфиденциальном режиме
-            if self.confidential_mode:
-                analysis_results = self._sanitize_confidential_data(analysis_results)
+        except Exception as e:
+            logger.error(f"Error analyzing tender: {str(e)}")
+            ANALYZER_RUNS.inc(mode='structured' if self.structured else 'sections', outcome='error')
+            return self._error_result()
+
+    def analyze_incremental(self, tender_data: Dict[str, Any], previous: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Инкрементальный повторный анализ тендера
+        
+        Сравнивает отпечатки входных данных каждого раздела с отпечатками
+        предыдущего анализа (previous['section_fingerprints']) и повторно
+        запрашивает у модели только разделы, чьи данные изменились.
+        Остальные разделы берутся из previous. Для разделов, которые не
+        удалось выполнить, сохраняются прежний текст и прежний отпечаток,
+        поэтому следующий запуск запросит их снова. Оценка риска и
+        аномалии пересчитываются целиком.
+        """
+        try:
+            current = self.section_fingerprints(tender_data)
+            old = previous.get('section_fingerprints') or {}
+            changed = [
+                section for section in self.SECTIONS
+                if old.get(section) != current[section]
+                or not previous.get(section) or previous.get(section) == ANALYSIS_ERROR
+            ]
             
-            return analysis_results
+            analysis_results = {section: previous.get(section) for section in self.SECTIONS}
+            failed_sections = []
+            if changed:
+                logger.info(f"Re-analyzing sections {changed}")
+                fresh_results, failed_sections = self._run_sections(self._prompt_data(tender_data), changed)
+                analysis_results.update(fresh_results)
+            
+            fingerprints = self._fingerprints_for(tender_data, failed_sections)
+            for section in failed_sections:
+                if previous.get(section) and previous.get(section) != ANALYSIS_ERROR:
+                    analysis_results[section] = previous[section]
+                if section in old:
+                    fingerprints[section] = old[section]
+            
+            analysis_results['risk_indicators'] = previous.get('risk_indicators', [])
+            analysis_results['failed_sections'] = failed_sections
+            analysis_results['reanalyzed_sections'] = changed
+            analysis_results['section_fingerprints'] = fingerprints
+            
+            result = self._finalize(tender_data, analysis_results)
+            self._record_run('incremental', failed_sections, len(changed))
+            return result
             
         except Exception as e:
-            logger.error(f"Error analyzing tender: {str(e)}")
-            return {
-                'technical_analysis': "Ошибка анализа",
-                'budget_analysis': "Ошибка анализа",
-                'risk_analysis': "Ошибка анализа",
-                'compliance_analysis': "Ошибка анализа",
-                'recommendations': "Ошибка анализа",
+            logger.error(f"Error in incremental analysis: {str(e)}")
+            ANALYZER_RUNS.inc(mode='incremental', outcome='error')
+            return self._error_result()
+
+    def section_fingerprints(self, tender_data: Dict[str, Any]) -> Dict[str, str]:
+        """
+        Отпечатки входных данных разделов анализа
+        
+        Отпечаток раздела - хэш модели и значений полей из SECTION_FIELDS,
+        поэтому он меняется только при изменении данных, влияющих на запрос.
+        """
+        values = dict(tender_data)
+        values['deadline'] = tender_data.get('execution_deadline', tender_data.get('deadline'))
+        
+        fingerprints = {}
+        for section, fields in self.SECTION_FIELDS.items():
+            payload = json.dumps(
+                [self.model] + [values.get(field) for field in fields],
+                ensure_ascii=False, default=str
+            )
+            fingerprints[section] = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+        return fingerprints
+
+    def _fingerprints_for(self, tender_data: Dict[str, Any], failed_sections: List[str]) -> Dict[str, str]:
+        """Отпечатки успешно выполненных разделов"""
+        return {
+            section: fingerprint
+            for section, fingerprint in self.section_fingerprints(tender_data).items()
+            if section not in failed_sections
+        }
+
+    def _finalize(self, tender_data: Dict[str, Any], analysis_results: Dict[str, Any]) -> Dict[str, Any]:
+        """Расчет оценки риска, выявление аномалий и очистка результатов"""
+        # Расчет оценки риска
+        risk_score = self._calculate_risk_score(analysis_results)
+        analysis_results['risk_score'] = risk_score
+        
+        # Выявление аномалий
+        anomalies = self._detect_anomalies(tender_data, analysis_results)
+        analysis_results['anomalies'] = anomalies
+        
+        # Очистка данных в конфиденциальном режиме
+        if self.confidential_mode:
+            analysis_results = self._sanitize_confidential_data(analysis_results)
+        
+        return analysis_results
+
+    def _error_result(self) -> Dict[str, Any]:
+        """Результат анализа при полном отказе"""
+        return {
+                'technical_analysis': ANALYSIS_ERROR,
+                'budget_analysis': ANALYSIS_ERROR,
+                'risk_analysis': ANALYSIS_ERROR,
+                'compliance_analysis': ANALYSIS_ERROR,
+                'recommendations': ANALYSIS_ERROR,
                 'risk_score': 0.0,
-                'anomalies': []
+                'anomalies': [],
+                'risk_indicators': [],
+                'failed_sections': list(self.SECTIONS),
+                'section_fingerprints': {}
             }
 
+    def analyze_many(self, tenders: Iterable[Dict[str, Any]], concurrency: int = 4) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """
+        Пакетный анализ тендеров с ограниченным параллелизмом
+        
+        Одновременно анализируется не более concurrency тендеров, а из
+        входного итератора читается не больше, чем нужно для заполнения
+        очереди, поэтому весь набор не загружается в память. Пары
+        (tender_data, analysis_results) возвращаются по мере готовности,
+        порядок не сохраняется.
+        """
+        tenders = iter(tenders)
+        max_pending = max(1, concurrency) * 2
+        
+        with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='tender-bulk') as executor:
+            pending = {}
+            exhausted = False
+            
+            while True:
+                # Пополняем очередь заданий
+                while not exhausted and len(pending) < max_pending:
+                    try:
+                        tender_data = next(tenders)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending[executor.submit(self.analyze_tender, tender_data)] = tender_data
+                
+                if not pending:
+                    break
+                
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    tender_data = pending.pop(future)
+                    yield tender_data, future.result()
+
+    @staticmethod
+    def _record_run(mode: str, failed_sections: List[str], requested: int):
+        """Метрики завершенного анализа: исход и неудавшиеся разделы"""
+        for section in failed_sections:
+            ANALYZER_SECTION_FAILURES.inc(section=section)
+        if not failed_sections:
+            outcome = 'ok'
+        else:
+            outcome = 'failed' if len(failed_sections) >= requested else 'partial'
+        ANALYZER_RUNS.inc(mode=mode, outcome=outcome)
+
+    def _prompt_data(self, tender_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Данные тендера для запросов к модели
+        
+        Слишком длинное описание заменяется кратким изложением. Отпечатки
+        разделов и поиск аномалий используют исходные данные.
+        """
+        description = tender_data.get('description')
+        if self.summarizer is None or not self.summarizer.needs_summary(description):
+            return tender_data
+        summary = self.summarizer.summarize(description, use_cache=self.use_cache, limit_wait=self._limit_wait())
+        return dict(tender_data, description=summary)
+
+    def _complete(self, prompt: str, use_cache: Optional[bool] = None) -> str:
+        """
+        Запрос к модели g4f с одним пользовательским сообщением
+
+        Анализ сам ограничивает число одновременных запросов, поэтому при
+        перегрузке провайдера запрос ждет слота до истечения section_timeout,
+        а не отклоняется.
+        """
+        return chat_completion(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            use_cache=self.use_cache if use_cache is None else use_cache,
+            limit_wait=self._limit_wait()
+        )
+
+    def _limit_wait(self) -> float:
+        """Ожидание слота провайдера запросами анализа"""
+        return self.section_timeout or self.LIMIT_WAIT
+
+    def _analyze_structured(self, tender_data: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Анализ тендера одним запросом со структурированным ответом
+        
+        Запрашивает все разделы анализа и индикаторы риска в формате JSON.
+        Разделы, отсутствующие в ответе или не прошедшие проверку,
+        запрашиваются отдельными вызовами.
+        """
+        deadline = tender_data.get('execution_deadline', tender_data.get('deadline', 'Не указан'))
+        if isinstance(deadline, datetime):
+            deadline = deadline.strftime('%d.%m.%Y')
+        initial_price = tender_data.get('initial_price', tender_data.get('price', 0))
+        
+        prompt = f"""
+        Проведи комплексный анализ государственного контракта:
+        Название: {tender_data['title']}
+        Описание: {tender_data.get('description', '')}
+        Заказчик: {tender_data.get('customer', 'Не указан')}
+        Поставщик: {tender_data.get('supplier', 'Не определен')}
+        Начальная цена: {initial_price} руб.
+        Итоговая цена: {tender_data.get('price', 'Не указана')} руб.
+        Срок исполнения: {deadline}
+        
+        Заполни разделы:
+        - technical_analysis: сложность и обоснованность технического задания, узкие места, необходимые компетенции
+        - budget_analysis: адекватность бюджета, признаки завышения или занижения цены, риски перерасхода
+        - risk_analysis: риски срыва сроков, некачественного исполнения, финансовые и коррупционные риски с оценкой вероятности и ущерба
+        - compliance_analysis: соответствие 44-ФЗ, 223-ФЗ и постановлениям Правительства РФ с указанием статей
+        - recommendations: контрольные точки, проверяемые документы и порядок приемки
+        - risk_indicators: список выявленных рисков с полями type, severity ({', '.join(RISK_SEVERITIES)}) и description
+        
+        Ответь только JSON-объектом, соответствующим схеме:
+        {json.dumps(STRUCTURED_ANALYSIS_SCHEMA, ensure_ascii=False)}
+        """
+        
+        parsed = {}
+        try:
+            parsed = self._parse_structured_response(self._complete(prompt))
+        except Exception as e:
+            logger.error(f"Error in structured analysis: {str(e)}")
+        
+        results = {section: parsed[section] for section in self.SECTIONS if section in parsed}
+        missing = [section for section in self.SECTIONS if section not in results]
+        failed = []
+        if missing:
+            logger.info(f"Structured analysis is missing sections {missing}, falling back to separate calls")
+            fallback_results, failed = self._run_sections(tender_data, missing)
+            results.update(fallback_results)
+        
+        analysis_results = {section: results[section] for section in self.SECTIONS}
+        analysis_results['risk_indicators'] = parsed.get('risk_indicators', [])
+        return analysis_results, failed
+
+    @staticmethod
+    def _parse_structured_response(response: str) -> Dict[str, Any]:
+        """
+        Разбор и проверка структурированного ответа модели
+        
+        Извлекает JSON-объект из ответа (в том числе из блока ```json```)
+        и оставляет только поля, соответствующие схеме. Непустые строковые
+        разделы принимаются, некорректные индикаторы риска отбрасываются.
+        """
+        if not isinstance(response, str):
+            raise ValueError("Ответ модели не является строкой")
+        
+        start = response.find('{')
+        end = response.rfind('}')
+        if start == -1 or end <= start:
+            raise ValueError("Ответ модели не содержит JSON-объект")
+        data = json.loads(response[start:end + 1])
+        if not isinstance(data, dict):
+            raise ValueError("Ответ модели не является JSON-объектом")
+        
+        parsed = {}
+        for section in TenderAnalyzer.SECTIONS:
+            value = data.get(section)
+            if isinstance(value, str) and value.strip():
+                parsed[section] = value.strip()
+        
+        indicators = []
+        for item in data.get('risk_indicators') or []:
+            if not isinstance(item, dict):
+                continue
+            severity = str(item.get('severity', '')).lower()
+            if severity not in RISK_SEVERITIES or not item.get('type') or not item.get('description'):
+                continue
+            indicators.append({
+                'type': str(item['type']),
+                'severity': severity,
+                'description': str(item['description'])
+            })
+        parsed['risk_indicators'] = indicators
+        
+        return parsed
+
+    def _run_sections(self, tender_data: Dict[str, Any], sections: List[str]) -> Tuple[Dict[str, str], List[str]]:
+        """
+        Выполнение разделов анализа
+        
+        В параллельном режиме каждый раздел выполняется в отдельном потоке,
+        и время ожидания ограничено section_timeout. Возвращает результаты
+        разделов и список разделов, завершившихся ошибкой или по таймауту.
+        """
+        results = {}
+        failed = []
+        
+        if not self.concurrent or len(sections) < 2:
+            for section in sections:
+                try:
+                    results[section] = getattr(self, self.SECTIONS[section])(tender_data)
+                except Exception as e:
+                    logger.error(f"Error in section {section}: {str(e)}")
+                    results[section] = ANALYSIS_ERROR
+                    failed.append(section)
+            return results, failed
+        
+        executor = ThreadPoolExecutor(max_workers=len(sections), thread_name_prefix='tender-analysis')
+        try:
+            futures = {
+                executor.submit(getattr(self, self.SECTIONS[section]), tender_data): section
+                for section in sections
+            }
+            done, not_done = wait(futures, timeout=self.section_timeout)
+            
+            for future, section in futures.items():
+                if future in not_done:
+                    logger.error(f"Section {section} timed out after {self.section_timeout}s")
+                    future.cancel()
+                    results[section] = ANALYSIS_ERROR
+                    failed.append(section)
+                    continue
+                try:
+                    results[section] = future.result()
+                except Exception as e:
+                    logger.error(f"Error in section {section}: {str(e)}")
+                    results[section] = ANALYSIS_ERROR
+                    failed.append(section)
+        finally:
+            # Зависшие вызовы g4f не блокируют возврат результата
+            executor.shutdown(wait=False)
+        
+        # Сохраняем порядок разделов
+        return {section: results[section] for section in sections}, failed
+
     def _analyze_technical(self, tender_data: Dict[str, Any]) -> str:
         """
         Анализ технического задания
@@ -102,11 +488,7 @@ class TenderAnalyzer:
         Предоставь структурированный анализ с конкретными выводами по каждому пункту.
         """
         
-        response = g4f.ChatCompletion.create(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        return response
+        return self._complete(prompt)
 
     def _analyze_budget(self, tender_data: Dict[str, Any]) -> str:
         """
@@ -135,11 +517,7 @@ class TenderAnalyzer:
         Предоставь детальный анализ с количественными оценками и конкретными выводами.
         """
         
-        response = g4f.ChatCompletion.create(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        return response
+        return self._complete(prompt)
 
     def _analyze_risks(self, tender_data: Dict[str, Any]) -> str:
         """
@@ -175,11 +553,7 @@ class TenderAnalyzer:
         - Рекомендуемые меры по снижению риска
         """
         
-        response = g4f.ChatCompletion.create(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        return response
+        return self._complete(prompt)
 
     def _analyze_compliance(self, tender_data: Dict[str, Any]) -> str:
         """
@@ -207,11 +581,7 @@ class TenderAnalyzer:
         Выяви потенциальные несоответствия и нарушения законодательства.
         """
         
-        response = g4f.ChatCompletion.create(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        return response
+        return self._complete(prompt)
 
     def _generate_recommendations(self, tender_data: Dict[str, Any]) -> str:
         """
@@ -238,67 +608,18 @@ class TenderAnalyzer:
         Рекомендации должны быть конкретными, практическими и применимыми.
         """
         
-        response = g4f.ChatCompletion.create(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        return response
+        return self._complete(prompt)
         
     def _calculate_risk_score(self, analysis_results: Dict[str, str]) -> float:
         """
         Расчет интегральной оценки риска контракта
         
         Анализирует результаты всех видов анализа и вычисляет
-        общую оценку риска по шкале от 0 до 100.
+        общую оценку риска по шкале от 0 до 100. Расчет выполняет
+        risk_scorer (по умолчанию KeywordRiskScorer).
         """
         try:
-            # Анализ ключевых слов риска в результатах анализа
-            risk_keywords = [
-                "высокий риск", "серьезные нарушения", "критические проблемы",
-                "несоответствие требованиям", "завышение цены", "коррупционные риски",
-                "недобросовестный поставщик", "срыв сроков", "некачественное исполнение"
-            ]
-            
-            warning_keywords = [
-                "средний риск", "потенциальные проблемы", "требует внимания",
-                "возможные нарушения", "неоптимальная цена", "сомнительные условия"
-            ]
-            
-            # Подсчет упоминаний рисков
-            risk_count = 0
-            warning_count = 0
-            
-            for analysis_text in analysis_results.values():
-                if isinstance(analysis_text, str):
-                    for keyword in risk_keywords:
-                        risk_count += analysis_text.lower().count(keyword.lower())
-                    
-                    for keyword in warning_keywords:
-                        warning_count += analysis_text.lower().count(keyword.lower())
-            
-            # Расчет базовой оценки риска
-            base_score = min(100, (risk_count * 10 + warning_count * 5))
-            
-            # Анализ бюджета на предмет аномалий
-            budget_analysis = analysis_results.get('budget_analysis', '')
-            if isinstance(budget_analysis, str):
-                if "завышение цены" in budget_analysis.lower():
-                    base_score += 15
-                if "необоснованное ценообразование" in budget_analysis.lower():
-                    base_score += 10
-            
-            # Анализ соответствия требованиям
-            compliance_analysis = analysis_results.get('compliance_analysis', '')
-            if isinstance(compliance_analysis, str):
-                if "нарушение закона" in compliance_analysis.lower():
-                    base_score += 20
-                if "несоответствие требованиям" in compliance_analysis.lower():
-                    base_score += 15
-            
-            # Нормализация оценки
-            final_score = min(100, max(0, base_score))
-            
-            return final_score
+            return self.risk_scorer.score(analysis_results)
             
         except Exception as e:
             logger.error(f"Error calculating risk score: {str(e)}")
@@ -374,6 +695,15 @@ class TenderAnalyzer:
                     continue
                 break
             
+            # Индикаторы риска из структурированного анализа
+            for indicator in analysis_results.get('risk_indicators', []):
+                if indicator['severity'] in ('high', 'critical'):
+                    anomalies.append({
+                        'anomaly_type': indicator['type'][:50],
+                        'description': indicator['description'],
+                        'severity': indicator['severity']
+                    })
+            
             # Оценка риска на основе интегрального показателя
             risk_score = analysis_results.get('risk_score', 0)
             if risk_score > 75:
@@ -399,24 +729,9 @@ class TenderAnalyzer:
         if not self.confidential_mode:
             return analysis_results
             
-        sanitized_results = {}
+        # Маскирование ИНН, email и телефонов за один проход по каждому полю
+        sanitized_results = default_sanitizer.sanitize_dict(analysis_results)
         
-        # Маскирование персональных данных и коммерческой информации
-        for key, value in analysis_results.items():
-            if isinstance(value, str):
-                # Маскирование ИНН
-                value = re.sub(r'\b\d{10,12}\b', '[ИНН]', value)
-                
-                # Маскирование email
-                value = re.sub(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', '[EMAIL]', value)
-                
-                # Маскирование телефонов
-                value = re.sub(r'\b(?:\+7|8)[\s\-]?\(?\d{3}\)?[\s\-]?\d{3}[\s\-]?\d{2}[\s\-]?\d{2}\b', '[ТЕЛЕФОН]', value)
-                
-                sanitized_results[key] = value
-            else:
-                sanitized_results[key] = value
-                
         # Добавление метки о конфиденциальном режиме
         sanitized_results['confidential_mode'] = True
         
@@ -459,10 +774,7 @@ class TenderAnalyzer:
             Предоставь детальный анализ с конкретными выводами и рекомендациями.
             """
             
-            response = g4f.ChatCompletion.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}]
-            )
+            response = self._complete(prompt)
             
             # Расчет процента выполнения
             completed_milestones = sum(1 for m in milestones if m.get('status') == 'completed')
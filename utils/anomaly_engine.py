@@ -0,0 +1,138 @@
+from datetime import datetime
+import logging
+from typing import Dict, Any, List, Optional
+import numpy as np
+from models import Tender, Anomaly, db
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Пороги правил выявления аномалий
+MIN_PRICE_REDUCTION = 0.005  # снижение цены менее 0.5%
+DUMPING_PRICE_REDUCTION = 0.4  # снижение цены более 40%
+SHORT_DEADLINE_DAYS = 10  # срок исполнения менее 10 дней
+
+# Источник записей Anomaly, созданных правилами
+RULE_SOURCE = 'rules'
+
+# Аномалии, выявляемые правилами без обращения к модели
+RULE_ANOMALIES = {
+    'price_reduction': {
+        'description': 'Аномально низкое снижение цены контракта',
+        'severity': 'medium'
+    },
+    'dumping': {
+        'description': 'Возможный демпинг цены, риск некачественного исполнения',
+        'severity': 'high'
+    },
+    'short_deadline': {
+        'description': 'Аномально короткий срок исполнения контракта',
+        'severity': 'high'
+    }
+}
+
+def evaluate_rules(price: np.ndarray, initial_price: np.ndarray,
+                   publication_date: np.ndarray, execution_deadline: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Векторная проверка правил для массивов значений
+    
+    price и initial_price - массивы float (NaN для пустых значений),
+    даты - массивы datetime64 (NaT для пустых значений). Возвращает
+    булеву маску для каждого типа аномалии из RULE_ANOMALIES.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        has_prices = (np.nan_to_num(price) != 0) & (np.nan_to_num(initial_price) != 0)
+        reduction = np.where(has_prices, (initial_price - price) / np.where(has_prices, initial_price, 1), 0)
+    
+    has_dates = ~np.isnat(publication_date) & ~np.isnat(execution_deadline)
+    days = np.zeros(len(price), dtype=np.int64)
+    days[has_dates] = (execution_deadline[has_dates] - publication_date[has_dates]) // np.timedelta64(1, 'D')
+    
+    return {
+        'price_reduction': has_prices & (reduction > 0) & (reduction < MIN_PRICE_REDUCTION),
+        'dumping': has_prices & (reduction > DUMPING_PRICE_REDUCTION),
+        'short_deadline': has_dates & (days < SHORT_DEADLINE_DAYS)
+    }
+
+def scan_tenders(chunk_size: int = 50000, resolve_stale: bool = True) -> Dict[str, int]:
+    """
+    Выявление аномалий по правилам для всех тендеров
+    
+    Загружает только нужные столбцы страницами по chunk_size, проверяет
+    правила над массивами и пакетно добавляет записи Anomaly для новых
+    срабатываний. Если resolve_stale, открытые аномалии этих типов,
+    созданные правилами (source = RULE_SOURCE), для которых правило больше
+    не выполняется, помечаются решенными. Аномалии тех же типов из
+    ИИ-анализа не закрываются: правила их не проверяли.
+    """
+    stats = {'scanned': 0, 'created': 0, 'resolved': 0}
+    rule_types = list(RULE_ANOMALIES)
+    last_id = 0
+    
+    while True:
+        rows = db.session.query(
+            Tender.id, Tender.price, Tender.initial_price,
+            Tender.publication_date, Tender.execution_deadline
+        ).filter(Tender.id > last_id).order_by(Tender.id).limit(chunk_size).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        
+        ids, prices, initial_prices, publication_dates, deadlines = zip(*rows)
+        ids = np.array(ids, dtype=np.int64)
+        masks = evaluate_rules(
+            np.array(prices, dtype=np.float64),
+            np.array(initial_prices, dtype=np.float64),
+            np.array(publication_dates, dtype='datetime64[s]'),
+            np.array(deadlines, dtype='datetime64[s]')
+        )
+        
+        # Уже открытые аномалии этих типов для тендеров страницы; закрываются только созданные правилами
+        existing = set()
+        rule_created = {}
+        for anomaly_id, tender_id, anomaly_type, source in db.session.query(
+                Anomaly.id, Anomaly.tender_id, Anomaly.anomaly_type, Anomaly.source).filter(
+                Anomaly.tender_id >= int(ids[0]), Anomaly.tender_id <= int(ids[-1]),
+                Anomaly.anomaly_type.in_(rule_types), Anomaly.status == 'open'):
+            existing.add((tender_id, anomaly_type))
+            if source == RULE_SOURCE:
+                rule_created[(tender_id, anomaly_type)] = anomaly_id
+        
+        now = datetime.utcnow()
+        new_rows = []
+        resolved_rows = []
+        for anomaly_type, mask in masks.items():
+            detected = set(ids[mask].tolist())
+            for tender_id in detected:
+                if (tender_id, anomaly_type) not in existing:
+                    new_rows.append(dict(
+                        tender_id=tender_id,
+                        anomaly_type=anomaly_type,
+                        detected_at=now,
+                        status='open',
+                        source=RULE_SOURCE,
+                        **RULE_ANOMALIES[anomaly_type]
+                    ))
+            if resolve_stale:
+                for (tender_id, existing_type), anomaly_id in rule_created.items():
+                    if existing_type == anomaly_type and tender_id not in detected:
+                        resolved_rows.append({
+                            'id': anomaly_id,
+                            'status': 'resolved',
+                            'resolved_at': now,
+                            'resolution_notes': 'Условие правила больше не выполняется'
+                        })
+        
+        if new_rows:
+            db.session.bulk_insert_mappings(Anomaly, new_rows)
+        if resolved_rows:
+            db.session.bulk_update_mappings(Anomaly, resolved_rows)
+        db.session.commit()
+        
+        stats['scanned'] += len(rows)
+        stats['created'] += len(new_rows)
+        stats['resolved'] += len(resolved_rows)
+    
+    logger.info(f"Rule anomaly scan: {stats['scanned']} tenders, "
+                f"{stats['created']} new anomalies, {stats['resolved']} resolved")
+    return stats
@@ -0,0 +1,96 @@
+import codecs
+import logging
+from typing import Iterator, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TEXT_EXTENSIONS = ('.txt', '.md', '.py', '.js', '.html', '.css', '.json', '.csv', '.xml')
+
+# Кодировки, среди которых выбирается кодировка текста без BOM, не являющегося UTF-8;
+# без ограничения короткие русские тексты часто распознаются как восточноазиатские
+CANDIDATE_ENCODINGS = ['cp1251', 'koi8_r', 'cp866', 'iso8859_5', 'latin_1']
+FALLBACK_ENCODING = 'cp1251'
+
+BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16')
+)
+
+def is_text_attachment(filename: str, content_type: Optional[str]) -> bool:
+    """Проверка, что вложение можно передать модели как текст"""
+    return (content_type or '').startswith('text/') or filename.lower().endswith(TEXT_EXTENSIONS)
+
+def detect_encoding(sample: bytes) -> str:
+    """
+    Определение кодировки по начальному фрагменту файла
+
+    Проверяет BOM и UTF-8, затем charset_normalizer, если он установлен.
+    """
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding
+
+    try:
+        # Фрагмент мог оборваться посреди многобайтового символа
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+
+    try:
+        from charset_normalizer import from_bytes
+        match = from_bytes(sample, cp_isolation=CANDIDATE_ENCODINGS).best()
+        if match is not None:
+            return match.encoding
+    except ImportError:
+        pass
+    return FALLBACK_ENCODING
+
+def iter_text(stream, limit: int, chunk_size: int = 65536) -> Iterator[str]:
+    """
+    Чтение текста из двоичного потока по фрагментам
+
+    Кодировка определяется по первому фрагменту. Чтение прекращается,
+    как только декодировано limit символов; в памяти находится не больше
+    одного фрагмента файла.
+    """
+    decoder = None
+    remaining = limit
+    while remaining > 0:
+        data = stream.read(chunk_size)
+        if decoder is None:
+            decoder = codecs.getincrementaldecoder(detect_encoding(data))(errors='replace')
+        text = decoder.decode(data, final=not data)
+        if text:
+            yield text[:remaining]
+            remaining -= len(text)
+        if not data:
+            break
+
+def read_attachment(file, limit: int, sanitizer=None, chunk_size: int = 65536) -> Tuple[str, bool]:
+    """
+    Текст вложения чата в пределах limit символов
+
+    file - загруженный файл werkzeug: небольшие файлы уже находятся в памяти,
+    крупные werkzeug сам сохраняет во временный файл, поэтому отдельная копия
+    на диске не создается. Если передан sanitizer, текст маскируется по
+    фрагментам. Возвращает (текст, обрезан ли файл).
+    """
+    # Читаем на символ больше предела, чтобы отличить обрезанный файл от файла ровно в limit символов.
+    # При маскировании читаем еще и перекрытие, чтобы данные на границе обрезки были замаскированы целиком
+    read_limit = limit + 1 + (sanitizer.overlap if sanitizer is not None else 0)
+    read = 0
+
+    def counted(chunks):
+        nonlocal read
+        for chunk in chunks:
+            read += len(chunk)
+            yield chunk
+
+    chunks = counted(iter_text(file.stream, read_limit, chunk_size=chunk_size))
+    if sanitizer is not None:
+        chunks = sanitizer.sanitize_stream(chunks)
+    text = ''.join(chunks)
+    return text[:limit], read > limit
@@ -0,0 +1,264 @@
+from datetime import datetime
+import json
+import logging
+from typing import Dict, Any, Iterable, Iterator, Tuple, Optional, Callable
+from sqlalchemy import func
+from models import Tender, TenderHistory, Analysis, Anomaly, db
+from .analyzer import TenderAnalyzer, ANALYSIS_ERROR
+from .risk_scorer import KeywordRiskScorer
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def tender_to_data(tender: Tender) -> Dict[str, Any]:
+    """
+    Преобразование модели Tender в словарь для TenderAnalyzer
+    
+    Анализ выполняется в рабочих потоках, поэтому в них передаются
+    простые словари, а не объекты сессии SQLAlchemy.
+    """
+    return {
+        'id': tender.id,
+        'tender_id': tender.tender_id,
+        'title': tender.title,
+        'description': tender.description or '',
+        'customer': tender.customer,
+        'supplier': tender.supplier,
+        'price': tender.price,
+        'initial_price': tender.initial_price,
+        'publication_date': tender.publication_date,
+        'execution_deadline': tender.execution_deadline
+    }
+
+def iter_tender_data(query, chunk_size: int = 500) -> Iterator[Dict[str, Any]]:
+    """
+    Постраничная выборка тендеров по возрастанию id
+    
+    Использует keyset-пагинацию: в памяти находится не более chunk_size
+    объектов, а каждая страница запрашивается заново, поэтому уже
+    проанализированные записи отсекаются фильтрами запроса.
+    """
+    last_id = 0
+    while True:
+        chunk = query.filter(Tender.id > last_id).order_by(Tender.id).limit(chunk_size).all()
+        if not chunk:
+            break
+        last_id = chunk[-1].id
+        data = [tender_to_data(tender) for tender in chunk]
+        # Освобождаем объекты страницы, не затрагивая несохраненные результаты
+        for tender in chunk:
+            db.session.expunge(tender)
+        yield from data
+
+def persist_analyses(results: Iterable[Tuple[Dict[str, Any], Dict[str, Any]]], batch_size: int = 50,
+                     user_id: Optional[int] = None,
+                     on_commit: Optional[Callable[[Dict[str, int]], None]] = None) -> Dict[str, int]:
+    """
+    Сохранение результатов пакетного анализа
+    
+    Создает записи Analysis и новые записи Anomaly (без повторов открытых
+    аномалий того же типа) и фиксирует их пачками по batch_size.
+    Результаты, в которых не удался ни один раздел, не сохраняются, чтобы
+    тендер попал в повторный запуск. После каждой фиксации вызывается
+    on_commit со статистикой.
+    """
+    stats = {'saved': 0, 'failed': 0, 'anomalies': 0}
+    in_batch = 0
+    
+    for tender_data, analysis_results in results:
+        if all(analysis_results.get(section) == ANALYSIS_ERROR for section in (
+                'technical_analysis', 'budget_analysis', 'risk_analysis',
+                'compliance_analysis', 'recommendations')):
+            logger.error(f"Analysis of tender {tender_data.get('tender_id')} failed, skipping")
+            stats['failed'] += 1
+            continue
+        
+        db.session.add(Analysis(
+            tender_id=tender_data['id'],
+            user_id=user_id,
+            technical_analysis=analysis_results.get('technical_analysis'),
+            budget_analysis=analysis_results.get('budget_analysis'),
+            risk_analysis=analysis_results.get('risk_analysis'),
+            compliance_analysis=analysis_results.get('compliance_analysis'),
+            recommendations=analysis_results.get('recommendations'),
+            risk_score=analysis_results.get('risk_score'),
+            risk_indicators=json.dumps(analysis_results.get('risk_indicators', []), ensure_ascii=False),
+            section_fingerprints=json.dumps(analysis_results.get('section_fingerprints', {})),
+            is_confidential=analysis_results.get('confidential_mode', False)
+        ))
+        stats['anomalies'] += _add_anomalies(tender_data['id'], analysis_results.get('anomalies', []))
+        
+        stats['saved'] += 1
+        in_batch += 1
+        
+        if in_batch >= batch_size:
+            _commit_batch(stats, on_commit)
+            in_batch = 0
+    
+    if in_batch:
+        _commit_batch(stats, on_commit)
+    
+    return stats
+
+def _add_anomalies(tender_id: int, anomalies: Iterable[Dict[str, Any]]) -> int:
+    """
+    Добавление аномалий тендера без повторов
+    
+    Аномалия не добавляется, если у тендера уже есть открытая аномалия
+    того же типа (например, после повторного запуска с --resume или
+    параллельного reanalyze-changed). Возвращает число добавленных записей.
+    """
+    open_types = {
+        anomaly_type for (anomaly_type,) in db.session.query(Anomaly.anomaly_type).filter_by(
+            tender_id=tender_id, status='open'
+        )
+    }
+    added = 0
+    for anomaly in anomalies:
+        if anomaly['anomaly_type'] in open_types:
+            continue
+        db.session.add(_anomaly_row(tender_id, anomaly))
+        open_types.add(anomaly['anomaly_type'])
+        added += 1
+    return added
+
+def _anomaly_row(tender_id: int, anomaly: Dict[str, Any]) -> Anomaly:
+    """Создание записи Anomaly из результата анализа"""
+    return Anomaly(
+        tender_id=tender_id,
+        anomaly_type=anomaly['anomaly_type'],
+        description=anomaly['description'],
+        severity=anomaly.get('severity', 'medium'),
+        source='analysis'
+    )
+
+def _commit_batch(stats: Dict[str, int], on_commit: Optional[Callable[[Dict[str, int]], None]]):
+    """Фиксация пачки результатов"""
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    db.session.expunge_all()
+    logger.info(f"Bulk analysis: saved {stats['saved']}, failed {stats['failed']}, anomalies {stats['anomalies']}")
+    if on_commit:
+        on_commit(dict(stats))
+
+def pending_tenders_query(started_at: datetime, status=None, customer: Optional[str] = None,
+                          published_since: Optional[datetime] = None):
+    """
+    Запрос тендеров, еще не проанализированных в текущем запуске
+    
+    Тендеры, для которых уже есть Analysis, созданный после started_at,
+    исключаются - это позволяет продолжить прерванный запуск.
+    """
+    query = Tender.query.filter(~Tender.analyses.any(Analysis.created_at >= started_at))
+    if status is not None:
+        query = query.filter(Tender.status == status)
+    if customer:
+        query = query.filter(Tender.customer.ilike(f"%{customer}%"))
+    if published_since:
+        query = query.filter(Tender.publication_date >= published_since)
+    return query
+
+def changed_tenders_query():
+    """
+    Запрос тендеров, измененных после последнего анализа
+    
+    Тендер попадает в выборку, если у него есть запись TenderHistory
+    новее последнего обновления его анализа.
+    """
+    latest = db.session.query(
+        Analysis.tender_id,
+        func.max(Analysis.updated_at).label('analyzed_at')
+    ).group_by(Analysis.tender_id).subquery()
+    
+    return Tender.query.join(latest, latest.c.tender_id == Tender.id).filter(
+        Tender.history.any(TenderHistory.changed_at > latest.c.analyzed_at)
+    )
+
+def reanalyze_changed_tenders(analyzer: TenderAnalyzer, batch_size: int = 50) -> Dict[str, int]:
+    """
+    Инкрементальный повторный анализ измененных тендеров
+    
+    Для каждого тендера из changed_tenders_query обновляет последнюю
+    запись Analysis, повторно запрашивая у модели только разделы с
+    изменившимися входными данными. Новые типы аномалий добавляются
+    как открытые записи Anomaly. Если не удался ни один из повторно
+    запрошенных разделов, анализ не изменяется и тендер остается в
+    выборке следующего запуска.
+    """
+    stats = {'updated': 0, 'failed': 0, 'sections': 0, 'anomalies': 0}
+    in_batch = 0
+    
+    for tender_data in iter_tender_data(changed_tenders_query()):
+        analysis = Analysis.query.filter_by(tender_id=tender_data['id']).order_by(Analysis.updated_at.desc()).first()
+        previous = {section: getattr(analysis, section) for section in TenderAnalyzer.SECTIONS}
+        previous['section_fingerprints'] = json.loads(analysis.section_fingerprints or '{}')
+        previous['risk_indicators'] = json.loads(analysis.risk_indicators or '[]')
+        
+        analysis_results = analyzer.analyze_incremental(tender_data, previous)
+        
+        failed_sections = analysis_results.get('failed_sections', [])
+        requested = analysis_results.get('reanalyzed_sections', list(TenderAnalyzer.SECTIONS))
+        if failed_sections and len(failed_sections) >= len(requested):
+            logger.error(f"Incremental analysis of tender {tender_data.get('tender_id')} failed, skipping")
+            stats['failed'] += 1
+            continue
+        
+        for section in TenderAnalyzer.SECTIONS:
+            setattr(analysis, section, analysis_results[section])
+        analysis.risk_score = analysis_results['risk_score']
+        analysis.risk_indicators = json.dumps(analysis_results.get('risk_indicators', []), ensure_ascii=False)
+        analysis.section_fingerprints = json.dumps(analysis_results.get('section_fingerprints', {}))
+        analysis.updated_at = datetime.utcnow()
+        
+        stats['anomalies'] += _add_anomalies(tender_data['id'], analysis_results.get('anomalies', []))
+        
+        stats['updated'] += 1
+        stats['sections'] += len(analysis_results.get('reanalyzed_sections', []))
+        in_batch += 1
+        
+        if in_batch >= batch_size:
+            db.session.commit()
+            in_batch = 0
+    
+    db.session.commit()
+    logger.info(f"Incremental analysis: updated {stats['updated']} tenders, failed {stats['failed']}, "
+                f"re-ran {stats['sections']} sections, new anomalies {stats['anomalies']}")
+    return stats
+
+def rescore_analyses(scorer: KeywordRiskScorer, chunk_size: int = 1000) -> Dict[str, int]:
+    """
+    Пересчет оценок риска всех сохраненных анализов
+    
+    Тексты разделов читаются страницами по chunk_size без загрузки
+    объектов ORM, а новые оценки записываются пакетным UPDATE.
+    Вызовы модели не выполняются.
+    """
+    columns = [getattr(Analysis, section) for section in TenderAnalyzer.SECTIONS]
+    stats = {'scored': 0, 'changed': 0}
+    last_id = 0
+    
+    while True:
+        rows = db.session.query(Analysis.id, Analysis.risk_score, *columns).filter(
+            Analysis.id > last_id
+        ).order_by(Analysis.id).limit(chunk_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        
+        updates = []
+        for row in rows:
+            risk_score = scorer.score({section: getattr(row, section) for section in TenderAnalyzer.SECTIONS})
+            if risk_score != row.risk_score:
+                updates.append({'id': row.id, 'risk_score': risk_score})
+        
+        if updates:
+            db.session.bulk_update_mappings(Analysis, updates)
+            db.session.commit()
+        stats['scored'] += len(rows)
+        stats['changed'] += len(updates)
+    
+    logger.info(f"Rescored {stats['scored']} analyses, {stats['changed']} changed")
+    return stats
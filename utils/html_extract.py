@@ -0,0 +1,150 @@
+import re
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Блок одной записи реестра на странице результатов поиска ЕИС
+ENTRY_CLASS = 'search-registry-entry-block'
+
+# Классы элементов записи и поля, которые из них извлекаются; при
+# повторе класса используется первый элемент в порядке документа
+FIELD_CLASSES = {
+    'registry-entry__header-mid__number': 'number',
+    'registry-entry__header-mid-title': 'title',
+    'registry-entry__header-mid__title': 'status',
+    'registry-entry__body-value': 'description',
+    'registry-entry__body-href': 'customer',
+    'price-block__value': 'price',
+    'data-block__value': 'date'
+}
+
+def parse_price(text: Optional[str]) -> Optional[float]:
+    """Цена из текста ЕИС с неразрывными пробелами и знаком рубля: "1 234,56 ₽" """
+    if not text:
+        return None
+    try:
+        return float(re.sub(r'[^\d,.]', '', text).replace(',', '.'))
+    except ValueError:
+        return None
+
+def parse_date(text: Optional[str]) -> Optional[datetime]:
+    if not text:
+        return None
+    try:
+        return datetime.strptime(text, '%d.%m.%Y')
+    except ValueError:
+        return None
+
+class Extractor:
+    """
+    Извлечение записей реестра из страницы результатов поиска
+
+    extract возвращает для каждой записи словарь {поле: текст} по FIELD_CLASSES.
+    Если на странице нет блоков записей, вся страница считается одной записью.
+    """
+    name = ''
+
+    def extract(self, html: str) -> List[Dict[str, str]]:
+        raise NotImplementedError
+
+class SoupExtractor(Extractor):
+    """Полное дерево html.parser и отдельный поиск каждого поля"""
+    name = 'soup'
+
+    def extract(self, html: str) -> List[Dict[str, str]]:
+        soup = BeautifulSoup(html, 'html.parser')
+        entries = soup.find_all('div', {'class': ENTRY_CLASS}) or [soup]
+        return [self._fields(entry) for entry in entries]
+
+    @staticmethod
+    def _fields(entry) -> Dict[str, str]:
+        fields = {}
+        for css_class, field in FIELD_CLASSES.items():
+            element = entry.find('div', {'class': css_class})
+            if element is not None:
+                fields[field] = element.text.strip()
+        return fields
+
+class StrainerExtractor(Extractor):
+    """
+    Дерево только из блоков записей (SoupStrainer) и один обход записи
+
+    Разметка вне записей (меню, фильтры, скрипты) не попадает в дерево.
+    Используется парсер lxml, если он установлен.
+    """
+    name = 'strainer'
+
+    def __init__(self):
+        self.features = 'lxml' if lxml is not None else 'html.parser'
+        # При разборе класс элемента еще не разбит на список, поэтому сравнение по регулярному выражению
+        self.strainer = SoupStrainer('div', {'class': re.compile(rf'(?:^|\s){ENTRY_CLASS}(?:\s|$)')})
+
+    def extract(self, html: str) -> List[Dict[str, str]]:
+        entries = BeautifulSoup(html, self.features, parse_only=self.strainer).find_all(
+            'div', {'class': ENTRY_CLASS}, recursive=False)
+        if not entries:
+            # Страница без блоков записей: разбираем целиком
+            entries = [BeautifulSoup(html, self.features)]
+        return [self._fields(entry) for entry in entries]
+
+    @staticmethod
+    def _fields(entry) -> Dict[str, str]:
+        fields = {}
+        for element in entry.find_all('div', {'class': list(FIELD_CLASSES)}):
+            for css_class in element.get('class', ()):
+                field = FIELD_CLASSES.get(css_class)
+                if field is not None and field not in fields:
+                    fields[field] = element.get_text().strip()
+        return fields
+
+class LxmlExtractor(Extractor):
+    """Дерево lxml и один обход элементов каждой записи"""
+    name = 'lxml'
+
+    ENTRY_XPATH = f'//div[contains(concat(" ", normalize-space(@class), " "), " {ENTRY_CLASS} ")]'
+
+    def extract(self, html: str) -> List[Dict[str, str]]:
+        document = lxml.html.document_fromstring(html)
+        entries = document.xpath(self.ENTRY_XPATH) or [document]
+        return [self._fields(entry) for entry in entries]
+
+    @staticmethod
+    def _fields(entry) -> Dict[str, str]:
+        fields = {}
+        for element in entry.iter('div'):
+            css_classes = element.get('class')
+            if not css_classes:
+                continue
+            for css_class in css_classes.split():
+                field = FIELD_CLASSES.get(css_class)
+                if field is not None and field not in fields:
+                    fields[field] = element.text_content().strip()
+        return fields
+
+EXTRACTORS = {
+    SoupExtractor.name: SoupExtractor,
+    StrainerExtractor.name: StrainerExtractor,
+    LxmlExtractor.name: LxmlExtractor
+}
+
+def get_extractor(name: str) -> Extractor:
+    """
+    Способ извлечения по имени: soup, strainer или lxml
+
+    Без установленного lxml вместо него используется strainer с html.parser.
+    """
+    if name not in EXTRACTORS:
+        raise ValueError(f"Неизвестный способ извлечения: {name}")
+    if name == LxmlExtractor.name and lxml is None:
+        logger.warning("lxml is not installed, falling back to the strainer extractor")
+        name = StrainerExtractor.name
+    return EXTRACTORS[name]()
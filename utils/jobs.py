@@ -0,0 +1,261 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Callable
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Текст ошибки задачи, рабочий процесс которой завершился до ее окончания
+LOST_JOB_ERROR = 'Задача прервана: рабочий процесс веб-сервера был перезапущен'
+
+class QueueFullError(Exception):
+    """Очередь фоновых задач заполнена"""
+
+class Job:
+    """Фоновая задача и ее результат"""
+    def __init__(self, kind: str, job_id: Optional[str] = None, owner: Optional[str] = None):
+        self.id = job_id or uuid.uuid4().hex
+        self.kind = kind
+        self.owner = owner or process_owner()
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+        if self.status == 'done':
+            data['result'] = self.result
+        elif self.status == 'failed':
+            data['error'] = self.error
+        return data
+
+def process_owner() -> str:
+    """Идентификатор текущего процесса: сервер и pid"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def _owner_alive(owner: str) -> bool:
+    """Жив ли процесс-владелец; о процессах других серверов судить нельзя"""
+    host, _, pid = owner.rpartition(':')
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class JobStore:
+    """
+    Состояние фоновых задач в SQLite
+
+    Файл базы общий для всех рабочих процессов веб-сервера на одном
+    сервере, поэтому статус задачи можно запросить у любого процесса,
+    а не только у принявшего ее. Результат хранится в JSON.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        if path != ':memory:':
+            # Чтение статуса другими процессами не блокирует запись результата
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, "
+            "kind TEXT NOT NULL, "
+            "owner TEXT NOT NULL, "
+            "status TEXT NOT NULL, "
+            "result TEXT, "
+            "error TEXT, "
+            "created_at REAL NOT NULL, "
+            "started_at REAL, "
+            "finished_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_finished_at ON jobs (finished_at)")
+        self._conn.commit()
+
+    def save(self, job: Job):
+        """Сохранение текущего состояния задачи"""
+        result = json.dumps(job.result, ensure_ascii=False, default=str) if job.status == 'done' else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, kind, owner, status, result, error, created_at, started_at, finished_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job.id, job.kind, job.owner, job.status, result, job.error,
+                 job.created_at, job.started_at, job.finished_at)
+            )
+            self._conn.commit()
+
+    def load(self, job_id: str) -> Optional[Job]:
+        """
+        Задача по идентификатору
+
+        Незавершенная задача, процесс-владелец которой уже не работает,
+        помечается как завершившаяся ошибкой LOST_JOB_ERROR.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT kind, owner, status, result, error, created_at, started_at, finished_at "
+                "FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        job = Job(row[0], job_id=job_id, owner=row[1])
+        job.status, job.error, job.created_at, job.started_at, job.finished_at = row[2], row[4], row[5], row[6], row[7]
+        if row[3] is not None:
+            job.result = json.loads(row[3])
+        if job.status in ('queued', 'running') and not _owner_alive(job.owner):
+            job.status = 'failed'
+            job.error = LOST_JOB_ERROR
+            job.finished_at = time.time()
+            self.save(job)
+        if job.finished_at is not None:
+            job.done.set()
+        return job
+
+    def prune(self, cutoff: float):
+        """Удаление задач, завершившихся до cutoff"""
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE finished_at < ?", (cutoff,))
+            self._conn.commit()
+
+class JobQueue:
+    """
+    Очередь фоновых задач для долгих запросов к моделям
+
+    Задачи выполняются в ограниченном пуле потоков, поэтому рабочий процесс
+    веб-сервера освобождается сразу после постановки задачи. Если задач
+    в работе и в ожидании больше max_pending, новая задача отклоняется.
+    Завершенные задачи хранятся result_ttl секунд.
+
+    Задача выполняется в процессе, который ее принял, и ограничение
+    max_pending действует на каждый процесс отдельно. Если задано хранилище
+    store, состояние задач записывается в него, и статус доступен из всех
+    процессов веб-сервера (gunicorn с несколькими workers); задачи
+    перезапущенного процесса получают статус failed. Без store состояние
+    хранится только в памяти процесса, и запускать веб-сервер нужно
+    с одним рабочим процессом.
+    """
+    # Интервал опроса хранилища при ожидании задачи другого процесса
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, max_workers: int = 8, max_pending: int = 32, result_ttl: float = 3600,
+                 store: Optional[JobStore] = None):
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.store = store
+        self._jobs = {}
+        self._active = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+
+    def submit(self, kind: str, fn: Callable[..., Any], *args, **kwargs) -> Job:
+        """
+        Постановка задачи fn(*args, **kwargs) в очередь
+
+        Вызывает QueueFullError, если очередь заполнена.
+        """
+        job = Job(kind)
+        with self._lock:
+            self._prune()
+            if self._active >= self.max_pending:
+                raise QueueFullError(f"В очереди уже {self._active} задач")
+            self._active += 1
+            self._jobs[job.id] = job
+
+        try:
+            self._save(job)
+            self._executor.submit(self._run, job, fn, args, kwargs)
+        except Exception:
+            with self._lock:
+                self._active -= 1
+                self._jobs.pop(job.id, None)
+            raise
+        return job
+
+    def _run(self, job: Job, fn: Callable[..., Any], args, kwargs):
+        job.started_at = time.time()
+        job.status = 'running'
+        self._save(job)
+        try:
+            job.result = fn(*args, **kwargs)
+            job.status = 'done'
+        except Exception as e:
+            logger.error(f"Error in {job.kind} job {job.id}: {str(e)}")
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished_at = time.time()
+            self._save(job)
+            with self._lock:
+                self._active -= 1
+            job.done.set()
+
+    def _save(self, job: Job):
+        if self.store is None:
+            return
+        try:
+            self.store.save(job)
+        except Exception as e:
+            # Задача продолжает выполняться, ее статус доступен в этом процессе
+            logger.error(f"Error saving {job.kind} job {job.id}: {str(e)}")
+
+    def _prune(self):
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+        if self.store is not None:
+            self.store.prune(cutoff)
+
+    def get(self, job_id: str, wait: float = 0) -> Optional[Job]:
+        """
+        Задача по идентификатору
+
+        При wait > 0 ожидает завершения задачи не дольше wait секунд.
+        Задачи других процессов читаются из хранилища.
+        """
+        job = self._jobs.get(job_id)
+        if job is not None:
+            if wait > 0:
+                job.done.wait(wait)
+            return job
+        if self.store is None:
+            return None
+
+        deadline = time.monotonic() + wait
+        while True:
+            job = self.store.load(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job.done.is_set() or remaining <= 0:
+                return job
+            time.sleep(min(self.POLL_INTERVAL, remaining))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'active': self._active, 'stored': len(self._jobs), 'max_pending': self.max_pending}
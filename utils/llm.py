@@ -0,0 +1,343 @@
+import g4f
+import logging
+import threading
+import time
+from typing import Dict, Any, List, Optional, Iterator
+from config import Config
+from .llm_cache import LLMCache
+from .provider_router import ProviderRouter, ProviderUnavailableError, provider_name
+from .single_flight import SingleFlight
+from .rate_limiter import ProviderLimiter, ProviderThrottledError
+from .llm_backend import LLMBackend, create_backend
+from .metrics import (LLM_REQUEST_DURATION, LLM_ERRORS, LLM_PROMPT_CHARS, LLM_RESPONSE_CHARS,
+                      LLM_CACHE_REQUESTS, provider_label)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_cache = None
+_cache_lock = threading.Lock()
+_router = None
+_router_lock = threading.Lock()
+_single_flight = SingleFlight()
+_limiter = None
+_limiter_lock = threading.Lock()
+_backend = None
+_backend_lock = threading.Lock()
+
+def init_llm_cache(app) -> Optional[LLMCache]:
+    """
+    Настройка кэша ответов моделей по конфигурации приложения
+    """
+    global _cache
+    with _cache_lock:
+        if app.config.get('LLM_CACHE_ENABLED', True):
+            _cache = LLMCache(
+                path=app.config.get('LLM_CACHE_PATH', Config.LLM_CACHE_PATH),
+                ttl=app.config.get('LLM_CACHE_TTL', Config.LLM_CACHE_TTL),
+                max_entries=app.config.get('LLM_CACHE_MAX_ENTRIES', Config.LLM_CACHE_MAX_ENTRIES)
+            )
+        else:
+            _cache = None
+    return _cache
+
+def get_llm_cache() -> Optional[LLMCache]:
+    """
+    Кэш ответов моделей
+    
+    Если кэш не был настроен через init_llm_cache (например, в планировщике
+    или скрипте), он создается по настройкам Config.
+    """
+    global _cache
+    if _cache is None and Config.LLM_CACHE_ENABLED:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMCache(
+                    path=Config.LLM_CACHE_PATH,
+                    ttl=Config.LLM_CACHE_TTL,
+                    max_entries=Config.LLM_CACHE_MAX_ENTRIES
+                )
+    return _cache
+
+def _create_router(config) -> ProviderRouter:
+    return ProviderRouter(
+        routes=config.get('LLM_ROUTES', Config.LLM_ROUTES),
+        failure_threshold=config.get('LLM_ROUTER_FAILURE_THRESHOLD', Config.LLM_ROUTER_FAILURE_THRESHOLD),
+        reset_timeout=config.get('LLM_ROUTER_RESET_TIMEOUT', Config.LLM_ROUTER_RESET_TIMEOUT),
+        hedge_after=config.get('LLM_ROUTER_HEDGE_AFTER', Config.LLM_ROUTER_HEDGE_AFTER),
+        timeout=config.get('LLM_ROUTER_TIMEOUT', Config.LLM_ROUTER_TIMEOUT),
+        max_workers=config.get('LLM_ROUTER_MAX_WORKERS', Config.LLM_ROUTER_MAX_WORKERS),
+        max_abandoned=config.get('LLM_ROUTER_MAX_ABANDONED', Config.LLM_ROUTER_MAX_ABANDONED),
+        provider_resolver=lambda name: getattr(g4f.Provider, name, None)
+    )
+
+def init_provider_router(app) -> Optional[ProviderRouter]:
+    """
+    Настройка маршрутизатора провайдеров по конфигурации приложения
+    """
+    global _router
+    with _router_lock:
+        _router = _create_router(app.config) if app.config.get('LLM_ROUTER_ENABLED', True) else None
+    return _router
+
+def get_provider_router() -> Optional[ProviderRouter]:
+    """
+    Маршрутизатор провайдеров
+    
+    Если маршрутизатор не был настроен через init_provider_router,
+    он создается по настройкам Config.
+    """
+    global _router
+    if _router is None and Config.LLM_ROUTER_ENABLED:
+        with _router_lock:
+            if _router is None:
+                _router = _create_router({})
+    return _router
+
+def _create_limiter(config) -> ProviderLimiter:
+    return ProviderLimiter(
+        limits=config.get('LLM_PROVIDER_LIMITS', Config.LLM_PROVIDER_LIMITS),
+        max_wait=config.get('LLM_LIMIT_MAX_WAIT', Config.LLM_LIMIT_MAX_WAIT),
+        max_waiting=config.get('LLM_LIMIT_MAX_WAITING', Config.LLM_LIMIT_MAX_WAITING)
+    )
+
+def init_provider_limiter(app) -> ProviderLimiter:
+    """
+    Настройка ограничений нагрузки на провайдеров по конфигурации приложения
+    """
+    global _limiter
+    with _limiter_lock:
+        _limiter = _create_limiter(app.config)
+    return _limiter
+
+def get_provider_limiter() -> ProviderLimiter:
+    """
+    Ограничения нагрузки на провайдеров
+    
+    Если ограничения не были настроены через init_provider_limiter,
+    они создаются по настройкам Config.
+    """
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = _create_limiter({})
+    return _limiter
+
+def init_llm_backend(app) -> LLMBackend:
+    """
+    Настройка бэкенда моделей по конфигурации приложения
+    """
+    global _backend
+    with _backend_lock:
+        _backend = create_backend(app.config)
+    logger.info(f"LLM backend: {_backend.name}")
+    return _backend
+
+def get_llm_backend() -> LLMBackend:
+    """
+    Бэкенд моделей
+    
+    Если бэкенд не был настроен через init_llm_backend,
+    он создается по настройкам Config.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend({})
+    return _backend
+
+def set_llm_backend(backend: Optional[LLMBackend]):
+    """Замена бэкенда моделей, например на FakeBackend в нагрузочных тестах; None - по Config"""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+def _record_call(provider, model: str, messages: List[Dict[str, Any]], started: float,
+                 response=None, error: Optional[BaseException] = None, outcome: Optional[str] = None):
+    """Запись метрик одного вызова g4f"""
+    labels = {'provider': provider_label(provider_name(provider)), 'model': model}
+    LLM_REQUEST_DURATION.observe(time.monotonic() - started, outcome=outcome or ('error' if error else 'ok'), **labels)
+    LLM_PROMPT_CHARS.observe(sum(len(str(message.get('content', ''))) for message in messages), **labels)
+    if error is not None:
+        LLM_ERRORS.inc(error=type(error).__name__, **labels)
+    elif isinstance(response, str):
+        LLM_RESPONSE_CHARS.observe(len(response), **labels)
+
+def _create_completion(provider, model: str, messages: List[Dict[str, Any]], limit_wait: Optional[float] = None):
+    """Вызов модели в пределах ограничений нагрузки на провайдера"""
+    with get_provider_limiter().slot(provider_name(provider), model, timeout=limit_wait):
+        started = time.monotonic()
+        try:
+            response = get_llm_backend().create(model, provider, messages)
+        except Exception as e:
+            _record_call(provider, model, messages, started, error=e)
+            raise
+    
+    _record_call(provider, model, messages, started, response=response)
+    return response
+
+def _stream_completion(provider, model: str, messages: List[Dict[str, Any]]) -> Iterator[str]:
+    """Потоковый вызов модели, слот провайдера занят до конца передачи"""
+    with get_provider_limiter().slot(provider_name(provider), model):
+        started = time.monotonic()
+        parts = []
+        generator = None
+        try:
+            generator = get_llm_backend().create(model, provider, messages, stream=True)
+            for chunk in generator:
+                parts.append(str(chunk))
+                yield chunk
+        except GeneratorExit:
+            # Клиент отключился до конца передачи
+            _record_call(provider, model, messages, started, response=''.join(parts), outcome='cancelled')
+            raise
+        except Exception as e:
+            _record_call(provider, model, messages, started, error=e)
+            raise
+        else:
+            _record_call(provider, model, messages, started, response=''.join(parts))
+        finally:
+            if generator is not None and hasattr(generator, 'close'):
+                generator.close()
+
+def _read_cache(cache: LLMCache, key: str) -> Optional[str]:
+    """Ответ из кэша; ошибка чтения кэша (например, занятая база) считается промахом"""
+    try:
+        cached = cache.get(key)
+    except Exception as e:
+        logger.error(f"Error reading LLM response from cache: {str(e)}")
+        cached = None
+    LLM_CACHE_REQUESTS.inc(result='miss' if cached is None else 'hit')
+    return cached
+
+def chat_completion(model: str, messages: List[Dict[str, Any]], provider=None, use_cache: bool = True,
+                    limit_wait: Optional[float] = None) -> str:
+    """
+    Запрос к модели g4f с кэшированием ответа
+    
+    Одинаковые запросы (модель, провайдер, сообщения) обслуживаются из
+    кэша. use_cache=False отключает кэш для конкретного вызова. Запросы
+    к модели выполняются через маршрутизатор провайдеров, если он включен;
+    одинаковые одновременные запросы выполняются одним вызовом.
+    limit_wait - ожидание слота провайдера для пакетных вызовов
+    (см. ProviderLimiter.slot); None - по настройкам ограничений.
+    """
+    cache = get_llm_cache() if use_cache else None
+    key = LLMCache.make_key(model, provider_name(provider), messages)
+    
+    if cache is not None:
+        cached = _read_cache(cache, key)
+        if cached is not None:
+            return cached
+    
+    def request_model():
+        response = _request_model(model, messages, provider, limit_wait)
+        
+        # Кэшируются только непустые текстовые ответы
+        if cache is not None and isinstance(response, str) and response.strip():
+            try:
+                cache.set(key, response)
+            except Exception as e:
+                logger.error(f"Error saving LLM response to cache: {str(e)}")
+        return response
+    
+    # Одинаковые одновременные запросы разделяют один вызов модели
+    if not Config.LLM_SINGLE_FLIGHT_ENABLED:
+        return request_model()
+    return _single_flight.do(key, request_model)
+
+def _request_model(model: str, messages: List[Dict[str, Any]], provider=None, limit_wait: Optional[float] = None):
+    router = get_provider_router()
+    if router is not None:
+        return router.call(
+            provider, model,
+            lambda route_provider, route_model: _create_completion(route_provider, route_model, messages, limit_wait)
+        )
+    return _create_completion(provider, model, messages, limit_wait)
+
+def get_single_flight() -> SingleFlight:
+    """Объединение одинаковых одновременных запросов к моделям и его счетчики"""
+    return _single_flight
+
+def stream_chat_completion(model: str, messages: List[Dict[str, Any]], provider=None, use_cache: bool = True) -> Iterator[str]:
+    """
+    Потоковый запрос к модели g4f
+    
+    Возвращает фрагменты ответа по мере генерации. Ответ из кэша отдается
+    одним фрагментом, а полностью полученный ответ сохраняется в кэш.
+    Если провайдер не вернул ни одного фрагмента, запрос повторяется у
+    следующего кандидата маршрутизатора; после начала передачи ошибка
+    пробрасывается вызывающему коду.
+    """
+    cache = get_llm_cache() if use_cache else None
+    key = None
+    
+    if cache is not None:
+        key = LLMCache.make_key(model, provider_name(provider), messages)
+        cached = _read_cache(cache, key)
+        if cached is not None:
+            yield cached
+            return
+    
+    router = get_provider_router()
+    candidates = router.candidates(provider, model) if router is not None else [(provider, model)]
+    if not candidates:
+        raise ProviderUnavailableError(f"Нет доступных провайдеров для модели {model}")
+    
+    last_error = None
+    for candidate_provider, candidate_model in candidates:
+        if router is not None and not router.acquire(candidate_provider, candidate_model):
+            continue
+        
+        started = time.monotonic()
+        parts = []
+        generator = None
+        settled = False
+        try:
+            generator = _stream_completion(candidate_provider, candidate_model, messages)
+            for chunk in generator:
+                if chunk:
+                    parts.append(chunk)
+                    yield chunk
+        except ProviderThrottledError as e:
+            # Перегруженный провайдер не считается неисправным
+            if router is not None:
+                router.cancel(candidate_provider, candidate_model)
+            settled = True
+            last_error = e
+            continue
+        except Exception as e:
+            if router is not None:
+                router.record_failure(candidate_provider, candidate_model)
+            settled = True
+            logger.error(f"Streaming from {provider_name(candidate_provider)} ({candidate_model}) failed: {str(e)}")
+            if parts:
+                raise
+            last_error = e
+            continue
+        else:
+            if router is not None:
+                router.record_success(candidate_provider, candidate_model, time.monotonic() - started)
+            settled = True
+        finally:
+            # При отключении клиента закрываем генератор провайдера и освобождаем слот
+            if generator is not None:
+                generator.close()
+            # Клиент отключился (GeneratorExit) до конца передачи: результат вызова неизвестен,
+            # поэтому пробный запрос выключателя освобождается без учета успеха или ошибки
+            if router is not None and not settled:
+                router.cancel(candidate_provider, candidate_model)
+        
+        response = ''.join(parts)
+        if cache is not None and response.strip():
+            try:
+                cache.set(key, response)
+            except Exception as e:
+                logger.error(f"Error saving LLM response to cache: {str(e)}")
+        return
+    
+    if last_error is not None:
+        raise last_error
+    raise ProviderUnavailableError(f"Нет доступных провайдеров для модели {model}")
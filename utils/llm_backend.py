@@ -0,0 +1,122 @@
+import g4f
+import json
+import random
+import threading
+import time
+from typing import Dict, Any, List, Optional, Iterator, Union
+from config import Config
+
+class LLMBackend:
+    """
+    Источник ответов моделей для utils.llm
+
+    create возвращает текст ответа, а при stream=True - итератор фрагментов.
+    Кэш, маршрутизация провайдеров, ограничения нагрузки и метрики работают
+    поверх бэкенда и от него не зависят.
+    """
+    name = ''
+
+    def create(self, model: str, provider, messages: List[Dict[str, Any]],
+               stream: bool = False) -> Union[str, Iterator[str]]:
+        raise NotImplementedError
+
+class G4FBackend(LLMBackend):
+    """Запросы к провайдерам g4f"""
+    name = 'g4f'
+
+    def create(self, model: str, provider, messages: List[Dict[str, Any]],
+               stream: bool = False) -> Union[str, Iterator[str]]:
+        if stream:
+            return g4f.ChatCompletion.create(model=model, provider=provider, messages=messages, stream=True)
+        return g4f.ChatCompletion.create(model=model, provider=provider, messages=messages)
+
+class FakeBackendError(Exception):
+    """Ошибка, имитируемая тестовым бэкендом"""
+    pass
+
+# Ответ на запрос структурированного анализа: все разделы схемы и один индикатор риска
+FAKE_STRUCTURED_RESPONSE = json.dumps({
+    'technical_analysis': 'Тестовый технический анализ',
+    'budget_analysis': 'Тестовый анализ бюджета',
+    'risk_analysis': 'Тестовый анализ рисков: средний риск',
+    'compliance_analysis': 'Тестовый анализ соответствия',
+    'recommendations': 'Тестовые рекомендации',
+    'risk_indicators': [{'type': 'test', 'severity': 'medium', 'description': 'Тестовый индикатор'}]
+}, ensure_ascii=False)
+
+class FakeBackend(LLMBackend):
+    """
+    Локальный бэкенд с заданными ответами, задержкой и долей ошибок
+
+    Ответ выбирается по первой подстроке из responses, найденной в последнем
+    сообщении; на запрос JSON по схеме анализа возвращается корректный
+    структурированный ответ, иначе - default. Задержка latency ± jitter
+    секунд и ошибки с вероятностью error_rate берутся из генератора с
+    зерном seed, поэтому последовательность вызовов воспроизводима.
+    """
+    name = 'fake'
+
+    def __init__(self, responses: Optional[Dict[str, str]] = None, default: str = 'Тестовый ответ модели',
+                 latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, seed: int = 0,
+                 chunk_size: int = 16):
+        self.responses = responses or {}
+        self.default = default
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.chunk_size = chunk_size
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def respond(self, messages: List[Dict[str, Any]]) -> str:
+        """Ответ на сообщения без задержки и ошибок"""
+        prompt = str(messages[-1].get('content', '')) if messages else ''
+        for pattern, response in self.responses.items():
+            if pattern in prompt:
+                return response
+        if '"risk_indicators"' in prompt:
+            return FAKE_STRUCTURED_RESPONSE
+        return self.default
+
+    def _next_call(self):
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            failed = self._random.random() < self.error_rate
+        return delay, failed
+
+    def create(self, model: str, provider, messages: List[Dict[str, Any]],
+               stream: bool = False) -> Union[str, Iterator[str]]:
+        delay, failed = self._next_call()
+        if stream:
+            return self._stream(messages, delay, failed)
+        time.sleep(delay)
+        if failed:
+            raise FakeBackendError(f"Имитация ошибки модели {model}")
+        return self.respond(messages)
+
+    def _stream(self, messages: List[Dict[str, Any]], delay: float, failed: bool) -> Iterator[str]:
+        # Задержка до первого фрагмента, как у провайдеров g4f
+        time.sleep(delay)
+        if failed:
+            raise FakeBackendError("Имитация ошибки модели")
+        response = self.respond(messages)
+        for start in range(0, len(response), self.chunk_size):
+            yield response[start:start + self.chunk_size]
+
+def create_backend(config) -> LLMBackend:
+    """
+    Бэкенд моделей по настройке LLM_BACKEND: g4f или fake
+    """
+    name = config.get('LLM_BACKEND', Config.LLM_BACKEND)
+    if name == 'g4f':
+        return G4FBackend()
+    if name == 'fake':
+        return FakeBackend(
+            latency=config.get('LLM_FAKE_LATENCY', Config.LLM_FAKE_LATENCY),
+            jitter=config.get('LLM_FAKE_JITTER', Config.LLM_FAKE_JITTER),
+            error_rate=config.get('LLM_FAKE_ERROR_RATE', Config.LLM_FAKE_ERROR_RATE),
+            seed=config.get('LLM_FAKE_SEED', Config.LLM_FAKE_SEED)
+        )
+    raise ValueError(f"Неизвестный бэкенд моделей: {name}")
@@ -0,0 +1,130 @@
+import sqlite3
+import hashlib
+import json
+import os
+import threading
+import time
+import logging
+from typing import Dict, Any, List, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class LLMCache:
+    """
+    Постоянный кэш ответов языковых моделей
+    
+    Ответы хранятся в локальной базе SQLite по ключу - хэшу от модели,
+    провайдера и сообщений. Записи устаревают по TTL, а при превышении
+    max_entries вытесняются давно не использовавшиеся (LRU). Чтение не
+    пишет в базу: время обращения запоминается в памяти и сохраняется
+    при следующей записи в кэш, перед вытеснением.
+    """
+    def __init__(self, path: str, ttl: int = 86400, max_entries: int = 10000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._accessed = {}
+        
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        if path != ':memory:':
+            # Кэш общий для рабочих процессов веб-сервера: чтение не блокирует запись
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, "
+            "response TEXT NOT NULL, "
+            "created_at REAL NOT NULL, "
+            "accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_accessed_at ON llm_cache (accessed_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, provider: Optional[str], messages: List[Dict[str, Any]]) -> str:
+        """Вычисление ключа кэша по модели, провайдеру и сообщениям"""
+        payload = json.dumps(
+            {'model': model, 'provider': provider, 'messages': messages},
+            ensure_ascii=False, sort_keys=True
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Получение ответа из кэша с учетом TTL"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            
+            # Просроченная запись удаляется при следующей записи в кэш
+            if row is None or (self.ttl and now - row[1] > self.ttl):
+                self.misses += 1
+                return None
+            
+            self._accessed[key] = now
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, response: str):
+        """Сохранение ответа в кэш с вытеснением устаревших записей"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, response, now, now)
+            )
+            self._accessed.pop(key, None)
+            self._flush_accessed()
+            self._evict(now)
+            self._conn.commit()
+
+    def _flush_accessed(self):
+        """Сохранение времени обращения к записям, прочитанным после прошлой записи"""
+        if self._accessed:
+            self._conn.executemany(
+                "UPDATE llm_cache SET accessed_at = ? WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in self._accessed.items()]
+            )
+            self._accessed.clear()
+
+    def _evict(self, now: float):
+        """Удаление просроченных записей и вытеснение LRU сверх max_entries"""
+        if self.ttl:
+            cursor = self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+            self.evictions += max(cursor.rowcount, 0)
+        
+        count = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        if self.max_entries and count > self.max_entries:
+            cursor = self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                "SELECT key FROM llm_cache ORDER BY accessed_at ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+            self.evictions += max(cursor.rowcount, 0)
+
+    def clear(self):
+        """Полная очистка кэша"""
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+            self._accessed.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика использования кэша"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'evictions': self.evictions,
+            'entries': entries
+        }
@@ -0,0 +1,177 @@
+import bisect
+import threading
+from typing import Dict, Any, List, Tuple, Callable, Iterable, Optional
+
+# Границы корзин гистограмм по умолчанию: задержки запросов к моделям, секунды
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+# Размеры запросов и ответов, символы
+SIZE_BUCKETS = (100, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[Any, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+class _Metric:
+    type_name = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    """Монотонно растущий счетчик"""
+    type_name = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+class Histogram(_Metric):
+    """Гистограмма значений с фиксированными границами корзин"""
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return sum(state[0]) if state else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+
+        samples = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                samples.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            samples.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            samples.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return samples
+
+class CallbackMetric(_Metric):
+    """Метрика, значение которой вычисляется при каждом чтении"""
+    def __init__(self, name: str, documentation: str, fn: Callable[[], float], type_name: str = 'gauge'):
+        super().__init__(name, documentation)
+        self.fn = fn
+        self.type_name = type_name
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name} {_format_value(self.fn())}"]
+
+class MetricsRegistry:
+    """
+    Реестр метрик в текстовом формате Prometheus
+
+    Метрики хранятся в памяти процесса; при нескольких рабочих процессах
+    gunicorn каждый процесс отдает свои значения.
+    """
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            # Повторная регистрация (например, при перезагрузке модуля) возвращает ту же метрику
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name: str, documentation: str, fn: Callable[[], float],
+                 type_name: str = 'gauge') -> CallbackMetric:
+        """Метрика, вычисляемая при чтении; повторная регистрация заменяет функцию"""
+        metric = CallbackMetric(name, documentation, fn, type_name)
+        with self._lock:
+            self._metrics[name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception:
+                # Ошибка вычисляемой метрики не должна ломать выдачу остальных
+                continue
+        return '\n'.join(lines) + '\n'
+
+registry = MetricsRegistry()
+
+LLM_REQUEST_DURATION = registry.histogram(
+    'llm_request_duration_seconds', 'Duration of g4f calls', ('provider', 'model', 'outcome'))
+LLM_ERRORS = registry.counter(
+    'llm_errors_total', 'Failed g4f calls by exception type', ('provider', 'model', 'error'))
+LLM_PROMPT_CHARS = registry.histogram(
+    'llm_prompt_chars', 'Prompt size of g4f calls in characters', ('provider', 'model'), SIZE_BUCKETS)
+LLM_RESPONSE_CHARS = registry.histogram(
+    'llm_response_chars', 'Response size of g4f calls in characters', ('provider', 'model'), SIZE_BUCKETS)
+LLM_CACHE_REQUESTS = registry.counter(
+    'llm_cache_requests_total', 'LLM response cache lookups', ('result',))
+LLM_THROTTLED = registry.counter(
+    'llm_throttled_total', 'g4f calls rejected by provider limits', ('provider',))
+ANALYZER_RUNS = registry.counter(
+    'analyzer_runs_total', 'Tender analyses by mode and outcome', ('mode', 'outcome'))
+ANALYZER_SECTION_FAILURES = registry.counter(
+    'analyzer_section_failures_total', 'Failed or timed out analysis sections', ('section',))
+HTTP_REQUEST_DURATION = registry.histogram(
+    'http_request_duration_seconds', 'Duration of HTTP requests until response headers', ('endpoint', 'status'))
+
+def provider_label(provider: Optional[str]) -> str:
+    """Метка провайдера: без явного провайдера g4f выбирает его сам"""
+    return provider or 'auto'
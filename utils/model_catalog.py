@@ -0,0 +1,168 @@
+import g4f
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Any, List, Optional, Callable, Tuple
+from config import Config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+def _g4f_provider(name: str):
+    return getattr(g4f.Provider, name, None)
+
+class ModelCatalog:
+    """
+    Каталог моделей чата
+
+    Сопоставляет пару (категория, модель) из интерфейса с провайдером g4f и
+    именем модели у провайдера. Каталог строится один раз из JSON-файла,
+    провайдеры разрешаются при загрузке, поэтому поиск - одно обращение к словарю.
+    При изменении файла каталог перечитывается без перезапуска приложения.
+    """
+    def __init__(self, path: str, reload_interval: Optional[float] = 30,
+                 provider_resolver: Optional[Callable[[str], Any]] = None):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.provider_resolver = provider_resolver or _g4f_provider
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._next_check = 0.0
+        self._entries = {}
+        self._default = None
+        self.reload()
+
+    def reload(self) -> bool:
+        """
+        Перечитывание файла каталога
+
+        Новый каталог подменяет старый целиком. Если файл не удалось
+        прочитать, продолжает работать предыдущий каталог.
+        """
+        with self._lock:
+            self._next_check = time.monotonic() + (self.reload_interval or 0)
+            try:
+                mtime = os.path.getmtime(self.path)
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                entries, default = self._build(data)
+            except Exception as e:
+                if self._default is None:
+                    raise
+                logger.error(f"Error reloading model catalog {self.path}: {str(e)}")
+                return False
+
+            self._entries, self._default, self._mtime = entries, default, mtime
+            logger.info(f"Loaded model catalog {self.path}: {len(entries)} models")
+            return True
+
+    def _build(self, data: Dict[str, Any]) -> Tuple[Dict[Tuple[str, str], Tuple[Any, str]], Tuple[Any, str]]:
+        resolved = {}
+
+        def provider(name: str):
+            # Провайдер, которого нет в установленной версии g4f, остается именем:
+            # g4f сообщит об ошибке при запросе, а не при загрузке каталога
+            if name not in resolved:
+                resolved[name] = self.provider_resolver(name)
+                if resolved[name] is None:
+                    logger.warning(f"Provider {name} from model catalog is not available in g4f")
+                    resolved[name] = name
+            return resolved[name]
+
+        default_entry = data['default']
+        entries = {}
+        for category, models in (data.get('categories') or {}).items():
+            for alias, entry in models.items():
+                entries[(category, alias)] = (provider(entry['provider']), entry.get('model', alias))
+        return entries, (provider(default_entry['provider']), default_entry['model'])
+
+    def _maybe_reload(self):
+        if not self.reload_interval or time.monotonic() < self._next_check:
+            return
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+        if mtime != self._mtime:
+            self.reload()
+        else:
+            self._next_check = time.monotonic() + self.reload_interval
+
+    def resolve(self, category: str, model: str) -> Tuple[Any, str]:
+        """
+        Провайдер и модель g4f для категории и модели чата
+
+        Для неизвестной пары возвращается модель по умолчанию.
+        """
+        self._maybe_reload()
+        return self._entries.get((category, model), self._default)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+def seed_catalog(data: Dict[str, Any], results: List[Dict[str, Any]],
+                 category: str = 'text', prune: bool = False) -> Tuple[Dict[str, Any], int, int]:
+    """
+    Дополнение каталога результатами проверки провайдеров
+
+    results - содержимое successful_providers_*.json из check_providers.py.
+    Рабочие пары (провайдер, модель), которых нет в каталоге, добавляются
+    в категорию category; при prune из каталога удаляются пары, не прошедшие
+    проверку. Возвращает (новый каталог, добавлено, удалено).
+    """
+    working = {(result['provider'], result['model']) for result in results
+               if result.get('provider') and result.get('model')}
+    categories = {name: dict(models) for name, models in (data.get('categories') or {}).items()}
+
+    removed = 0
+    if prune:
+        for models in categories.values():
+            for alias in [alias for alias, entry in models.items()
+                          if (entry['provider'], entry.get('model', alias)) not in working]:
+                del models[alias]
+                removed += 1
+
+    known = {(entry['provider'], entry.get('model', alias))
+             for models in categories.values() for alias, entry in models.items()}
+    target = categories.setdefault(category, {})
+    added = 0
+    for provider, model in sorted(working - known):
+        alias = model if model not in target else f"{provider}/{model}"
+        target[alias] = {'provider': provider, 'model': model}
+        added += 1
+
+    return dict(data, categories=categories), added, removed
+
+def init_model_catalog(app) -> ModelCatalog:
+    """
+    Загрузка каталога моделей по конфигурации приложения
+    """
+    global _catalog
+    with _catalog_lock:
+        _catalog = ModelCatalog(
+            path=app.config.get('MODEL_CATALOG_PATH', Config.MODEL_CATALOG_PATH),
+            reload_interval=app.config.get('MODEL_CATALOG_RELOAD_INTERVAL', Config.MODEL_CATALOG_RELOAD_INTERVAL)
+        )
+    return _catalog
+
+def get_model_catalog() -> ModelCatalog:
+    """
+    Каталог моделей
+
+    Если каталог не был загружен через init_model_catalog,
+    он загружается по настройкам Config.
+    """
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = ModelCatalog(
+                    path=Config.MODEL_CATALOG_PATH,
+                    reload_interval=Config.MODEL_CATALOG_RELOAD_INTERVAL
+                )
+    return _catalog
@@ -0,0 +1,217 @@
+import fcntl
+import gzip
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class PageArchive:
+    """
+    Архив загруженных страниц ЕИС
+
+    Каждая страница с адресом, временем загрузки и заголовками ответа
+    сжимается отдельным элементом gzip и дописывается в конец текущего
+    файла-сегмента; сегмент целиком читается и обычным zcat. При
+    превышении segment_size начинается новый сегмент. Положение записей
+    хранится в индексе SQLite, поэтому страницы можно выбирать по времени
+    и номеру тендера без распаковки архива. В архив могут писать несколько
+    процессов (рабочие процессы веб-сервера, планировщик): запись в сегмент
+    выполняется под блокировкой файла, а смещение записи берется из размера
+    сегмента после получения блокировки.
+    """
+    def __init__(self, directory: str, segment_size: int = 64 * 1024 * 1024, compresslevel: int = 6):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.compresslevel = compresslevel
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(directory, 'index.db'), check_same_thread=False, timeout=10)
+        # Индекс общий для всех процессов, пишущих в архив
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "url TEXT NOT NULL, "
+            "tender_id TEXT, "
+            "fetched_at REAL NOT NULL, "
+            "segment TEXT NOT NULL, "
+            "offset INTEGER NOT NULL, "
+            "length INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_pages_fetched_at ON pages (fetched_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_pages_tender_id ON pages (tender_id)")
+        self._conn.commit()
+
+        row = self._conn.execute("SELECT segment FROM pages ORDER BY id DESC LIMIT 1").fetchone()
+        self._segment = row[0] if row else self._segment_name(1)
+
+    @staticmethod
+    def _segment_name(number: int) -> str:
+        return f"pages-{number:06d}.gz"
+
+    def _segment_path(self, segment: str) -> str:
+        return os.path.join(self.directory, segment)
+
+    def append(self, url: str, body: bytes, headers: Optional[Dict[str, str]] = None,
+               tender_id: Optional[str] = None, fetched_at: Optional[float] = None) -> int:
+        """Добавление страницы в архив; возвращает номер записи"""
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        meta = {'url': url, 'tender_id': tender_id, 'fetched_at': fetched_at, 'headers': dict(headers or {})}
+        # Сжатие выполняется вне блокировки, чтобы потоки загрузки не ждали друг друга
+        record = gzip.compress(json.dumps(meta, ensure_ascii=False).encode('utf-8') + b'\n' + body,
+                               compresslevel=self.compresslevel)
+
+        with self._lock:
+            while True:
+                offset = self._write(self._segment_path(self._segment), record)
+                if offset is not None:
+                    break
+                self._segment = self._segment_name(int(self._segment[6:12]) + 1)
+            cursor = self._conn.execute(
+                "INSERT INTO pages (url, tender_id, fetched_at, segment, offset, length) VALUES (?, ?, ?, ?, ?, ?)",
+                (url, tender_id, fetched_at, self._segment, offset, len(record))
+            )
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def _write(self, path: str, record: bytes) -> Optional[int]:
+        """
+        Дописывание записи в сегмент под блокировкой файла
+
+        Возвращает смещение записи или None, если сегмент заполнен.
+        """
+        with open(path, 'ab') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                offset = os.fstat(f.fileno()).st_size
+                if offset and offset + len(record) > self.segment_size:
+                    return None
+                f.write(record)
+                f.flush()
+                return offset
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def records(self, since: Optional[float] = None, until: Optional[float] = None,
+                tender_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Записи индекса в порядке расположения в сегментах"""
+        conditions, params = [], []
+        if since is not None:
+            conditions.append("fetched_at >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("fetched_at < ?")
+            params.append(until)
+        if tender_id is not None:
+            conditions.append("tender_id = ?")
+            params.append(tender_id)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, url, tender_id, fetched_at, segment, offset, length FROM pages{where} "
+                "ORDER BY segment, offset", params
+            ).fetchall()
+        keys = ('id', 'url', 'tender_id', 'fetched_at', 'segment', 'offset', 'length')
+        return [dict(zip(keys, row)) for row in rows]
+
+    def read(self, record: Dict[str, Any]) -> Tuple[Dict[str, Any], bytes]:
+        """Метаданные и содержимое страницы по записи индекса"""
+        with open(self._segment_path(record['segment']), 'rb') as f:
+            return read_record(f, record['offset'], record['length'])
+
+    def stats(self) -> Dict[str, Any]:
+        """Число страниц, сегментов и размер архива"""
+        with self._lock:
+            pages, segments = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT segment) FROM pages").fetchone()
+        size = sum(
+            os.path.getsize(self._segment_path(name))
+            for name in os.listdir(self.directory) if name.startswith('pages-')
+        )
+        return {'pages': pages, 'segments': segments, 'size': size}
+
+def read_record(f, offset: int, length: int) -> Tuple[Dict[str, Any], bytes]:
+    f.seek(offset)
+    meta, _, body = gzip.decompress(f.read(length)).partition(b'\n')
+    return json.loads(meta), body
+
+def _replay_batch(directory: str, segment: str, records: List[Dict[str, Any]],
+                  extractor: Optional[str]) -> List[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+    """
+    Извлечение тендеров из группы записей одного сегмента
+
+    Выполняется в отдельном процессе; страница тендера дает один тендер,
+    страница поиска без номера тендера - все записи реестра на ней.
+    """
+    from config import Config
+    from .html_extract import get_extractor
+    from .parser import tender_from_entries, tenders_from_entries
+    extractor = get_extractor(extractor or Config.PARSER_EXTRACTOR)
+    results = []
+    with open(os.path.join(directory, segment), 'rb') as f:
+        for record in records:
+            try:
+                meta, body = read_record(f, record['offset'], record['length'])
+                charset = _charset(meta['headers'])
+                html = body.decode(charset, errors='replace')
+                entries = extractor.extract(html)
+                if meta['tender_id']:
+                    tenders = [tender_from_entries(meta['tender_id'], entries)]
+                else:
+                    tenders = tenders_from_entries(entries)
+            except Exception as e:
+                logger.error(f"Error replaying archived page {record['id']}: {str(e)}")
+                tenders = None
+            results.append((record, tenders))
+    return results
+
+def _charset(headers: Dict[str, str]) -> str:
+    content_type = next((value for key, value in headers.items() if key.lower() == 'content-type'), '')
+    for part in content_type.split(';'):
+        name, _, value = part.strip().partition('=')
+        if name.lower() == 'charset' and value:
+            return value.strip('"')
+    return 'utf-8'
+
+def replay(archive: PageArchive, since: Optional[float] = None, until: Optional[float] = None,
+           workers: Optional[int] = None, batch_size: int = 200,
+           extractor: Optional[str] = None) -> Iterator[Tuple[Dict[str, Any], Optional[List[Dict[str, Any]]]]]:
+    """
+    Повторное извлечение тендеров из архива без обращения к сети
+
+    Записи делятся на группы по batch_size внутри сегмента и разбираются
+    параллельно в workers процессах. Пары (запись индекса, список тендеров
+    или None при ошибке) возвращаются по мере готовности групп.
+    """
+    batches = []
+    for record in archive.records(since=since, until=until):
+        if not batches or batches[-1][0] != record['segment'] or len(batches[-1][1]) >= batch_size:
+            batches.append((record['segment'], []))
+        batches[-1][1].append(record)
+
+    workers = workers or os.cpu_count() or 1
+    batches = iter(batches)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        exhausted = False
+        while True:
+            # Не больше двух групп на процесс в очереди, чтобы не держать все результаты в памяти
+            while not exhausted and len(pending) < workers * 2:
+                batch = next(batches, None)
+                if batch is None:
+                    exhausted = True
+                    break
+                pending.add(executor.submit(_replay_batch, archive.directory, batch[0], batch[1], extractor))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
@@ -0,0 +1,117 @@
+import sqlite3
+import hashlib
+import os
+import threading
+import time
+import logging
+from typing import Dict, Any, Iterable, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class PageCache:
+    """
+    Кэш признаков изменения страниц тендеров
+
+    Для каждого адреса хранятся ETag, Last-Modified и хэш содержимого
+    последней разобранной страницы, сами страницы не хранятся. По ним
+    парсер отправляет условные запросы и пропускает разбор неизменившихся
+    страниц. Записи старше ttl не используются, чтобы страница время от
+    времени загружалась и разбиралась полностью.
+    """
+    def __init__(self, path: str, ttl: int = 604800, max_entries: int = 100000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.not_modified = 0
+        self.same_body = 0
+        self.changed = 0
+        self._lock = threading.Lock()
+
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS page_cache ("
+            "url TEXT PRIMARY KEY, "
+            "etag TEXT, "
+            "last_modified TEXT, "
+            "body_hash TEXT NOT NULL, "
+            "checked_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_page_cache_checked_at ON page_cache (checked_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def hash_body(body: bytes) -> str:
+        return hashlib.sha256(body).hexdigest()
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """Признаки страницы с учетом TTL"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, body_hash, checked_at FROM page_cache WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None or (self.ttl and time.time() - row[3] > self.ttl):
+            return None
+        return {'etag': row[0], 'last_modified': row[1], 'body_hash': row[2]}
+
+    @staticmethod
+    def conditional_headers(entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        """Заголовки условного запроса по сохраненным признакам"""
+        headers = {}
+        if entry is not None:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def set(self, url: str, etag: Optional[str], last_modified: Optional[str], body_hash: str):
+        """Сохранение признаков разобранной страницы"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO page_cache (url, etag, last_modified, body_hash, checked_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (url, etag, last_modified, body_hash, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        """Удаление просроченных записей и самых старых сверх max_entries"""
+        if self.ttl:
+            self._conn.execute("DELETE FROM page_cache WHERE checked_at < ?", (now - self.ttl,))
+
+        count = self._conn.execute("SELECT COUNT(*) FROM page_cache").fetchone()[0]
+        if self.max_entries and count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM page_cache WHERE url IN ("
+                "SELECT url FROM page_cache ORDER BY checked_at ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def delete(self, urls: Iterable[str]):
+        """Удаление признаков, например если изменения страниц не удалось сохранить"""
+        with self._lock:
+            self._conn.executemany("DELETE FROM page_cache WHERE url = ?", ((url,) for url in urls))
+            self._conn.commit()
+
+    def record(self, outcome: str):
+        """Учет результата проверки: not_modified, same_body или changed"""
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика проверок страниц"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM page_cache").fetchone()[0]
+        checked = self.not_modified + self.same_body + self.changed
+        return {
+            'not_modified': self.not_modified,
+            'same_body': self.same_body,
+            'changed': self.changed,
+            'unchanged_rate': (self.not_modified + self.same_body) / checked if checked else 0.0,
+            'entries': entries
+        }
@@ -1,93 +1,411 @@
+import aiohttp
+import asyncio
+import queue
+import threading
 import requests
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime
+from typing import Dict, Any, Callable, Iterable, Iterator, List, Optional, Tuple
 import logging
+from config import Config
+from .html_extract import get_extractor, parse_price, parse_date
+from .page_cache import PageCache
+from .page_archive import PageArchive
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+SEARCH_PATH = "/epz/order/extendedsearch/results.html"
+
+# Допустимые размеры страницы результатов поиска ЕИС
+RECORDS_PER_PAGE = (10, 20, 50, 100)
+
+# Результат условного парсинга: страница не изменилась с прошлого разбора
+UNCHANGED = 'unchanged'
+
+# Ответы, после которых запрос повторяется: перегрузка и временные ошибки сервера
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+def entry_number(fields: Dict[str, str]) -> str:
+    """Реестровый номер закупки из записи"""
+    return fields.get('number', '').replace('№', '').strip()
+
+def build_tender(tender_id, fields: Dict[str, str]) -> Dict[str, Any]:
+    """Данные тендера из текстовых полей записи реестра"""
+    return {
+        'tender_id': tender_id,
+        'title': fields.get('title', ''),
+        'description': fields.get('description', ''),
+        'price': parse_price(fields.get('price')),
+        'customer': fields.get('customer', ''),
+        'publication_date': parse_date(fields.get('date')),
+        # Как и дата публикации, берется из первого блока дат записи
+        'deadline': parse_date(fields.get('date')),
+        'status': fields.get('status', '')
+    }
+
+def tender_from_entries(tender_id, entries: List[Dict[str, str]]) -> Dict[str, Any]:
+    """
+    Тендер из записей страницы результатов поиска
+
+    Используется запись с номером tender_id, а если ее нет - первая запись.
+    """
+    fields = next((fields for fields in entries if entry_number(fields) == str(tender_id)), entries[0])
+    return build_tender(tender_id, fields)
+
+def tenders_from_entries(entries: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+    """Все тендеры с реестровым номером из записей страницы результатов поиска"""
+    tenders = []
+    for fields in entries:
+        tender_id = entry_number(fields)
+        if tender_id:
+            tenders.append(build_tender(tender_id, fields))
+    return tenders
+
 class TenderParser:
-    def __init__(self):
-        self.base_url = "https://zakupki.gov.ru"
+    """
+    Парсер тендеров ЕИС
+
+    Запросы выполняются через одну сессию с пулом постоянных соединений,
+    поэтому при обновлении тысяч тендеров соединение TCP/TLS с сервером
+    не устанавливается заново для каждого запроса. Ответы 429 и 5xx
+    повторяются с экспоненциальной задержкой (с учетом Retry-After).
+    При условном парсинге неизменившиеся страницы не разбираются (PageCache).
+    Загруженные страницы можно сохранять в архив (PageArchive) для
+    повторного извлечения без обращения к ЕИС.
+    """
+    def __init__(self, base_url: str = "https://zakupki.gov.ru", timeout: Optional[float] = None,
+                 connect_timeout: Optional[float] = None, pool_size: Optional[int] = None,
+                 max_retries: Optional[int] = None, backoff_factor: Optional[float] = None,
+                 concurrency: Optional[int] = None, parse_workers: Optional[int] = None,
+                 extractor: Optional[str] = None, page_cache: Optional[PageCache] = None,
+                 archive: Optional[PageArchive] = None):
+        self.base_url = base_url
+        self.page_cache = page_cache
+        self.archive = archive
+        if archive is None and Config.PARSER_ARCHIVE_ENABLED:
+            self.archive = PageArchive(Config.PARSER_ARCHIVE_DIR, segment_size=Config.PARSER_ARCHIVE_SEGMENT_SIZE)
+        self._page_cache_lock = threading.Lock()
+        self.extractor = get_extractor(extractor or Config.PARSER_EXTRACTOR)
+        self.max_retries = Config.PARSER_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_factor = Config.PARSER_BACKOFF_FACTOR if backoff_factor is None else backoff_factor
+        self.concurrency = Config.PARSER_CONCURRENCY if concurrency is None else concurrency
+        self.parse_workers = Config.PARSER_PARSE_WORKERS if parse_workers is None else parse_workers
         self.headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+            'User-Agent': Config.PARSER_USER_AGENT,
+            'Accept-Encoding': 'gzip, deflate'
         }
+        self.timeout = (
+            Config.PARSER_CONNECT_TIMEOUT if connect_timeout is None else connect_timeout,
+            Config.PARSER_TIMEOUT if timeout is None else timeout
+        )
+        self.session = self._create_session(
+            pool_size=Config.PARSER_POOL_SIZE if pool_size is None else pool_size,
+            max_retries=self.max_retries,
+            backoff_factor=self.backoff_factor
+        )
+
+    def _create_session(self, pool_size: int, max_retries: int, backoff_factor: float) -> requests.Session:
+        """Сессия с пулом соединений и повтором неудачных запросов"""
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            respect_retry_after_header=True,
+            # После последней попытки возвращается ответ с ошибкой, а не MaxRetryError
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.headers.update(self.headers)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def close(self):
+        """Закрытие соединений пула"""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _tender_url(self, tender_id) -> str:
+        return f"{self.base_url}{SEARCH_PATH}?searchString={tender_id}"
+
+    def _get_page_cache(self) -> Optional[PageCache]:
+        """Кэш признаков страниц, создается при первом условном запросе"""
+        if self.page_cache is None and Config.PARSER_PAGE_CACHE_ENABLED:
+            with self._page_cache_lock:
+                if self.page_cache is None:
+                    self.page_cache = PageCache(Config.PARSER_PAGE_CACHE_PATH, ttl=Config.PARSER_PAGE_CACHE_TTL)
+        return self.page_cache
+
+    def _cached_page(self, url: str, conditional: bool) -> Optional[Dict[str, Any]]:
+        page_cache = self._get_page_cache() if conditional else None
+        return page_cache.get(url) if page_cache is not None else None
+
+    def _check_page(self, url: str, cached: Optional[Dict[str, Any]], status: int, headers,
+                    body: bytes) -> Tuple[bool, str]:
+        """
+        Проверка изменения страницы: (не изменилась, хэш содержимого)
+        
+        Страница не изменилась, если сервер ответил 304 или ее содержимое
+        совпадает с разобранным в прошлый раз.
+        """
+        if cached is None:
+            return False, PageCache.hash_body(body)
+        if status == 304:
+            self.page_cache.record('not_modified')
+            return True, cached['body_hash']
+        
+        body_hash = PageCache.hash_body(body)
+        if body_hash != cached['body_hash']:
+            return False, body_hash
+        self.page_cache.record('same_body')
+        etag, last_modified = headers.get('ETag'), headers.get('Last-Modified')
+        if (etag, last_modified) != (cached['etag'], cached['last_modified']):
+            self.page_cache.set(url, etag, last_modified, body_hash)
+        return True, body_hash
+
+    def _remember_page(self, url: str, headers, body_hash: str):
+        """Сохранение признаков успешно разобранной страницы"""
+        page_cache = self._get_page_cache()
+        if page_cache is not None:
+            page_cache.set(url, headers.get('ETag'), headers.get('Last-Modified'), body_hash)
+            page_cache.record('changed')
+
+    def _archive_page(self, url: str, headers, body: bytes, tender_id=None):
+        """
+        Сохранение загруженной страницы в архив, если он включен
+        
+        Содержимое сохраняется уже распакованным, хотя заголовки ответа
+        могут указывать Content-Encoding: gzip.
+        """
+        if self.archive is None:
+            return
+        try:
+            self.archive.append(url, body, headers=dict(headers), tender_id=tender_id)
+        except Exception as e:
+            # Ошибка архива не должна мешать обновлению тендеров
+            logger.error(f"Error archiving page {url}: {str(e)}")
 
-    def parse_tender(self, tender_id):
+    def forget(self, tender_ids: Iterable[str]):
+        """
+        Удаление признаков страниц тендеров
+        
+        Вызывается, если данные разобранных страниц не удалось сохранить:
+        при следующем условном парсинге страницы будут разобраны заново.
+        """
+        if self.page_cache is not None:
+            self.page_cache.delete(self._tender_url(tender_id) for tender_id in tender_ids)
+
+    def parse_tender(self, tender_id, conditional: bool = False):
         """
         Парсинг информации о конкретном тендере
+        
+        При conditional=True страница запрашивается условно (If-None-Match,
+        If-Modified-Since), и если она не изменилась с прошлого разбора,
+        возвращается UNCHANGED без разбора.
         """
         try:
-            url = f"{self.base_url}/epz/order/extendedsearch/results.html?searchString={tender_id}"
-            response = requests.get(url, headers=self.headers)
+            url = self._tender_url(tender_id)
+            cached = self._cached_page(url, conditional)
+            response = self.session.get(url, headers=PageCache.conditional_headers(cached), timeout=self.timeout)
             response.raise_for_status()
             
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Извлечение основной информации о тендере
-            tender_data = {
-                'tender_id': tender_id,
-                'title': self._extract_title(soup),
-                'description': self._extract_description(soup),
-                'price': self._extract_price(soup),
-                'customer': self._extract_customer(soup),
-                'publication_date': self._extract_publication_date(soup),
-                'deadline': self._extract_deadline(soup),
-                'status': self._extract_status(soup)
-            }
-            
-            return tender_data
+            unchanged, body_hash = self._check_page(url, cached, response.status_code, response.headers,
+                                                    response.content)
+            if unchanged:
+                return UNCHANGED
+            self._archive_page(url, response.headers, response.content, tender_id)
+            data = self._parse_page(tender_id, response.text)
+            if conditional:
+                self._remember_page(url, response.headers, body_hash)
+            return data
             
         except Exception as e:
             logger.error(f"Error parsing tender {tender_id}: {str(e)}")
             return None
 
-    def _extract_title(self, soup):
-        """Извлечение заголовка тендера"""
-        title_elem = soup.find('div', {'class': 'registry-entry__header-mid-title'})
-        return title_elem.text.strip() if title_elem else ""
+    def _parse_page(self, tender_id, html: str) -> Dict[str, Any]:
+        """Извлечение основной информации о тендере из страницы результатов поиска"""
+        return tender_from_entries(tender_id, self.extractor.extract(html))
 
-    def _extract_description(self, soup):
-        """Извлечение описания тендера"""
-        desc_elem = soup.find('div', {'class': 'registry-entry__body-value'})
-        return desc_elem.text.strip() if desc_elem else ""
+    def parse_search_page(self, html: str) -> List[Dict[str, Any]]:
+        """Все тендеры из страницы результатов поиска"""
+        return tenders_from_entries(self.extractor.extract(html))
+
+    def search_tenders(self, search_string: str = '', filters: Optional[Dict[str, Any]] = None,
+                       records_per_page: int = 50, max_pages: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Тендеры из результатов поиска ЕИС
+        
+        Разбирает все записи реестра на странице и переходит по страницам,
+        пока они не закончатся или не будет загружено max_pages страниц,
+        поэтому один запрос дает до records_per_page тендеров. filters -
+        дополнительные параметры поиска ЕИС. Тендеры возвращаются по мере
+        загрузки страниц, повторы на соседних страницах пропускаются.
+        """
+        if records_per_page not in RECORDS_PER_PAGE:
+            raise ValueError(f"records_per_page должен быть одним из {RECORDS_PER_PAGE}")
+        
+        seen = set()
+        page = 1
+        while max_pages is None or page <= max_pages:
+            params = dict(filters or {}, searchString=search_string, pageNumber=page,
+                          recordsPerPage=f'_{records_per_page}')
+            try:
+                response = self.session.get(f"{self.base_url}{SEARCH_PATH}", params=params, timeout=self.timeout)
+                response.raise_for_status()
+            except Exception as e:
+                logger.error(f"Error fetching search page {page}: {str(e)}")
+                return
+            
+            self._archive_page(response.url, response.headers, response.content)
+            tenders = self.parse_search_page(response.text)
+            new_entries = 0
+            for tender in tenders:
+                if tender['tender_id'] in seen:
+                    continue
+                seen.add(tender['tender_id'])
+                new_entries += 1
+                yield tender
+            
+            logger.info(f"Search page {page}: {len(tenders)} entries, {new_entries} new")
+            # Неполная страница или страница без новых записей - последняя
+            if len(tenders) < records_per_page or not new_entries:
+                return
+            page += 1
 
-    def _extract_price(self, soup):
-        """Извлечение цены тендера"""
-        price_elem = soup.find('div', {'class': 'price-block__value'})
-        if price_elem:
+    def parse_tenders(self, tender_ids: Iterable[str], concurrency: Optional[int] = None,
+                      progress: Optional[Callable[[int, int, int], None]] = None, conditional: bool = False
+                      ) -> Iterator[Tuple[str, Optional[Dict[str, Any]]]]:
+        """
+        Параллельный парсинг тендеров
+        
+        Страницы загружаются асинхронным клиентом aiohttp (не более concurrency
+        запросов одновременно) в отдельном потоке, а разбираются в пуле из
+        parse_workers потоков, чтобы разбор не задерживал загрузку. Пары
+        (tender_id, данные или None при ошибке) возвращаются по мере готовности,
+        при conditional=True для неизменившихся страниц вместо данных - UNCHANGED.
+        progress(готово, всего, ошибок) вызывается после каждого тендера.
+        """
+        tender_ids = list(dict.fromkeys(tender_ids))
+        if not tender_ids:
+            return
+        concurrency = max(1, concurrency or self.concurrency)
+        results = queue.Queue()
+        stop = threading.Event()
+        
+        def run():
             try:
-                return float(price_elem.text.strip().replace(' ', '').replace(',', '.'))
-            except ValueError:
-                return None
-        return None
-
-    def _extract_customer(self, soup):
-        """Извлечение информации о заказчике"""
-        customer_elem = soup.find('div', {'class': 'registry-entry__body-href'})
-        return customer_elem.text.strip() if customer_elem else ""
-
-    def _extract_publication_date(self, soup):
-        """Извлечение даты публикации"""
-        date_elem = soup.find('div', {'class': 'data-block__value'})
-        if date_elem:
+                asyncio.run(self._fetch_all(tender_ids, concurrency, results, stop, conditional))
+            except Exception as e:
+                logger.error(f"Error in concurrent tender fetching: {str(e)}")
+            finally:
+                results.put(None)
+        
+        threading.Thread(target=run, name='tender-fetch', daemon=True).start()
+        
+        done = failed = unchanged = 0
+        try:
+            while True:
+                item = results.get()
+                if item is None:
+                    break
+                done += 1
+                failed += item[1] is None
+                unchanged += item[1] is UNCHANGED
+                if progress is not None:
+                    progress(done, len(tender_ids), failed)
+                yield item
+        finally:
+            # Прерванный перебор останавливает загрузку оставшихся тендеров
+            stop.set()
+            logger.info(f"Parsed {done - failed - unchanged} of {len(tender_ids)} tenders, "
+                        f"{unchanged} unchanged, {failed} failed")
+
+    async def _fetch_all(self, tender_ids, concurrency: int, results: queue.Queue, stop: threading.Event,
+                         conditional: bool = False):
+        loop = asyncio.get_running_loop()
+        pending = iter(tender_ids)
+        # Не больше двух страниц на загрузчик ждут разбора, чтобы не копить их в памяти
+        backlog = asyncio.Semaphore(concurrency * 2)
+        parsing = set()
+        
+        def parse_body(tender_id, url, headers, body: bytes, charset: Optional[str], body_hash: str):
+            self._archive_page(url, headers, body, tender_id)
+            data = self._parse_page(tender_id, body.decode(charset or 'utf-8', errors='replace'))
+            if conditional:
+                self._remember_page(url, headers, body_hash)
+            return data
+        
+        async def parse(tender_id, url, headers, body, charset, body_hash):
             try:
-                return datetime.strptime(date_elem.text.strip(), '%d.%m.%Y')
-            except ValueError:
-                return None
-        return None
-
-    def _extract_deadline(self, soup):
-        """Извлечение срока подачи заявок"""
-        deadline_elem = soup.find('div', {'class': 'data-block__value'})
-        if deadline_elem:
+                data = await loop.run_in_executor(executor, parse_body, tender_id, url, headers, body, charset, body_hash)
+            except Exception as e:
+                logger.error(f"Error parsing tender {tender_id}: {str(e)}")
+                data = None
+            finally:
+                backlog.release()
+            results.put((tender_id, data))
+        
+        async def worker(session):
+            # Общий итератор: каждый тендер берет ровно один загрузчик
+            for tender_id in pending:
+                if stop.is_set():
+                    return
+                url = self._tender_url(tender_id)
+                try:
+                    # Кэш страниц в SQLite и хэширование содержимого не блокируют цикл событий
+                    cached = await loop.run_in_executor(None, self._cached_page, url, conditional)
+                    status, headers, body, charset = await self._fetch_async(
+                        session, url, PageCache.conditional_headers(cached))
+                    unchanged, body_hash = await loop.run_in_executor(
+                        None, self._check_page, url, cached, status, headers, body)
+                except Exception as e:
+                    logger.error(f"Error fetching tender {tender_id}: {str(e)}")
+                    results.put((tender_id, None))
+                    continue
+                if unchanged:
+                    results.put((tender_id, UNCHANGED))
+                    continue
+                await backlog.acquire()
+                task = asyncio.ensure_future(parse(tender_id, url, headers, body, charset, body_hash))
+                parsing.add(task)
+                task.add_done_callback(parsing.discard)
+        
+        connector = aiohttp.TCPConnector(limit=concurrency)
+        timeout = aiohttp.ClientTimeout(sock_connect=self.timeout[0], sock_read=self.timeout[1])
+        with ThreadPoolExecutor(max_workers=self.parse_workers, thread_name_prefix='tender-parse') as executor:
+            async with aiohttp.ClientSession(headers=self.headers, connector=connector, timeout=timeout) as session:
+                await asyncio.gather(*(worker(session) for _ in range(min(concurrency, len(tender_ids)))))
+            if parsing:
+                await asyncio.gather(*parsing)
+
+    async def _fetch_async(self, session, url: str, headers: Dict[str, str]):
+        """
+        Загрузка страницы с повтором при 429, 5xx и сетевых ошибках
+        
+        Возвращает (статус, заголовки, содержимое, кодировка).
+        """
+        for attempt in range(self.max_retries + 1):
+            delay = self.backoff_factor * (2 ** attempt)
             try:
-                return datetime.strptime(deadline_elem.text.strip(), '%d.%m.%Y')
-            except ValueError:
-                return None
-        return None
-
-    def _extract_status(self, soup):
-        """Извлечение статуса тендера"""
-        status_elem = soup.find('div', {'class': 'registry-entry__header-mid__title'})
-        return status_elem.text.strip() if status_elem else "" 
\ No newline at end of file
+                async with session.get(url, headers=headers) as response:
+                    if response.status not in RETRY_STATUSES or attempt == self.max_retries:
+                        response.raise_for_status()
+                        return response.status, response.headers, await response.read(), response.charset
+                    retry_after = response.headers.get('Retry-After', '')
+                    if retry_after.isdigit():
+                        delay = max(delay, int(retry_after))
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt == self.max_retries:
+                    raise
+            await asyncio.sleep(delay)
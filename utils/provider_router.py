@@ -0,0 +1,354 @@
+import threading
+import time
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, List, Tuple, Optional, Callable
+from .rate_limiter import ProviderThrottledError
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class ProviderUnavailableError(Exception):
+    """Все подходящие провайдеры временно отключены автоматическим выключателем"""
+    pass
+
+class CircuitBreaker:
+    """
+    Автоматический выключатель провайдера
+    
+    После failure_threshold ошибок подряд провайдер отключается на
+    reset_timeout секунд, затем пропускается один пробный запрос:
+    при успехе провайдер снова включается, при ошибке - отключается снова.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 120):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+
+    def is_available(self, now: float) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            return now - self.opened_at >= self.reset_timeout
+        return not self._trial_in_flight
+
+    def on_launch(self, now: float):
+        if self.state == self.OPEN and now - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            self._trial_in_flight = True
+
+    def cancel_launch(self):
+        self._trial_in_flight = False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self, now: float):
+        self.consecutive_failures += 1
+        self._trial_in_flight = False
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"Circuit opened after {self.consecutive_failures} consecutive failures")
+            self.state = self.OPEN
+            self.opened_at = now
+
+class ProviderStats:
+    """Статистика вызовов пары провайдер/модель"""
+    def __init__(self, window: int = 100, failure_threshold: int = 3, reset_timeout: float = 120):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Перцентиль задержки успешных вызовов в скользящем окне"""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    @property
+    def success_rate(self) -> Optional[float]:
+        if not self.outcomes:
+            return None
+        return sum(self.outcomes) / len(self.outcomes)
+
+class ProviderRouter:
+    """
+    Маршрутизатор запросов к провайдерам g4f
+    
+    Для каждой пары (провайдер, модель) отслеживает долю успешных вызовов
+    и перцентили задержки. Запрос отправляется самому быстрому доступному
+    провайдеру запрошенной модели, при ошибке - следующему кандидату,
+    включая эквивалентные модели из routes. Если hedge_after задан, а
+    ответ не получен за hedge_after секунд, параллельно запускается
+    запрос к следующему кандидату и возвращается первый успешный ответ.
+    
+    Вызовы, не завершившиеся за timeout, продолжают занимать потоки пула.
+    Они учитываются как ошибки провайдера, а если таких вызовов уже
+    max_abandoned, новые запросы отклоняются сразу, а не ждут в очереди
+    пула за зависшими вызовами.
+    """
+    def __init__(self, routes: Optional[Dict[str, List[Tuple[Optional[str], str]]]] = None,
+                 failure_threshold: int = 3, reset_timeout: float = 120,
+                 hedge_after: Optional[float] = None, timeout: Optional[float] = None,
+                 max_workers: int = 32, max_abandoned: Optional[int] = None,
+                 provider_resolver: Optional[Callable[[str], Any]] = None):
+        self.routes = routes or {}
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.hedge_after = hedge_after
+        self.timeout = timeout
+        self.max_abandoned = max_abandoned if max_abandoned is not None else max(1, max_workers // 2)
+        self.provider_resolver = provider_resolver
+        self._stats = {}
+        self._abandoned = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='llm-router')
+
+    def _get_stats(self, key: Tuple[Optional[str], str]) -> ProviderStats:
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats.setdefault(key, ProviderStats(
+                failure_threshold=self.failure_threshold,
+                reset_timeout=self.reset_timeout
+            ))
+        return stats
+
+    def candidates(self, provider, model: str) -> List[Tuple[Any, str]]:
+        """
+        Упорядоченный список кандидатов (провайдер, модель)
+        
+        Сначала идут провайдеры запрошенной модели: надежные (не менее
+        половины успешных вызовов) раньше ненадежных, внутри групп - по
+        медианной задержке (провайдеры без статистики - первыми). Затем
+        идут эквивалентные модели. Отключенные провайдеры исключаются.
+        """
+        requested = [(provider, model)]
+        for route_provider_name, route_model in self.routes.get(model, []):
+            route_provider = self._resolve(route_provider_name)
+            if route_provider_name is not None and route_provider is None:
+                continue
+            if (route_provider, route_model) not in requested:
+                requested.append((route_provider, route_model))
+        
+        now = time.monotonic()
+        with self._lock:
+            available = []
+            for position, (candidate_provider, candidate_model) in enumerate(requested):
+                stats = self._get_stats((provider_name(candidate_provider), candidate_model))
+                if not stats.breaker.is_available(now):
+                    continue
+                success_rate = stats.success_rate
+                unreliable = success_rate is not None and success_rate < 0.5
+                median = stats.percentile(0.5) or 0.0
+                available.append((candidate_model != model, unreliable, median, position, candidate_provider, candidate_model))
+        
+        available.sort(key=lambda item: item[:4])
+        return [(item[4], item[5]) for item in available]
+
+    def _resolve(self, name: Optional[str]):
+        if name is None:
+            return None
+        if self.provider_resolver is not None:
+            return self.provider_resolver(name)
+        return name
+
+    def call(self, provider, model: str, fn: Callable[[Any, str], Any]):
+        """
+        Выполнение запроса fn(provider, model) через маршрутизатор
+        
+        Возвращает первый успешный ответ. Если ни один кандидат не ответил,
+        пробрасывает последнюю ошибку; по истечении timeout - TimeoutError.
+        """
+        with self._lock:
+            abandoned = len(self._abandoned)
+        if abandoned >= self.max_abandoned:
+            raise ProviderUnavailableError(
+                f"Пул запросов к провайдерам занят: {abandoned} вызовов не завершились за {self.timeout} с")
+        
+        ordered = self.candidates(provider, model)
+        if not ordered:
+            raise ProviderUnavailableError(f"Нет доступных провайдеров для модели {model}")
+        
+        remaining = iter(ordered)
+        futures = {}
+        # Состояние каждого вызова: результат учитывается один раз (см. _settle)
+        calls = {}
+        hedged = False
+        last_error = None
+        deadline = time.monotonic() + self.timeout if self.timeout else None
+        
+        def launch():
+            for candidate in remaining:
+                candidate_provider, candidate_model = candidate
+                if not self.acquire(candidate_provider, candidate_model):
+                    continue
+                if candidate_model != model:
+                    logger.info(f"Falling back from {model} to {candidate_model}")
+                call = {'settled': False}
+                future = self._executor.submit(self._timed_call, fn, candidate_provider, candidate_model, call)
+                futures[future] = candidate
+                calls[future] = call
+                return True
+            return False
+        
+        launch()
+        while futures:
+            now = time.monotonic()
+            wait_for = deadline - now if deadline else None
+            can_hedge = self.hedge_after is not None and not hedged
+            if can_hedge:
+                wait_for = self.hedge_after if wait_for is None else min(wait_for, self.hedge_after)
+            
+            done, _ = wait(futures, timeout=wait_for, return_when=FIRST_COMPLETED)
+            if not done:
+                if deadline and time.monotonic() >= deadline:
+                    self._abandon(futures, calls)
+                    raise TimeoutError(f"Провайдеры модели {model} не ответили за {self.timeout} с")
+                hedged = True
+                if launch():
+                    logger.info(f"Hedging request for {model} after {self.hedge_after}s")
+                continue
+            
+            for future in done:
+                futures.pop(future)
+                try:
+                    return future.result()
+                except Exception as e:
+                    last_error = e
+            
+            if not futures and not launch():
+                break
+        
+        if last_error is not None:
+            raise last_error
+        raise ProviderUnavailableError(f"Нет доступных провайдеров для модели {model}")
+
+    def _abandon(self, futures: Dict[Any, Tuple[Any, str]], calls: Dict[Any, Dict[str, bool]]):
+        """
+        Учет вызовов, оставленных по истечении timeout
+        
+        Еще не начатые вызовы отменяются. Выполняющиеся считаются ошибкой
+        провайдера и учитываются до своего завершения; их поздний результат
+        в статистику и выключатель уже не попадает.
+        """
+        for future, (candidate_provider, candidate_model) in futures.items():
+            if future.cancel():
+                self.cancel(candidate_provider, candidate_model)
+                continue
+            if self._settle(calls[future]):
+                self.record_failure(candidate_provider, candidate_model)
+            with self._lock:
+                self._abandoned[future] = (provider_name(candidate_provider), candidate_model)
+            future.add_done_callback(self._release_abandoned)
+        logger.warning(f"Router timed out, {len(self._abandoned)} provider calls still running")
+
+    def _release_abandoned(self, future):
+        with self._lock:
+            self._abandoned.pop(future, None)
+
+    def acquire(self, provider, model: str) -> bool:
+        """
+        Проверка доступности провайдера перед вызовом
+        
+        Для отключенного провайдера после паузы резервирует пробный запрос.
+        """
+        now = time.monotonic()
+        with self._lock:
+            stats = self._get_stats((provider_name(provider), model))
+            if not stats.breaker.is_available(now):
+                return False
+            stats.breaker.on_launch(now)
+            return True
+
+    def record_success(self, provider, model: str, elapsed: float):
+        """Учет успешного вызова провайдера"""
+        with self._lock:
+            stats = self._get_stats((provider_name(provider), model))
+            stats.latencies.append(elapsed)
+            stats.outcomes.append(1)
+            stats.breaker.record_success()
+
+    def cancel(self, provider, model: str):
+        """Отмена вызова, не дошедшего до провайдера из-за ограничения нагрузки"""
+        with self._lock:
+            self._get_stats((provider_name(provider), model)).breaker.cancel_launch()
+
+    def record_failure(self, provider, model: str):
+        """Учет ошибки вызова провайдера"""
+        with self._lock:
+            stats = self._get_stats((provider_name(provider), model))
+            stats.outcomes.append(0)
+            stats.breaker.record_failure(time.monotonic())
+
+    def _settle(self, call: Dict[str, bool]) -> bool:
+        """Отметка об учете результата вызова; False - результат уже учтен"""
+        with self._lock:
+            if call['settled']:
+                return False
+            call['settled'] = True
+            return True
+
+    def _timed_call(self, fn: Callable[[Any, str], Any], provider, model: str, call: Dict[str, bool]):
+        """
+        Вызов провайдера с записью задержки и результата
+
+        Результат вызова, оставленного по истечении timeout, не записывается:
+        он уже учтен как ошибка в _abandon.
+        """
+        started = time.monotonic()
+        try:
+            response = fn(provider, model)
+            if not response:
+                raise ValueError(f"Пустой ответ провайдера {provider_name(provider)}")
+        except ProviderThrottledError:
+            # Перегрузка не считается ошибкой провайдера и не влияет на выключатель
+            if self._settle(call):
+                self.cancel(provider, model)
+            raise
+        except Exception as e:
+            if self._settle(call):
+                self.record_failure(provider, model)
+            logger.error(f"Provider {provider_name(provider)} ({model}) failed: {str(e)}")
+            raise
+        
+        if self._settle(call):
+            self.record_success(provider, model, time.monotonic() - started)
+        return response
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Текущая статистика провайдеров"""
+        with self._lock:
+            abandoned = list(self._abandoned.values())
+            return [
+                {
+                    'provider': provider,
+                    'model': model,
+                    'success_rate': stats.success_rate,
+                    'p50': stats.percentile(0.5),
+                    'p95': stats.percentile(0.95),
+                    'samples': len(stats.outcomes),
+                    'abandoned': abandoned.count((provider, model)),
+                    'circuit': stats.breaker.state
+                }
+                for (provider, model), stats in self._stats.items()
+            ]
+
+def provider_name(provider) -> Optional[str]:
+    """Имя провайдера g4f для статистики, ключей кэша и логов"""
+    if provider is None:
+        return None
+    if isinstance(provider, str):
+        return provider
+    return getattr(provider, '__name__', None) or str(provider)
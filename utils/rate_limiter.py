@@ -0,0 +1,159 @@
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+from .metrics import LLM_THROTTLED, provider_label
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class ProviderThrottledError(Exception):
+    """Провайдер перегружен: свободный слот не получен до истечения срока ожидания"""
+    pass
+
+class ProviderLimit:
+    """
+    Ограничения одного провайдера или пары провайдер/модель
+
+    max_in_flight - число одновременных запросов, per_minute - скорость
+    запросов (корзина токенов объемом burst). Состояние общее для всех потоков.
+    """
+    def __init__(self, max_in_flight: Optional[int] = None, per_minute: Optional[float] = None,
+                 burst: Optional[int] = None, max_waiting: int = 16):
+        self.max_in_flight = max_in_flight
+        self.rate = per_minute / 60.0 if per_minute else None
+        self.capacity = burst or max_in_flight or 1
+        self.max_waiting = max_waiting
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.condition = threading.Condition()
+
+    def _refill(self, now: float):
+        if self.rate is not None:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def _wait_time(self, now: float) -> float:
+        """Время до возможности запуска запроса; 0 - можно запускать"""
+        if self.max_in_flight is not None and self.in_flight >= self.max_in_flight:
+            return float('inf')
+        self._refill(now)
+        if self.rate is not None and self.tokens < 1:
+            return (1 - self.tokens) / self.rate
+        return 0.0
+
+    def acquire(self, deadline: float, bounded: bool = True) -> bool:
+        """
+        Получение слота до deadline
+
+        При bounded=True запрос отклоняется сразу, если в очереди уже
+        max_waiting запросов.
+        """
+        with self.condition:
+            if bounded and self._wait_time(time.monotonic()) > 0 and self.waiting >= self.max_waiting:
+                self.rejected += 1
+                return False
+
+            self.waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait_time = self._wait_time(now)
+                    if wait_time == 0:
+                        break
+                    if now >= deadline:
+                        self.rejected += 1
+                        return False
+                    self.condition.wait(min(wait_time, deadline - now))
+            finally:
+                self.waiting -= 1
+
+            if self.rate is not None:
+                self.tokens -= 1
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify()
+
+class ProviderLimiter:
+    """
+    Ограничение нагрузки на провайдеров g4f
+
+    limits задает ограничения по ключам "провайдер:модель", "провайдер"
+    и "*" (для каждого провайдера отдельно, а для запросов без провайдера,
+    где его выбирает g4f, - для каждой модели отдельно); используется самый
+    точный ключ. Запрос ждет свободного слота не дольше max_wait секунд, а
+    если в очереди уже max_waiting запросов, отклоняется сразу - в обоих
+    случаях с ошибкой ProviderThrottledError.
+    """
+    def __init__(self, limits: Optional[Dict[str, Dict[str, Any]]] = None, max_wait: float = 30,
+                 max_waiting: int = 16):
+        self.limits = limits or {}
+        self.max_wait = max_wait
+        self.max_waiting = max_waiting
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def _get_limit(self, provider: Optional[str], model: str) -> Optional[ProviderLimit]:
+        for key in (f"{provider}:{model}", provider, '*'):
+            if key in self.limits:
+                # Ограничение "*" действует на каждый провайдер отдельно,
+                # без провайдера - на каждую модель
+                if key != '*':
+                    state_key = key
+                else:
+                    state_key = provider if provider is not None else f"*:{model}"
+                with self._lock:
+                    limit = self._state.get(state_key)
+                    if limit is None:
+                        limit = self._state[state_key] = ProviderLimit(
+                            max_waiting=self.max_waiting, **self.limits[key]
+                        )
+                return limit
+        return None
+
+    @contextmanager
+    def slot(self, provider: Optional[str], model: str, timeout: Optional[float] = None):
+        """
+        Слот для одного запроса к провайдеру
+
+        Освобождается при выходе из блока with, в том числе при ошибке.
+        Если задан timeout, запрос ждет слота timeout секунд вместо max_wait
+        и не отклоняется из-за длины очереди: так вызываются пакетные
+        задачи, которые сами ограничивают число одновременных запросов.
+        """
+        limit = self._get_limit(provider, model)
+        if limit is None:
+            yield
+            return
+
+        deadline = time.monotonic() + (self.max_wait if timeout is None else timeout)
+        if not limit.acquire(deadline, bounded=timeout is None):
+            LLM_THROTTLED.inc(provider=provider_label(provider))
+            logger.warning(f"Provider {provider} ({model}) throttled: {limit.in_flight} in flight, {limit.waiting} waiting")
+            raise ProviderThrottledError(f"Провайдер {provider} перегружен, повторите запрос позже")
+        try:
+            yield
+        finally:
+            limit.release()
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Текущая загрузка провайдеров"""
+        with self._lock:
+            return [
+                {
+                    'key': key,
+                    'in_flight': limit.in_flight,
+                    'waiting': limit.waiting,
+                    'rejected': limit.rejected,
+                    'max_in_flight': limit.max_in_flight
+                }
+                for key, limit in self._state.items()
+            ]
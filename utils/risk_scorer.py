@@ -0,0 +1,105 @@
+import re
+import json
+import logging
+from typing import Dict, Any, Iterable, List, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Ключевые слова, учитываемые во всех разделах анализа, и их веса
+DEFAULT_KEYWORD_WEIGHTS = {
+    # Признаки высокого риска
+    "высокий риск": 10,
+    "серьезные нарушения": 10,
+    "критические проблемы": 10,
+    "несоответствие требованиям": 10,
+    "завышение цены": 10,
+    "коррупционные риски": 10,
+    "недобросовестный поставщик": 10,
+    "срыв сроков": 10,
+    "некачественное исполнение": 10,
+    # Предупреждения
+    "средний риск": 5,
+    "потенциальные проблемы": 5,
+    "требует внимания": 5,
+    "возможные нарушения": 5,
+    "неоптимальная цена": 5,
+    "сомнительные условия": 5
+}
+
+# Надбавки за наличие ключевых слов в отдельных разделах (учитываются один раз)
+DEFAULT_SECTION_BONUSES = {
+    'budget_analysis': {
+        "завышение цены": 15,
+        "необоснованное ценообразование": 10
+    },
+    'compliance_analysis': {
+        "нарушение закона": 20,
+        "несоответствие требованиям": 15
+    }
+}
+
+class KeywordRiskScorer:
+    """
+    Оценка риска по ключевым словам в результатах анализа
+    
+    Все ключевые слова компилируются в одно регулярное выражение, и каждый
+    текст просматривается за один проход без создания копий в нижнем
+    регистре. Базовая оценка - сумма весов найденных ключевых слов
+    (не более 100), к ней добавляются надбавки разделов.
+    """
+    def __init__(self, keyword_weights: Optional[Dict[str, float]] = None,
+                 section_bonuses: Optional[Dict[str, Dict[str, float]]] = None,
+                 max_base_score: float = 100):
+        self.keyword_weights = {
+            keyword.lower(): weight
+            for keyword, weight in (keyword_weights if keyword_weights is not None else DEFAULT_KEYWORD_WEIGHTS).items()
+        }
+        self.section_bonuses = {
+            section: {keyword.lower(): bonus for keyword, bonus in bonuses.items()}
+            for section, bonuses in (section_bonuses if section_bonuses is not None else DEFAULT_SECTION_BONUSES).items()
+        }
+        self.max_base_score = max_base_score
+        
+        keywords = set(self.keyword_weights)
+        for bonuses in self.section_bonuses.values():
+            keywords.update(bonuses)
+        # Более длинные ключевые слова проверяются первыми
+        alternatives = sorted(keywords, key=len, reverse=True)
+        self._pattern = re.compile('|'.join(re.escape(keyword) for keyword in alternatives), re.IGNORECASE) if alternatives else None
+
+    @classmethod
+    def from_file(cls, path: str) -> 'KeywordRiskScorer':
+        """
+        Создание оценщика из JSON-файла весов
+        
+        Формат: {"keywords": {"высокий риск": 10, ...},
+                 "section_bonuses": {"budget_analysis": {"завышение цены": 15}}}
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        return cls(keyword_weights=config.get('keywords'), section_bonuses=config.get('section_bonuses'))
+
+    def score(self, analysis_results: Dict[str, Any]) -> float:
+        """Расчет оценки риска по шкале от 0 до 100"""
+        base_score = 0
+        bonus_score = 0
+        
+        for section, text in analysis_results.items():
+            if not isinstance(text, str) or self._pattern is None:
+                continue
+            
+            bonuses = self.section_bonuses.get(section)
+            applied = set()
+            for match in self._pattern.finditer(text):
+                keyword = match.group(0).lower()
+                base_score += self.keyword_weights.get(keyword, 0)
+                if bonuses and keyword in bonuses and keyword not in applied:
+                    applied.add(keyword)
+                    bonus_score += bonuses[keyword]
+        
+        return min(100, max(0, min(self.max_base_score, base_score) + bonus_score))
+
+    def score_many(self, analyses: Iterable[Dict[str, Any]]) -> List[float]:
+        """Пакетный расчет оценок риска"""
+        return [self.score(analysis_results) for analysis_results in analyses]
@@ -0,0 +1,114 @@
+import re
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+# Шаблоны конфиденциальных данных в порядке приоритета и их замены
+CONFIDENTIAL_PATTERNS = (
+    ('inn', r'\b\d{10,12}\b', '[ИНН]'),
+    ('email', r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', '[EMAIL]'),
+    ('phone', r'\b(?:\+7|8)[\s\-]?\(?\d{3}\)?[\s\-]?\d{3}[\s\-]?\d{2}[\s\-]?\d{2}\b', '[ТЕЛЕФОН]')
+)
+
+class ConfidentialSanitizer:
+    """
+    Маскирование конфиденциальных данных в тексте
+    
+    Все шаблоны объединены в одно заранее скомпилированное регулярное
+    выражение с именованными группами, поэтому текст просматривается
+    за один проход. Большие тексты можно обрабатывать потоком фрагментов
+    через sanitize_stream.
+    """
+    def __init__(self, patterns: Tuple[Tuple[str, str, str], ...] = CONFIDENTIAL_PATTERNS, overlap: int = 256):
+        self._replacements = {name: replacement for name, _, replacement in patterns}
+        self._pattern = re.compile('|'.join(f'(?P<{name}>{pattern})' for name, pattern, _ in patterns))
+        # Перекрытие фрагментов; совпадения длиннее overlap на границе
+        # фрагментов могут быть пропущены
+        self.overlap = overlap
+
+    def _replace(self, match) -> str:
+        return self._replacements[match.lastgroup]
+
+    def sanitize(self, text: str) -> str:
+        """Маскирование конфиденциальных данных в строке"""
+        return self._pattern.sub(self._replace, text)
+
+    def sanitize_dict(self, data: Dict) -> Dict:
+        """Маскирование строковых значений словаря"""
+        return {key: self.sanitize(value) if isinstance(value, str) else value for key, value in data.items()}
+
+    def sanitize_stream(self, chunks: Iterable[str]) -> Iterator[str]:
+        """
+        Потоковое маскирование текста, поступающего фрагментами
+        
+        Последние overlap символов каждого буфера, а также совпадение,
+        доходящее до конца буфера, переносятся в следующий буфер, чтобы
+        не пропустить данные на границе фрагментов. Один уже обработанный
+        символ сохраняется перед буфером для корректной проверки границы слова.
+        """
+        carry = ''
+        start = 0
+        
+        for chunk in chunks:
+            if not chunk:
+                continue
+            buffer = carry + chunk
+            limit = len(buffer) - self.overlap
+            if limit <= start:
+                carry = buffer
+                continue
+            
+            sanitized, position = self._sanitize_range(buffer, start, limit, final=False)
+            if position == start:
+                carry = buffer
+                continue
+            yield sanitized
+            carry = buffer[position - 1:]
+            start = 1
+        
+        if len(carry) > start:
+            sanitized, _ = self._sanitize_range(carry, start, len(carry), final=True)
+            yield sanitized
+
+    def _sanitize_range(self, buffer: str, start: int, limit: int, final: bool) -> Tuple[str, int]:
+        """
+        Маскирование совпадений, начинающихся в buffer[start:limit]
+        
+        Возвращает обработанный текст и позицию, с которой нужно продолжить.
+        Если буфер не последний, совпадение, доходящее до его конца,
+        не обрабатывается: оно может продолжиться в следующем фрагменте.
+        """
+        parts = []
+        position = start
+        for match in self._pattern.finditer(buffer, start):
+            if match.start() >= limit:
+                break
+            if not final and match.end() >= len(buffer):
+                limit = match.start()
+                break
+            parts.append(buffer[position:match.start()])
+            parts.append(self._replacements[match.lastgroup])
+            position = match.end()
+        if position < limit:
+            parts.append(buffer[position:limit])
+            position = limit
+        return ''.join(parts), position
+
+    def sanitize_file(self, file, chunk_size: int = 65536, limit: Optional[int] = None) -> str:
+        """
+        Чтение и маскирование текстового файла по фрагментам
+        
+        limit ограничивает число прочитанных символов.
+        """
+        def read_chunks():
+            remaining = limit
+            while remaining is None or remaining > 0:
+                chunk = file.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+        
+        return ''.join(self.sanitize_stream(read_chunks()))
+
+# Общий экземпляр с шаблонами по умолчанию
+default_sanitizer = ConfidentialSanitizer()
@@ -2,13 +2,20 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from datetime import datetime, timedelta
 import logging
-from models import Tender, db
-from .parser import TenderParser
+from models import Tender, TenderHistory, ContractStatus, db
+from .parser import TenderParser, UNCHANGED
 from .analyzer import TenderAnalyzer
+from .anomaly_engine import scan_tenders
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def _history_value(value):
+    """Значение поля для истории изменений"""
+    if value is None:
+        return None
+    return value.value if isinstance(value, ContractStatus) else str(value)
+
 class TenderScheduler:
     """
     Планировщик задач для автоматического мониторинга и анализа тендеров
@@ -51,6 +58,15 @@ class TenderScheduler:
             replace_existing=True
         )
         
+        # Выявление аномалий цены и сроков по правилам, без обращения к модели
+        self.scheduler.add_job(
+            self.detect_rule_anomalies,
+            trigger=IntervalTrigger(hours=1),
+            id='detect_rule_anomalies',
+            name='Detect rule-based anomalies',
+            replace_existing=True
+        )
+        
         # Проверка сроков исполнения контрактов
         self.scheduler.add_job(
             self.check_contract_deadlines,
@@ -77,32 +93,60 @@ class TenderScheduler:
             logger.error(f"Error stopping scheduler: {str(e)}")
 
     def update_tenders(self):
-        """Обновление данных о тендерах из ЕИС"""
+        """
+        Обновление данных о тендерах из ЕИС
+        
+        Страницы запрашиваются условно: тендеры, страницы которых не
+        изменились с прошлого обновления, не разбираются и не записываются.
+        """
+        tenders_by_id = {}
         try:
             # Получаем все активные тендеры
             active_tenders = Tender.query.filter(
-                Tender.deadline > datetime.utcnow()
+                Tender.execution_deadline > datetime.utcnow()
             ).all()
 
-            for tender in active_tenders:
-                # Парсим обновленные данные
-                tender_data = self.parser.parse_tender(tender.tender_id)
-                
-                if tender_data:
-                    # Обновляем данные в базе
-                    tender.title = tender_data['title']
-                    tender.description = tender_data['description']
-                    tender.price = tender_data['price']
-                    tender.customer = tender_data['customer']
-                    tender.status = tender_data['status']
+            tenders_by_id = {tender.tender_id: tender for tender in active_tenders}
+            
+            # Загружаем обновленные данные параллельно; изменения в базу
+            # вносятся в этом потоке по мере получения результатов
+            updated = unchanged = 0
+            for tender_id, tender_data in self.parser.parse_tenders(tenders_by_id, conditional=True):
+                tender = tenders_by_id[tender_id]
+                if tender_data is UNCHANGED:
+                    unchanged += 1
+                elif tender_data:
+                    updated += 1
+                    # Текст статуса из реестра приводится к ContractStatus,
+                    # неизвестный статус не меняет сохраненный
+                    values = dict(tender_data, status=ContractStatus.from_eis(tender_data.get('status')))
+                    if values['status'] is None and tender_data.get('status'):
+                        logger.warning(f"Unknown EIS status for tender {tender_id}: {tender_data['status']}")
+                    # Обновляем данные в базе и фиксируем изменения в истории,
+                    # по которой выполняется инкрементальный повторный анализ
+                    for field in ('title', 'description', 'price', 'customer', 'status'):
+                        old_value, new_value = getattr(tender, field), values[field]
+                        if field == 'status' and new_value is None:
+                            continue
+                        if old_value != new_value:
+                            db.session.add(TenderHistory(
+                                tender_id=tender.id,
+                                field=field,
+                                old_value=_history_value(old_value),
+                                new_value=_history_value(new_value),
+                                source='ЕИС'
+                            ))
+                            setattr(tender, field, new_value)
                     tender.updated_at = datetime.utcnow()
 
             db.session.commit()
-            logger.info(f"Updated {len(active_tenders)} tenders")
+            logger.info(f"Updated {updated} of {len(active_tenders)} tenders, {unchanged} unchanged")
             
         except Exception as e:
             logger.error(f"Error updating tenders: {str(e)}")
             db.session.rollback()
+            # Изменения не сохранены: в следующий раз страницы нужно разобрать заново
+            self.parser.forget(tenders_by_id)
 
     def cleanup_old_tenders(self):
         """Очистка старых тендеров для оптимизации базы данных"""
@@ -110,7 +154,7 @@ class TenderScheduler:
             # Удаляем тендеры старше 30 дней
             cutoff_date = datetime.utcnow() - timedelta(days=30)
             old_tenders = Tender.query.filter(
-                Tender.deadline < cutoff_date
+                Tender.execution_deadline < cutoff_date
             ).all()
 
             for tender in old_tenders:
@@ -133,7 +177,7 @@ class TenderScheduler:
         try:
             # Получаем активные контракты
             active_tenders = Tender.query.filter(
-                Tender.status == 'active'
+                Tender.status == ContractStatus.IN_PROGRESS
             ).all()
             
             anomalies_detected = 0
@@ -145,7 +189,7 @@ class TenderScheduler:
                     'description': tender.description,
                     'price': tender.price,
                     'customer': tender.customer,
-                    'deadline': tender.deadline if hasattr(tender, 'deadline') else datetime.utcnow()
+                    'deadline': tender.execution_deadline or datetime.utcnow()
                 }
                 
                 # Анализ рисков с использованием ИИ
@@ -161,6 +205,19 @@ class TenderScheduler:
         except Exception as e:
             logger.error(f"Error analyzing contract anomalies: {str(e)}")
     
+    def detect_rule_anomalies(self):
+        """
+        Выявление аномалий по правилам для всех тендеров
+        
+        Проверяет снижение цены и сроки исполнения векторно по всей таблице
+        тендеров и сохраняет новые аномалии пакетно
+        """
+        try:
+            scan_tenders()
+        except Exception as e:
+            logger.error(f"Error detecting rule anomalies: {str(e)}")
+            db.session.rollback()
+    
     def check_contract_deadlines(self):
         """
         Проверка сроков исполнения контрактов
@@ -173,13 +230,13 @@ class TenderScheduler:
             warning_date = datetime.utcnow() + timedelta(days=7)
             
             upcoming_deadlines = Tender.query.filter(
-                Tender.deadline <= warning_date,
-                Tender.deadline > datetime.utcnow(),
-                Tender.status == 'active'
+                Tender.execution_deadline <= warning_date,
+                Tender.execution_deadline > datetime.utcnow(),
+                Tender.status == ContractStatus.IN_PROGRESS
             ).all()
             
             for tender in upcoming_deadlines:
-                days_left = (tender.deadline - datetime.utcnow()).days
+                days_left = (tender.execution_deadline - datetime.utcnow()).days
                 logger.info(f"Contract deadline warning: {tender.title} ({days_left} days left)")
                 # Здесь можно добавить логику для отправки уведомлений
             
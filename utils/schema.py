@@ -0,0 +1,51 @@
+import logging
+from typing import List
+import sqlalchemy as sa
+from models import db
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Столбцы, добавленные в модели после создания таблиц: (таблица, столбец).
+# db.create_all() не изменяет существующие таблицы, поэтому в уже
+# развернутой базе их добавляет upgrade_schema (flask upgrade-db).
+ADDED_COLUMNS = (
+    ('analysis', 'risk_indicators'),
+    ('analysis', 'section_fingerprints'),
+    ('anomaly', 'source'),
+)
+
+def missing_columns() -> List[str]:
+    """Столбцы ADDED_COLUMNS, которых нет в существующих таблицах базы ("таблица.столбец")"""
+    inspector = sa.inspect(db.engine)
+    missing = []
+    for table_name, column_name in ADDED_COLUMNS:
+        # Отсутствующую таблицу целиком создаст db.create_all()
+        if not inspector.has_table(table_name):
+            continue
+        if column_name not in {column['name'] for column in inspector.get_columns(table_name)}:
+            missing.append(f"{table_name}.{column_name}")
+    return missing
+
+def upgrade_schema() -> List[str]:
+    """
+    Добавление отсутствующих столбцов ADDED_COLUMNS через ALTER TABLE ... ADD COLUMN
+
+    Повторный запуск ничего не меняет. Возвращает добавленные столбцы.
+    """
+    added = []
+    for name in missing_columns():
+        table_name, column_name = name.split('.')
+        column = db.metadata.tables[table_name].c[column_name]
+        column_type = column.type.compile(dialect=db.engine.dialect)
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(sa.text(f'ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}'))
+        except sa.exc.DBAPIError:
+            # Столбец мог добавить другой процесс, запущенный одновременно
+            if name in missing_columns():
+                raise
+            continue
+        logger.info(f"Added column {name}")
+        added.append(name)
+    return added
@@ -0,0 +1,122 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from .llm import chat_completion
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Запрос не зависит от вопроса пользователя, поэтому сводка фрагмента
+# берется из кэша ответов для любого запроса с тем же документом
+MAP_PROMPT = """
+Кратко изложи содержание фрагмента документа. Сохрани существенные факты:
+предмет, стороны, суммы, сроки, требования, условия и ограничения.
+Не добавляй сведений, которых нет во фрагменте.
+
+Фрагмент:
+{chunk}
+"""
+
+REDUCE_PROMPT = """
+Ниже - краткие изложения последовательных фрагментов одного документа.
+Объедини их в одно краткое изложение без повторов, сохранив существенные
+факты: предмет, стороны, суммы, сроки, требования, условия и ограничения.
+
+{summaries}
+"""
+
+def split_text(text: str, chunk_size: int, overlap: int) -> List[str]:
+    """
+    Разбиение текста на перекрывающиеся фрагменты
+
+    Граница фрагмента по возможности переносится на конец абзаца
+    или предложения в последней пятой части фрагмента.
+    """
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            boundary = max(text.rfind('\n\n', start, end), text.rfind('. ', start, end))
+            if boundary > end - chunk_size // 5:
+                end = boundary + 1
+        chunks.append(text[start:end])
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+class MapReduceSummarizer:
+    """
+    Краткое изложение длинных текстов по схеме map-reduce
+
+    Текст длиннее threshold символов разбивается на перекрывающиеся фрагменты,
+    которые излагаются параллельно (не более max_workers запросов), затем
+    изложения объединяются. Сводки фрагментов кэшируются кэшем ответов моделей
+    по содержимому, поэтому повторный документ не требует запросов к модели.
+    """
+    def __init__(self, model: str = "gpt-3.5-turbo", threshold: int = 12000, chunk_size: int = 6000,
+                 overlap: int = 300, max_workers: int = 4, max_depth: int = 3, use_cache: bool = True):
+        self.model = model
+        self.threshold = threshold
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.max_workers = max_workers
+        self.max_depth = max_depth
+        self.use_cache = use_cache
+
+    def needs_summary(self, text: Optional[str]) -> bool:
+        return bool(text) and len(text) > self.threshold
+
+    def summarize(self, text: str, use_cache: Optional[bool] = None, limit_wait: Optional[float] = None) -> str:
+        """
+        Краткое изложение текста
+
+        Текст не длиннее threshold возвращается без изменений. Если объединенные
+        изложения фрагментов все еще длиннее threshold, они излагаются повторно.
+        use_cache задает использование кэша ответов для этого вызова
+        (None - настройка use_cache экземпляра), limit_wait - ожидание слота
+        провайдера для пакетных вызовов (см. chat_completion).
+        """
+        use_cache = self.use_cache if use_cache is None else use_cache
+        for depth in range(self.max_depth):
+            if not self.needs_summary(text):
+                return text
+            chunks = split_text(text, self.chunk_size, self.overlap)
+            logger.info(f"Summarizing {len(text)} characters in {len(chunks)} chunks (pass {depth + 1})")
+
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(chunks))) as executor:
+                summaries = list(executor.map(lambda chunk: self._summarize_chunk(chunk, use_cache, limit_wait), chunks))
+
+            if len(summaries) == 1 or len('\n\n'.join(summaries)) > self.threshold:
+                text = '\n\n'.join(summaries)
+                continue
+            return self._reduce(summaries, use_cache, limit_wait)
+        return text[:self.threshold]
+
+    def _summarize_chunk(self, chunk: str, use_cache: bool, limit_wait: Optional[float]) -> str:
+        try:
+            return self._complete(MAP_PROMPT.format(chunk=chunk), use_cache, limit_wait)
+        except Exception as e:
+            # Без сводки сохраняем начало фрагмента, чтобы не потерять его целиком
+            logger.error(f"Error summarizing chunk: {str(e)}")
+            return chunk[:self.chunk_size // 4]
+
+    def _reduce(self, summaries: List[str], use_cache: bool, limit_wait: Optional[float]) -> str:
+        joined = '\n\n'.join(summaries)
+        try:
+            return self._complete(REDUCE_PROMPT.format(summaries=joined), use_cache, limit_wait)
+        except Exception as e:
+            logger.error(f"Error reducing summaries: {str(e)}")
+            return joined
+
+    def _complete(self, prompt: str, use_cache: bool, limit_wait: Optional[float]) -> str:
+        response = chat_completion(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            use_cache=use_cache,
+            limit_wait=limit_wait
+        )
+        if not isinstance(response, str) or not response.strip():
+            raise ValueError("Пустой ответ модели")
+        return response